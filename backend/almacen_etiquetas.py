@@ -0,0 +1,172 @@
+# backend/almacen_etiquetas.py
+# Dónde se guardan las imágenes de las etiquetas. Una etiqueta nunca cambia
+# una vez dibujada, así que basta con guardar y leer bytes por (código, formato).
+#   ETIQUETAS_ALMACEN=fragmentado  -> codigos/ab/cd/<codigo>.<formato> (por defecto)
+#   ETIQUETAS_ALMACEN=sqlite       -> un solo archivo codigos.sqlite3
+#   ETIQUETAS_ALMACEN=plano        -> codigos/<codigo>.<formato> (formato antiguo)
+# ETIQUETAS_RUTA cambia el directorio o el archivo.
+import hashlib
+import os
+import sqlite3
+import threading
+from urllib.parse import quote, unquote
+
+
+def nombre_archivo(codigo, formato):
+    # Los códigos salen de números de serie de proveedor y pueden llevar '/', '%'...:
+    # se escapan para que cada código sea un solo archivo dentro del directorio.
+    # Los códigos de letras, números, '.', '_', '-' y espacios no cambian.
+    return f"{quote(codigo, safe=' ')}.{formato}"
+
+
+def _desde_nombre(nombre):
+    codigo, _, formato = nombre.rpartition(".")
+    return unquote(codigo), formato
+
+
+class AlmacenPlano:
+    """Un archivo por etiqueta en un único directorio."""
+
+    def __init__(self, directorio):
+        self.directorio = self.ubicacion = directorio
+
+    def ruta(self, codigo, formato):
+        return os.path.join(self.directorio, nombre_archivo(codigo, formato))
+
+    def leer(self, codigo, formato):
+        try:
+            with open(self.ruta(codigo, formato), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def existe(self, codigo, formato):
+        return os.path.exists(self.ruta(codigo, formato))
+
+    def guardar(self, codigo, formato, datos):
+        ruta = self.ruta(codigo, formato)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        # Escritura atómica: nunca se sirve un archivo a medio escribir
+        temporal = f"{ruta}.{threading.get_ident()}.tmp"
+        with open(temporal, "wb") as f:
+            f.write(datos)
+        os.replace(temporal, ruta)
+
+    def etiquetas(self):
+        """(código, formato) de todas las etiquetas guardadas."""
+        if not os.path.isdir(self.directorio):
+            return
+        with os.scandir(self.directorio) as entradas:
+            for entrada in entradas:
+                if entrada.is_file() and not entrada.name.endswith(".tmp"):
+                    codigo, formato = _desde_nombre(entrada.name)
+                    if codigo:
+                        yield codigo, formato
+
+
+class AlmacenFragmentado(AlmacenPlano):
+    """
+    Un archivo por etiqueta repartido en 256 x 256 subdirectorios. Se reparte
+    por el hash del código y no por sus primeros caracteres porque todos los
+    códigos empiezan igual (OTech-...).
+    'leer' busca también en el directorio plano, para seguir sirviendo lo que
+    todavía no se ha migrado con migrar_etiquetas.py.
+    """
+
+    def ruta(self, codigo, formato):
+        resumen = hashlib.sha1(codigo.encode()).hexdigest()
+        return os.path.join(self.directorio, resumen[:2], resumen[2:4], nombre_archivo(codigo, formato))
+
+    def leer(self, codigo, formato):
+        datos = super().leer(codigo, formato)
+        if datos is None:
+            return AlmacenPlano.leer(self, codigo, formato) if self._plano_existe(codigo, formato) else None
+        return datos
+
+    def _plano_existe(self, codigo, formato):
+        return os.path.exists(AlmacenPlano.ruta(self, codigo, formato))
+
+    def etiquetas(self):
+        if not os.path.isdir(self.directorio):
+            return
+        for raiz, _, archivos in os.walk(self.directorio):
+            if raiz == self.directorio:
+                continue
+            for nombre in archivos:
+                codigo, formato = _desde_nombre(nombre)
+                if codigo and not nombre.endswith(".tmp"):
+                    yield codigo, formato
+
+
+class AlmacenSQLite:
+    """Todas las etiquetas en un solo archivo SQLite (una fila por etiqueta)."""
+
+    def __init__(self, ruta):
+        self.ruta = self.ubicacion = ruta
+        self._local = threading.local()
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        with self._conexion() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS etiqueta (
+                    codigo TEXT NOT NULL,
+                    formato TEXT NOT NULL,
+                    datos BLOB NOT NULL,
+                    PRIMARY KEY (codigo, formato)
+                ) WITHOUT ROWID
+            """)
+
+    def _conexion(self):
+        # sqlite3 no comparte conexiones entre hilos: una por hilo del pool
+        conn = getattr(self._local, "conexion", None)
+        if conn is None:
+            conn = sqlite3.connect(self.ruta, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conn
+        return conn
+
+    def leer(self, codigo, formato):
+        fila = self._conexion().execute(
+            "SELECT datos FROM etiqueta WHERE codigo = ? AND formato = ?", (codigo, formato)
+        ).fetchone()
+        return fila[0] if fila else None
+
+    def existe(self, codigo, formato):
+        return self._conexion().execute(
+            "SELECT 1 FROM etiqueta WHERE codigo = ? AND formato = ?", (codigo, formato)
+        ).fetchone() is not None
+
+    def guardar(self, codigo, formato, datos):
+        with self._conexion() as conn:
+            conn.execute("INSERT OR IGNORE INTO etiqueta (codigo, formato, datos) VALUES (?, ?, ?)",
+                         (codigo, formato, datos))
+
+    def guardar_lote(self, filas):
+        """filas: [(codigo, formato, datos)] en una sola transacción."""
+        with self._conexion() as conn:
+            conn.executemany("INSERT OR IGNORE INTO etiqueta (codigo, formato, datos) VALUES (?, ?, ?)", filas)
+
+    def etiquetas(self):
+        yield from self._conexion().execute("SELECT codigo, formato FROM etiqueta ORDER BY codigo, formato")
+
+
+TIPOS = {
+    "fragmentado": AlmacenFragmentado,
+    "sqlite": AlmacenSQLite,
+    "plano": AlmacenPlano,
+}
+RUTAS = {
+    "fragmentado": "codigos",
+    "sqlite": "codigos.sqlite3",
+    "plano": "codigos",
+}
+
+
+def crear(tipo=None, ruta=None):
+    """Almacén configurado por ETIQUETAS_ALMACEN y ETIQUETAS_RUTA (o los argumentos)."""
+    tipo = tipo or os.getenv("ETIQUETAS_ALMACEN", "fragmentado")
+    if tipo not in TIPOS:
+        raise ValueError(f"ETIQUETAS_ALMACEN no válido: {tipo} (use {', '.join(TIPOS)})")
+    return TIPOS[tipo](ruta or os.getenv("ETIQUETAS_RUTA") or RUTAS[tipo])
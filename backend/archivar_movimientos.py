@@ -0,0 +1,133 @@
+# backend/archivar_movimientos.py
+# Mantenimiento de la tabla movimiento:
+#   python archivar_movimientos.py estado              -> particiones y filas estimadas
+#   python archivar_movimientos.py particiones [meses] -> crea particiones para los próximos meses (3 por defecto)
+#   python archivar_movimientos.py archivar [meses]    -> mueve a movimiento_archivo lo anterior a N meses (12 por defecto)
+#
+# Con la tabla particionada (migración 0005) cada mes viejo se saca entero con
+# EXCHANGE PARTITION, sin recorrer ni bloquear la tabla activa. Sin particiones
+# se copian y borran lotes por id. Pensado para ejecutarse una vez al mes (cron).
+import sys
+from datetime import date
+
+import database
+from database import UnidadDeTrabajo
+from migraciones import particiones
+
+USO = "Uso: python archivar_movimientos.py [estado | particiones [meses] | archivar [meses]]"
+
+COLUMNAS = ("id_movimiento, id_pieza, tipo_movimiento, estado_anterior, estado_nuevo, "
+            "caja_anterior, caja_nueva, id_usuario, observaciones, fecha_movimiento")
+TABLA_CANJE = "movimiento_canje"
+LOTE = 5000
+
+
+def estado(cursor):
+    if not particiones.esta_particionada(cursor):
+        cursor.execute("SELECT COUNT(*), MIN(fecha_movimiento) FROM movimiento")
+        total, primera = cursor.fetchone()
+        print(f"movimiento no está particionada: {total} filas, la más antigua del {primera}")
+        return 0
+    for nombre, filas in particiones.particiones(cursor):
+        print(f"  {nombre:<10} ~{filas} filas")
+    return 0
+
+
+def crear_particiones(cursor, meses=3):
+    if not particiones.esta_particionada(cursor):
+        print("movimiento no está particionada (python migrar.py aplicar 0005)")
+        return 1
+    nuevas = particiones.crear_futuras(cursor, meses)
+    print(f"Particiones creadas: {', '.join(nuevas)}" if nuevas else "Las particiones futuras ya existen.")
+    return 0
+
+
+def _vaciar_canje(cursor):
+    """Termina un archivado interrumpido: las filas de la tabla de canje pasan al archivo."""
+    cursor.execute("SHOW TABLES LIKE %s", (TABLA_CANJE,))
+    if not cursor.fetchall():
+        return
+    cursor.execute(f"INSERT IGNORE INTO movimiento_archivo ({COLUMNAS}) SELECT {COLUMNAS} FROM {TABLA_CANJE}")
+    cursor.execute(f"DROP TABLE {TABLA_CANJE}")
+
+
+def _archivar_particiones(cursor, corte):
+    _vaciar_canje(cursor)
+    archivadas = 0
+    for nombre, _ in particiones.particiones(cursor):
+        mes = particiones.mes_de_particion(nombre)
+        # Solo meses completos anteriores al corte
+        if mes is None or particiones.primer_dia_mes(mes, 1) > corte:
+            continue
+        cursor.execute(f"CREATE TABLE {TABLA_CANJE} LIKE movimiento")
+        cursor.execute(f"ALTER TABLE {TABLA_CANJE} REMOVE PARTITIONING")
+        # Intercambio instantáneo: la partición queda vacía y sus filas en la tabla de canje
+        cursor.execute(f"ALTER TABLE movimiento EXCHANGE PARTITION {nombre} WITH TABLE {TABLA_CANJE}")
+        _vaciar_canje(cursor)
+        cursor.execute(f"ALTER TABLE movimiento DROP PARTITION {nombre}")
+        print(f"  {nombre} archivada")
+        archivadas += 1
+    return archivadas
+
+
+def _archivar_por_lotes(corte):
+    total = 0
+    while True:
+        with UnidadDeTrabajo() as uow:
+            cursor = uow.cursor()
+            try:
+                cursor.execute("""
+                    SELECT id_movimiento FROM movimiento
+                    WHERE fecha_movimiento < %s
+                    ORDER BY fecha_movimiento, id_movimiento
+                    LIMIT %s
+                    FOR UPDATE
+                """, (corte, LOTE))
+                ids = [fila[0] for fila in cursor.fetchall()]
+                if ids:
+                    marcadores = ", ".join(["%s"] * len(ids))
+                    cursor.execute(
+                        f"INSERT IGNORE INTO movimiento_archivo ({COLUMNAS}) "
+                        f"SELECT {COLUMNAS} FROM movimiento WHERE id_movimiento IN ({marcadores})", ids
+                    )
+                    cursor.execute(f"DELETE FROM movimiento WHERE id_movimiento IN ({marcadores})", ids)
+            finally:
+                cursor.close()
+        if not ids:
+            return total
+        total += len(ids)
+        print(f"  {total} movimientos archivados...")
+
+
+def archivar(cursor, meses=12):
+    corte = particiones.primer_dia_mes(date.today(), -meses)
+    print(f"Archivando movimientos anteriores al {corte}...")
+    if particiones.esta_particionada(cursor):
+        archivadas = _archivar_particiones(cursor, corte)
+        print(f"{archivadas} particiones archivadas.")
+    else:
+        total = _archivar_por_lotes(corte)
+        print(f"{total} movimientos archivados.")
+    return 0
+
+
+def main(argv):
+    if len(argv) < 2 or argv[1] not in ("estado", "particiones", "archivar"):
+        print(USO)
+        return 2
+    argumento = int(argv[2]) if len(argv) > 2 else None
+
+    with database.conexion() as conn:
+        cursor = conn.cursor(buffered=True)
+        try:
+            if argv[1] == "estado":
+                return estado(cursor)
+            if argv[1] == "particiones":
+                return crear_particiones(cursor, argumento or 3)
+            return archivar(cursor, argumento or 12)
+        finally:
+            cursor.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,98 @@
+# backend/arranque.py
+# Tiempos de arranque del backend: importación por módulo, fases hasta el
+# primer /health correcto y calentamiento en segundo plano de lo que se carga
+# bajo demanda. Se importa antes que nada en main.py para tomar el instante inicial.
+import builtins
+import logging
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+INICIO = time.perf_counter()
+
+_importaciones = {}  # módulo -> segundos (incluye lo que importa él mismo)
+_fases = {}          # fase -> segundos desde INICIO
+_calentamiento = {}  # subsistema -> segundos
+_import_original = None
+_profundidad = 0
+
+
+# --- Importaciones ---
+
+def medir_importaciones():
+    """Mide cada módulo que importa main hasta fin_importaciones() (solo durante el arranque)."""
+    global _import_original
+    if _import_original is not None:
+        return
+    _import_original = original = builtins.__import__
+
+    # Misma firma que __import__ (algunas bibliotecas lo llaman con argumentos por nombre)
+    def _import(name, globals=None, locals=None, fromlist=(), level=0):
+        global _profundidad
+        # Solo los imports de main (los demás quedan incluidos en el tiempo de quien los pidió)
+        if _profundidad or level or name in sys.modules or (globals or {}).get("__name__") not in ("main", "__main__"):
+            return original(name, globals, locals, fromlist, level)
+        _profundidad += 1
+        inicio = time.perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            _profundidad -= 1
+            _importaciones[name] = _importaciones.get(name, 0) + time.perf_counter() - inicio
+
+    builtins.__import__ = _import
+
+
+def fin_importaciones():
+    global _import_original
+    if _import_original is not None:
+        builtins.__import__ = _import_original
+        _import_original = None
+    marcar("importaciones")
+
+
+# --- Fases ---
+
+def marcar(fase):
+    """Registra la primera vez que se alcanza una fase (segundos desde el inicio del proceso)."""
+    if fase in _fases:
+        return
+    _fases[fase] = time.perf_counter() - INICIO
+    logger.info("Arranque: %s", fase, extra={"fase": fase, "segundos": round(_fases[fase], 3)})
+
+
+def fases():
+    return dict(_fases)
+
+
+# --- Calentamiento ---
+
+def calentar(tareas):
+    """
+    Ejecuta [(nombre, funcion)] en un hilo aparte, una detrás de otra, para que
+    el servidor acepte peticiones sin esperar a que terminen.
+    """
+    def _ejecutar():
+        for nombre, funcion in tareas:
+            inicio = time.perf_counter()
+            try:
+                funcion()
+            except Exception:
+                logger.exception("Error en el calentamiento", extra={"subsistema": nombre})
+            _calentamiento[nombre] = time.perf_counter() - inicio
+        marcar("calentamiento")
+
+    hilo = threading.Thread(target=_ejecutar, name="calentamiento", daemon=True)
+    hilo.start()
+    return hilo
+
+
+def informe():
+    ordenadas = sorted(_importaciones.items(), key=lambda par: par[1], reverse=True)
+    return {
+        "fases_s": {fase: round(s, 3) for fase, s in _fases.items()},
+        "importaciones_ms": {modulo: round(s * 1000, 1) for modulo, s in ordenadas},
+        "calentamiento_ms": {nombre: round(s * 1000, 1) for nombre, s in _calentamiento.items()},
+    }
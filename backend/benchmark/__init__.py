@@ -0,0 +1,4 @@
+# backend/benchmark
+# Banco de pruebas de rendimiento:
+#   python -m benchmark.datos  -> llena una base de datos de pruebas con volúmenes configurables
+#   python -m benchmark.carga  -> lanza una mezcla de peticiones contra el backend y guarda p50/p95/p99 en JSON
@@ -0,0 +1,112 @@
+# backend/benchmark/arranque.py
+# Mide el arranque en frío del backend: lanza uvicorn varias veces, espera al
+# primer /health correcto y guarda los tiempos (y el informe de /admin/arranque)
+# en JSON para comparar entre commits.
+#
+#   python -m benchmark.arranque --repeticiones 5
+#   python -m benchmark.arranque --comparar benchmark/resultados/arranque_anterior.json
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+from benchmark.carga import DIRECTORIO_RESULTADOS, _commit_actual
+
+DIRECTORIO_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _get(url, timeout=1):
+    with urllib.request.urlopen(url, timeout=timeout) as respuesta:
+        return respuesta.status, respuesta.read()
+
+
+def medir_una(puerto, limite):
+    """Segundos desde lanzar el proceso hasta el primer /health OK, e informe interno."""
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(puerto), "--log-level", "warning"],
+        cwd=DIRECTORIO_BACKEND, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base = f"http://127.0.0.1:{puerto}"
+    try:
+        while True:
+            if time.perf_counter() - inicio > limite:
+                raise TimeoutError(f"El backend no respondió en {limite} s")
+            if proceso.poll() is not None:
+                raise RuntimeError(f"El backend terminó con código {proceso.returncode}")
+            try:
+                estado, _ = _get(f"{base}/health")
+                if estado == 200:
+                    break
+            except (urllib.error.URLError, ConnectionError, OSError):
+                pass
+            time.sleep(0.02)
+        primer_health = time.perf_counter() - inicio
+        # Deja terminar el calentamiento antes de pedir el informe
+        time.sleep(2)
+        _, cuerpo = _get(f"{base}/admin/arranque", timeout=5)
+        return primer_health, json.loads(cuerpo)
+    finally:
+        proceso.terminate()
+        proceso.wait(timeout=10)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mide el arranque en frío del backend.")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--limite", type=float, default=60, help="segundos máximos de espera por arranque")
+    parser.add_argument("--salida", help="archivo JSON (por defecto benchmark/resultados/arranque_<fecha>_<commit>.json)")
+    parser.add_argument("--comparar", help="JSON de una medición anterior")
+    args = parser.parse_args(argv)
+
+    tiempos, informes = [], []
+    for i in range(args.repeticiones):
+        segundos, informe = medir_una(args.puerto, args.limite)
+        tiempos.append(segundos)
+        informes.append(informe)
+        print(f"  arranque {i + 1}: primer /health en {segundos * 1000:.0f} ms")
+
+    resultado = {
+        "commit": _commit_actual(),
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "repeticiones": args.repeticiones,
+        "primer_health_ms": {
+            "mediana": round(statistics.median(tiempos) * 1000, 1),
+            "min": round(min(tiempos) * 1000, 1),
+            "max": round(max(tiempos) * 1000, 1),
+        },
+        # El informe interno de la última ejecución (importaciones, fases y calentamiento)
+        "informe": informes[-1],
+    }
+    print(f"\nPrimer /health: mediana {resultado['primer_health_ms']['mediana']} ms")
+    for modulo, ms in list(resultado["informe"]["importaciones_ms"].items())[:10]:
+        print(f"  import {modulo:<20}{ms:>9} ms")
+
+    salida = args.salida
+    if not salida:
+        os.makedirs(DIRECTORIO_RESULTADOS, exist_ok=True)
+        nombre = f"arranque_{datetime.now():%Y%m%d_%H%M%S}_{resultado['commit'] or 'sin_commit'}.json"
+        salida = os.path.join(DIRECTORIO_RESULTADOS, nombre)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            anterior = json.load(f)
+        antes = anterior["primer_health_ms"]["mediana"]
+        ahora = resultado["primer_health_ms"]["mediana"]
+        print(f"Comparación con {anterior.get('commit') or '?'}: {antes} -> {ahora} ms "
+              f"({(ahora - antes) / antes * 100:+.1f}%)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,305 @@
+# backend/benchmark/carga.py
+# Generador de carga: reproduce una mezcla de operaciones del almacén contra
+# un backend en marcha y guarda rendimiento y p50/p95/p99 por operación en JSON.
+#
+#   python -m benchmark.carga --url http://localhost:8000 --concurrencia 1,8,32 --duracion 30
+#   python -m benchmark.carga ... --comparar benchmark/resultados/anterior.json
+#
+# Pensado para la base generada con benchmark.datos (mismos códigos de proveedor).
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from benchmark.datos import codigo_original
+
+try:
+    import httpx
+except ImportError:  # solo hace falta para el generador de carga
+    httpx = None
+
+# Operación -> peso por defecto en la mezcla
+MEZCLA = {
+    "buscar_codigo_barras": 30,
+    "buscar_serie": 10,
+    "buscar_desconocido": 5,
+    "registrar_pieza": 8,
+    "actualizar_estado": 8,
+    "inventario_pagina": 10,
+    "inventario_completo": 0,
+    "alertas_stock": 5,
+    "exportar_csv": 1,
+}
+
+ESTADOS_VALIDOS = ["disponible", "en_venta", "en_garantia", "en_reparacion"]
+DIRECTORIO_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resultados")
+
+
+# --- Operaciones ---
+
+class Contexto:
+    """Datos de muestra y contadores compartidos por los trabajadores."""
+
+    def __init__(self, muestras, productos, ejecucion):
+        self.muestras = muestras
+        self.productos = productos
+        self.ejecucion = ejecucion
+        self.registradas = 0
+
+
+async def buscar_codigo_barras(cliente, azar, ctx):
+    pieza = azar.choice(ctx.muestras)
+    return await cliente.post("/buscar_codigo", json={"codigo": pieza["codigo_barras"]})
+
+
+async def buscar_serie(cliente, azar, ctx):
+    pieza = azar.choice(ctx.muestras)
+    return await cliente.post("/buscar_codigo", json={"codigo": pieza["numero_serie"]})
+
+
+async def buscar_desconocido(cliente, azar, ctx):
+    return await cliente.post("/buscar_codigo", json={"codigo": f"NOEXISTE-{azar.getrandbits(40):x}"})
+
+
+async def registrar_pieza(cliente, azar, ctx):
+    ctx.registradas += 1
+    indice = azar.randint(1, ctx.productos)
+    return await cliente.post("/registrar_pieza", json={
+        "codigo_original": codigo_original(indice),
+        "numero_serie": f"BMC-{ctx.ejecucion}-{ctx.registradas}",
+        "nombre_producto": f"Producto BM {indice}",
+        "caja": f"C{azar.randint(1, 500):04d}",
+        "id_usuario": 1,
+    })
+
+
+async def actualizar_estado(cliente, azar, ctx):
+    pieza = azar.choice(ctx.muestras)
+    return await cliente.post("/actualizar_estado_pieza", json={
+        "id_pieza": pieza["id_pieza"],
+        "nuevo_estado": azar.choice(ESTADOS_VALIDOS),
+        "id_usuario": 1,
+        "observaciones": "benchmark",
+    })
+
+
+async def inventario_pagina(cliente, azar, ctx):
+    params = {"limite": 100}
+    if azar.random() < 0.5:
+        params["estado"] = azar.choice(ESTADOS_VALIDOS)
+    return await cliente.get("/inventario", params=params)
+
+
+async def inventario_completo(cliente, azar, ctx):
+    return await cliente.get("/inventario")
+
+
+async def alertas_stock(cliente, azar, ctx):
+    return await cliente.get("/alertas/stock_bajo")
+
+
+async def exportar_csv(cliente, azar, ctx):
+    return await cliente.get("/exportar/inventario", params={"format": "csv"})
+
+
+OPERACIONES = {nombre: globals()[nombre] for nombre in MEZCLA}
+
+
+# --- Ejecución ---
+
+async def cargar_muestras(cliente, cantidad):
+    """Toma piezas reales del inventario para usar sus códigos en las búsquedas."""
+    muestras, cursor = [], None
+    while len(muestras) < cantidad:
+        params = {"limite": min(1000, cantidad - len(muestras))}
+        if cursor:
+            params["cursor"] = cursor
+        respuesta = await cliente.get("/inventario", params=params)
+        respuesta.raise_for_status()
+        datos = respuesta.json()
+        muestras.extend(datos["piezas"])
+        cursor = datos["siguiente_cursor"]
+        if not cursor:
+            break
+    return muestras
+
+
+async def _trabajador(cliente, azar, ctx, nombres, pesos, fin, registro):
+    while time.perf_counter() < fin:
+        nombre = azar.choices(nombres, pesos)[0]
+        inicio = time.perf_counter()
+        try:
+            respuesta = await OPERACIONES[nombre](cliente, azar, ctx)
+            error = respuesta.status_code >= 400
+        except httpx.HTTPError:
+            error = True
+        if registro is not None:
+            registro.append((nombre, time.perf_counter() - inicio, error))
+
+
+def percentil(ordenados, p):
+    if not ordenados:
+        return None
+    # Rango más cercano: el menor valor que cubre el p% de las muestras
+    indice = max(0, math.ceil(p / 100 * len(ordenados)) - 1)
+    return ordenados[indice]
+
+
+def resumir(registro, duracion):
+    operaciones = {}
+    for nombre in sorted({r[0] for r in registro}):
+        tiempos = sorted(t for n, t, _ in registro if n == nombre)
+        errores = sum(1 for n, _, e in registro if n == nombre and e)
+        operaciones[nombre] = {
+            "peticiones": len(tiempos),
+            "errores": errores,
+            "por_segundo": round(len(tiempos) / duracion, 2),
+            "p50_ms": round(percentil(tiempos, 50) * 1000, 2),
+            "p95_ms": round(percentil(tiempos, 95) * 1000, 2),
+            "p99_ms": round(percentil(tiempos, 99) * 1000, 2),
+            "max_ms": round(tiempos[-1] * 1000, 2),
+        }
+    return {
+        "peticiones": len(registro),
+        "errores": sum(1 for r in registro if r[2]),
+        "por_segundo": round(len(registro) / duracion, 2),
+        "operaciones": operaciones,
+    }
+
+
+async def ejecutar_nivel(args, ctx, mezcla, concurrencia):
+    nombres = [n for n, p in mezcla.items() if p > 0]
+    pesos = [mezcla[n] for n in nombres]
+    limites = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+    async with httpx.AsyncClient(base_url=args.url, limits=limites, timeout=args.timeout) as cliente:
+        # Cada trabajador tiene su propio generador: misma semilla -> misma secuencia de operaciones
+        azares = [random.Random(args.semilla * 1000 + i) for i in range(concurrencia)]
+        if args.calentamiento:
+            fin = time.perf_counter() + args.calentamiento
+            await asyncio.gather(*[_trabajador(cliente, a, ctx, nombres, pesos, fin, None) for a in azares])
+
+        registro = []
+        inicio = time.perf_counter()
+        fin = inicio + args.duracion
+        await asyncio.gather(*[_trabajador(cliente, a, ctx, nombres, pesos, fin, registro) for a in azares])
+        duracion = time.perf_counter() - inicio
+    return {"concurrencia": concurrencia, "duracion_s": round(duracion, 2), **resumir(registro, duracion)}
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _leer_mezcla(texto):
+    mezcla = dict(MEZCLA)
+    if texto:
+        for parte in texto.split(","):
+            nombre, _, peso = parte.partition("=")
+            if nombre.strip() not in MEZCLA:
+                raise SystemExit(f"Operación desconocida en --mezcla: {nombre}")
+            mezcla[nombre.strip()] = float(peso)
+    return mezcla
+
+
+def imprimir(resultado):
+    for nivel in resultado["niveles"]:
+        print(f"\nConcurrencia {nivel['concurrencia']}: {nivel['por_segundo']} pet/s, {nivel['errores']} errores")
+        print(f"  {'operación':<22}{'pet':>8}{'err':>6}{'pet/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+        for nombre, o in nivel["operaciones"].items():
+            print(f"  {nombre:<22}{o['peticiones']:>8}{o['errores']:>6}{o['por_segundo']:>9}"
+                  f"{o['p50_ms']:>9}{o['p95_ms']:>9}{o['p99_ms']:>9}")
+
+
+def comparar(actual, anterior):
+    """Imprime la variación de p95 por operación respecto de otra ejecución."""
+    previos = {n["concurrencia"]: n for n in anterior["niveles"]}
+    print(f"\nComparación con {anterior.get('commit') or '?'} (p95, ms):")
+    for nivel in actual["niveles"]:
+        previo = previos.get(nivel["concurrencia"])
+        if previo is None:
+            continue
+        for nombre, o in nivel["operaciones"].items():
+            p = previo["operaciones"].get(nombre)
+            if p and p["p95_ms"]:
+                cambio = (o["p95_ms"] - p["p95_ms"]) / p["p95_ms"] * 100
+                print(f"  c={nivel['concurrencia']:<4} {nombre:<22}{p['p95_ms']:>9} -> {o['p95_ms']:<9} ({cambio:+.1f}%)")
+
+
+async def principal(args):
+    mezcla = _leer_mezcla(args.mezcla)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as cliente:
+        muestras = await cargar_muestras(cliente, args.muestras)
+    if not muestras:
+        print("El inventario está vacío; genere datos con python -m benchmark.datos")
+        return None
+
+    ejecucion = datetime.now().strftime("%Y%m%d%H%M%S")
+    ctx = Contexto(muestras, args.productos, ejecucion)
+    niveles = []
+    for concurrencia in args.concurrencia:
+        print(f"Concurrencia {concurrencia}...")
+        niveles.append(await ejecutar_nivel(args, ctx, mezcla, concurrencia))
+
+    return {
+        "commit": _commit_actual(),
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "url": args.url,
+        "semilla": args.semilla,
+        "duracion_s": args.duracion,
+        "mezcla": mezcla,
+        "niveles": niveles,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lanza carga contra el backend y mide latencias.")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrencia", default="1,8,32",
+                        type=lambda t: [int(c) for c in t.split(",")], help="niveles separados por comas")
+    parser.add_argument("--duracion", type=float, default=30, help="segundos medidos por nivel")
+    parser.add_argument("--calentamiento", type=float, default=5, help="segundos sin medir antes de cada nivel")
+    parser.add_argument("--mezcla", help="pesos, p. ej. buscar_codigo_barras=50,exportar_csv=0")
+    parser.add_argument("--muestras", type=int, default=5000, help="piezas leídas para las búsquedas")
+    parser.add_argument("--productos", type=int, default=2000, help="productos generados por benchmark.datos")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--salida", help="archivo JSON (por defecto benchmark/resultados/<fecha>_<commit>.json)")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior")
+    args = parser.parse_args(argv)
+
+    if httpx is None:
+        print("El generador de carga necesita httpx: pip install httpx")
+        return 2
+
+    resultado = asyncio.run(principal(args))
+    if resultado is None:
+        return 1
+    imprimir(resultado)
+
+    salida = args.salida
+    if not salida:
+        os.makedirs(DIRECTORIO_RESULTADOS, exist_ok=True)
+        nombre = f"{datetime.now():%Y%m%d_%H%M%S}_{resultado['commit'] or 'sin_commit'}.json"
+        salida = os.path.join(DIRECTORIO_RESULTADOS, nombre)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(resultado, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
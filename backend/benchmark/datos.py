@@ -0,0 +1,189 @@
+# backend/benchmark/datos.py
+# Genera un conjunto de datos reproducible (misma semilla -> mismas filas).
+#
+#   python -m benchmark.datos --piezas 100000 --movimientos 300000 --semilla 1
+#
+# Usa la base de datos de .env. Para no tocar datos reales se niega a
+# continuar si DB_NAME no contiene "bench", salvo que se pase --forzar.
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import database
+import migraciones
+from models import reconciliar_stock
+
+ESTADOS = [
+    ("disponible", 60),
+    ("almacenado", 15),
+    ("en_venta", 8),
+    ("en_reparacion", 5),
+    ("en_garantia", 4),
+    ("salida", 8),
+]
+ROLES = ["admin", "registro", "salida"]
+TIPOS_MOVIMIENTO = ["cambio_estado", "salida", "reubicacion"]
+
+LOTE = 5000
+
+# Hash bcrypt de "benchmark" (todos los usuarios generados comparten contraseña)
+PASSWORD_HASH = "$2b$12$Zx7XnBt9EzQO.CWdvAuIrO5T0fAiOjb0Xc3/5GI5MUeQDgHeH/MLK"
+
+TABLAS = ["movimiento", "pieza", "stock_producto", "producto", "usuario", "dron"]
+
+
+def _insertar(cursor, sql, filas):
+    for i in range(0, len(filas), LOTE):
+        cursor.executemany(sql, filas[i:i + LOTE])
+
+
+def _insertar_generador(cursor, sql, filas):
+    """Inserta filas de un generador por lotes, sin tenerlas todas en memoria."""
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= LOTE:
+            cursor.executemany(sql, lote)
+            lote = []
+    if lote:
+        cursor.executemany(sql, lote)
+
+
+def codigo_barras(indice):
+    # Mismo formato que generar_codigo_otech, pero determinista
+    return f"OTech-{indice:08X}-BM{indice:06d}"
+
+
+def numero_serie(indice):
+    return f"BM{indice:09d}"
+
+
+def codigo_original(indice):
+    return f"PROV-BM-{indice:06d}"
+
+
+def generar(conn, args):
+    azar = random.Random(args.semilla)
+    cursor = conn.cursor()
+    inicio = time.perf_counter()
+
+    def paso(texto):
+        print(f"[{time.perf_counter() - inicio:7.1f}s] {texto}")
+
+    for version, nombre, modulo in migraciones.pendientes(cursor):
+        migraciones.aplicar(cursor, version, nombre, modulo)
+
+    if args.limpiar:
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+        for tabla in TABLAS:
+            cursor.execute(f"TRUNCATE TABLE {tabla}")
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+        paso("Tablas vaciadas")
+
+    cursor.execute("SELECT COUNT(*) FROM pieza")
+    if cursor.fetchone()[0] and not args.limpiar:
+        print("La tabla pieza ya tiene datos; use --limpiar para regenerarlos.")
+        return 1
+
+    _insertar(cursor, "INSERT INTO dron (id, nombre) VALUES (%s, %s)",
+              [(i, f"Dron BM {i}") for i in range(1, args.drones + 1)])
+    _insertar(cursor, """
+        INSERT INTO usuario (id_usuario, nombre_usuario, nombre_completo, email, rol, activo, password_hash)
+        VALUES (%s, %s, %s, %s, %s, 1, %s)
+    """, [(i, f"bm{i}", f"Usuario BM {i}", f"bm{i}@otech.test", ROLES[i % len(ROLES)], PASSWORD_HASH)
+          for i in range(1, args.usuarios + 1)])
+    _insertar(cursor, """
+        INSERT INTO producto (id_producto, codigo_original, nombre, descripcion, id_dron, stock_minimo)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, [(i, codigo_original(i), f"Producto BM {i}", "Generado para pruebas de rendimiento",
+           azar.randint(1, args.drones), azar.choice([0, 0, 5, 10, 50]))
+          for i in range(1, args.productos + 1)])
+    paso(f"{args.drones} drones, {args.usuarios} usuarios, {args.productos} productos")
+
+    estados = [e for e, _ in ESTADOS]
+    pesos = [p for _, p in ESTADOS]
+    desde = datetime.now() - timedelta(days=args.dias)
+    # Los productos siguen una distribución desigual, como en el almacén real
+    productos = list(range(1, args.productos + 1))
+    pesos_producto = [1 / (i ** 0.8) for i in productos]
+    segundos_por_pieza = args.dias * 86400 / max(1, args.piezas)
+
+    def piezas():
+        for i in range(1, args.piezas + 1):
+            yield (
+                i,
+                azar.choices(productos, pesos_producto)[0],
+                numero_serie(i),
+                codigo_barras(i),
+                azar.choices(estados, pesos)[0],
+                azar.randint(1, args.usuarios),
+                f"C{azar.randint(1, args.cajas):04d}",
+                desde + timedelta(seconds=i * segundos_por_pieza),
+            )
+
+    _insertar_generador(cursor, """
+        INSERT INTO pieza (id_pieza, id_producto, numero_serie, codigo_barras, estado, id_usuario, caja, fecha_registro)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """, piezas())
+    paso(f"{args.piezas} piezas")
+
+    def movimientos():
+        # Un registro_inicial por pieza y el resto repartido al azar
+        for i in range(1, args.movimientos + 1):
+            if i <= args.piezas:
+                id_pieza, tipo, anterior, nuevo = i, "registro_inicial", None, "disponible"
+                fecha = desde + timedelta(seconds=i * segundos_por_pieza)
+            else:
+                id_pieza = azar.randint(1, args.piezas)
+                tipo = azar.choice(TIPOS_MOVIMIENTO)
+                anterior, nuevo = azar.sample(estados, 2)
+                fecha = desde + timedelta(seconds=azar.randint(0, args.dias * 86400))
+            yield (id_pieza, tipo, anterior, nuevo, azar.randint(1, args.usuarios), "", fecha)
+
+    _insertar_generador(cursor, """
+        INSERT INTO movimiento (id_pieza, tipo_movimiento, estado_anterior, estado_nuevo, id_usuario, observaciones, fecha_movimiento)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """, movimientos())
+    paso(f"{args.movimientos} movimientos")
+
+    cursor.close()
+    diferencias = reconciliar_stock(corregir=True)
+    paso(f"Contadores de stock reconstruidos ({len(diferencias)} filas)")
+    cursor = conn.cursor()
+    cursor.execute("ANALYZE TABLE pieza, movimiento, producto")
+    cursor.fetchall()
+    cursor.close()
+    paso("Listo")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera datos de prueba reproducibles.")
+    parser.add_argument("--piezas", type=int, default=100_000)
+    parser.add_argument("--movimientos", type=int, default=300_000)
+    parser.add_argument("--productos", type=int, default=2_000)
+    parser.add_argument("--drones", type=int, default=20)
+    parser.add_argument("--usuarios", type=int, default=50)
+    parser.add_argument("--cajas", type=int, default=500)
+    parser.add_argument("--dias", type=int, default=730, help="antigüedad de los registros más viejos")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--limpiar", action="store_true", help="vacía las tablas antes de generar")
+    parser.add_argument("--forzar", action="store_true", help="permite usar una base cuyo nombre no contiene 'bench'")
+    args = parser.parse_args(argv)
+
+    nombre_db = os.getenv("DB_NAME", "")
+    if "bench" not in nombre_db.lower() and not args.forzar:
+        print(f"DB_NAME='{nombre_db}' no parece una base de pruebas; use --forzar si está seguro.")
+        return 2
+    if args.movimientos < args.piezas:
+        args.movimientos = args.piezas
+
+    with database.conexion() as conn:
+        return generar(conn, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
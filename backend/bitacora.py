@@ -0,0 +1,52 @@
+# backend/bitacora.py
+# Configuración del logging: una línea JSON por evento (o texto legible en
+# desarrollo) y nivel configurable, para no escribir en stdout en cada petición.
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+
+# Atributos propios de LogRecord; todo lo demás llega por extra={...}
+_ESTANDAR = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class FormatoJSON(logging.Formatter):
+    def format(self, registro):
+        evento = {
+            "fecha": datetime.fromtimestamp(registro.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": registro.levelname,
+            "origen": registro.name,
+            "mensaje": registro.getMessage(),
+        }
+        for clave, valor in vars(registro).items():
+            if clave not in _ESTANDAR and not clave.startswith("_"):
+                evento[clave] = valor
+        if registro.exc_info:
+            evento["excepcion"] = self.formatException(registro.exc_info)
+        return json.dumps(evento, ensure_ascii=False, default=str)
+
+
+class FormatoTexto(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s")
+
+    def format(self, registro):
+        texto = super().format(registro)
+        extra = {k: v for k, v in vars(registro).items() if k not in _ESTANDAR and not k.startswith("_")}
+        if extra:
+            texto += " " + " ".join(f"{k}={v}" for k, v in extra.items())
+        return texto
+
+
+def configurar():
+    """
+    LOG_NIVEL: DEBUG, INFO, WARNING... (por defecto INFO)
+    LOG_FORMATO: json o texto (por defecto json)
+    """
+    manejador = logging.StreamHandler(sys.stderr)
+    manejador.setFormatter(FormatoTexto() if os.getenv("LOG_FORMATO", "json") == "texto" else FormatoJSON())
+
+    raiz = logging.getLogger()
+    raiz.handlers[:] = [manejador]
+    raiz.setLevel(os.getenv("LOG_NIVEL", "INFO").upper())
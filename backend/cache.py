@@ -0,0 +1,78 @@
+# backend/cache.py
+# Caché en memoria acotada (LRU) con caducidad opcional, segura entre hilos.
+import threading
+import time
+from collections import OrderedDict
+
+_AUSENTE = object()
+
+
+class CacheLRU:
+    def __init__(self, maximo=1024, ttl=None, normalizar=None):
+        self.maximo = max(1, maximo)
+        self.ttl = ttl
+        # Función que lleva las claves equivalentes a una sola (p. ej. sin distinguir
+        # mayúsculas si la base de datos tampoco las distingue)
+        self.normalizar = normalizar or (lambda clave: clave)
+        self._datos = OrderedDict()  # clave -> (valor, caduca_en)
+        self._lock = threading.Lock()
+        # Se incrementa en cada invalidación; evita guardar resultados
+        # que se consultaron antes de que los datos cambiaran.
+        self.generacion = 0
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave, defecto=None):
+        clave = self.normalizar(clave)
+        with self._lock:
+            entrada = self._datos.get(clave, _AUSENTE)
+            if entrada is _AUSENTE:
+                self.fallos += 1
+                return defecto
+            valor, caduca_en = entrada
+            if caduca_en is not None and caduca_en < time.monotonic():
+                del self._datos[clave]
+                self.fallos += 1
+                return defecto
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return valor
+
+    def guardar(self, clave, valor, generacion=None):
+        clave = self.normalizar(clave)
+        with self._lock:
+            if generacion is not None and generacion != self.generacion:
+                return False
+            caduca_en = time.monotonic() + self.ttl if self.ttl else None
+            self._datos[clave] = (valor, caduca_en)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+            return True
+
+    def invalidar(self, *claves):
+        with self._lock:
+            self.generacion += 1
+            for clave in claves:
+                self._datos.pop(self.normalizar(clave), None)
+
+    def invalidar_si(self, predicado):
+        """Elimina las entradas para las que predicado(clave, valor) es verdadero."""
+        with self._lock:
+            self.generacion += 1
+            for clave in [c for c, (v, _) in self._datos.items() if predicado(c, v)]:
+                del self._datos[clave]
+
+    def limpiar(self):
+        with self._lock:
+            self.generacion += 1
+            self._datos.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "entradas": len(self._datos),
+                "maximo": self.maximo,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+            }
@@ -0,0 +1,112 @@
+# backend/cambios.py
+# Canal de cambios para los clientes (Server-Sent Events): cada escritura
+# publica un evento pequeño con un número de secuencia creciente, y los
+# clientes aplican esos deltas en lugar de volver a descargar el inventario.
+#
+# La secuencia y el historial viven en memoria del proceso: al reiniciar el
+# backend (o con varios procesos) los clientes reciben 'reiniciar' y recargan.
+import asyncio
+import json
+import os
+import threading
+from collections import deque
+
+HISTORIAL = int(os.getenv("CAMBIOS_HISTORIAL", 2000))
+LATIDO = 15  # segundos entre comentarios de mantenimiento de la conexión
+
+_eventos = deque(maxlen=HISTORIAL)  # (secuencia, tipo, datos)
+_secuencia = 0
+_lock = threading.Lock()
+_suscriptores = set()
+_loop = None
+
+
+def iniciar():
+    """Debe llamarse desde el bucle de eventos (lifespan)."""
+    global _loop
+    _loop = asyncio.get_running_loop()
+
+
+def secuencia_actual():
+    with _lock:
+        return _secuencia
+
+
+def publicar(tipo, datos):
+    """
+    Registra un cambio y despierta a los clientes conectados.
+    Se puede llamar desde cualquier hilo (p. ej. con uow.despues_de_confirmar).
+    """
+    global _secuencia
+    with _lock:
+        _secuencia += 1
+        _eventos.append((_secuencia, tipo, datos))
+        secuencia = _secuencia
+        suscriptores = list(_suscriptores)
+
+    if _loop is not None and suscriptores:
+        for evento in suscriptores:
+            _loop.call_soon_threadsafe(evento.set)
+    return secuencia
+
+
+def eventos_desde(secuencia):
+    """
+    Eventos posteriores a 'secuencia'. Devuelve (eventos, completo); completo es
+    False si el historial ya no alcanza y el cliente debe recargar todo.
+    """
+    with _lock:
+        if secuencia > _secuencia:
+            # Secuencia de otra ejecución del backend
+            return [], False
+        if not _eventos:
+            return [], secuencia == _secuencia
+        primera = _eventos[0][0]
+        if secuencia < primera - 1:
+            return [], False
+        return [e for e in _eventos if e[0] > secuencia], True
+
+
+def _formatear(secuencia, tipo, datos):
+    return f"id: {secuencia}\nevent: {tipo}\ndata: {json.dumps(datos, default=str, separators=(',', ':'))}\n\n"
+
+
+async def suscribir(desde, desconectado):
+    """
+    Generador de mensajes SSE a partir de la secuencia 'desde' (None = desde ahora).
+    'desconectado' es una corrutina que indica si el cliente se fue.
+    """
+    aviso = asyncio.Event()
+    with _lock:
+        _suscriptores.add(aviso)
+    try:
+        ultima = secuencia_actual() if desde is None else desde
+        yield _formatear(ultima, "inicio", {"secuencia": ultima})
+
+        while not await desconectado():
+            eventos, completo = eventos_desde(ultima)
+            if not completo:
+                ultima = secuencia_actual()
+                yield _formatear(ultima, "reiniciar", {"secuencia": ultima})
+                continue
+            for secuencia, tipo, datos in eventos:
+                yield _formatear(secuencia, tipo, datos)
+                ultima = secuencia
+
+            try:
+                await asyncio.wait_for(aviso.wait(), timeout=LATIDO)
+            except asyncio.TimeoutError:
+                yield ": latido\n\n"
+            aviso.clear()
+    finally:
+        with _lock:
+            _suscriptores.discard(aviso)
+
+
+def estadisticas():
+    with _lock:
+        return {
+            "secuencia": _secuencia,
+            "historial": len(_eventos),
+            "clientes": len(_suscriptores),
+        }
@@ -1,31 +1,487 @@
-
 import mysql.connector
 from mysql.connector import Error
+import asyncio
+import functools
+import logging
 import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
+import metricas
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
+def _env_int(nombre, defecto):
+    try:
+        return int(os.getenv(nombre, defecto))
+    except ValueError:
+        return defecto
+
+
+def _env_float(nombre, defecto):
+    try:
+        return float(os.getenv(nombre, defecto))
+    except ValueError:
+        return defecto
+
+
+class PoolAgotado(Error):
+    """No se liberó ninguna conexión del pool dentro del tiempo de espera."""
+
+
+class ConexionPool:
+    """Envoltura de una conexión del pool: close() la devuelve en lugar de cerrarla."""
+
+    def __init__(self, pool, conexion):
+        self._pool = pool
+        self._conexion = conexion
+        self._devuelta = False
+
+    def __getattr__(self, nombre):
+        return getattr(self._conexion, nombre)
+
+    def cursor(self, *args, **kwargs):
+        return metricas.CursorMedido(self._conexion.cursor(*args, **kwargs))
+
+    def is_connected(self):
+        if self._devuelta:
+            return False
+        return self._conexion.is_connected()
+
+    def close(self):
+        if self._devuelta:
+            return
+        self._devuelta = True
+        self._pool.devolver(self._conexion)
+
+    def descartar(self):
+        """Libera el hueco del pool cerrando el socket, sin leer resultados pendientes."""
+        if self._devuelta:
+            return
+        self._devuelta = True
+        self._pool.descartar(self._conexion)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class PoolConexiones:
+    """Pool acotado de conexiones MySQL con espera, verificación y estadísticas."""
+
+    def __init__(self, config, tamano=10, minimo=0, espera=5.0,
+                 verificar_tras=5.0, reciclar_tras=1800.0):
+        self._config = config
+        self.tamano = max(1, tamano)
+        self.minimo = min(max(0, minimo), self.tamano)
+        self.espera = espera
+        self.verificar_tras = verificar_tras
+        self.reciclar_tras = reciclar_tras
+
+        self._cond = threading.Condition()
+        # Conexiones libres: (conexion, devuelta_en)
+        self._libres = deque()
+        self._creada_en = {}
+        self._abiertas = 0
+        self._en_uso = 0
+        self._esperando = 0
+        self._cerrado = False
+
+        self._total_creadas = 0
+        self._total_descartadas = 0
+        self._total_prestamos = 0
+        self._total_agotado = 0
+
+    # --- Ciclo de vida ---
+
+    def precalentar(self):
+        for _ in range(self.minimo):
+            with self._cond:
+                if self._abiertas >= self.tamano:
+                    break
+                self._abiertas += 1
+            try:
+                conexion = self._nueva_conexion()
+            except Exception:
+                with self._cond:
+                    self._abiertas -= 1
+                raise
+            with self._cond:
+                self._libres.append((conexion, time.monotonic()))
+                self._cond.notify()
+
+    def cerrar(self):
+        with self._cond:
+            self._cerrado = True
+            libres = list(self._libres)
+            self._libres.clear()
+            self._abiertas -= len(libres)
+            self._cond.notify_all()
+        for conexion, _ in libres:
+            self._descartar(conexion, contar=False)
+
+    # --- Préstamo y devolución ---
+
+    def obtener(self, espera=None):
+        espera = self.espera if espera is None else espera
+        inicio = time.monotonic()
+        limite = inicio + espera
+
+        with self._cond:
+            if self._cerrado:
+                raise PoolAgotado("El pool de conexiones está cerrado")
+
+            self._esperando += 1
+            try:
+                while not self._libres and self._abiertas >= self.tamano:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self._total_agotado += 1
+                        raise PoolAgotado(
+                            f"Sin conexiones libres tras {espera:.1f}s "
+                            f"(tamaño del pool: {self.tamano})"
+                        )
+                    self._cond.wait(restante)
+                    if self._cerrado:
+                        raise PoolAgotado("El pool de conexiones está cerrado")
+            finally:
+                self._esperando -= 1
+
+            if self._libres:
+                conexion, devuelta_en = self._libres.pop()
+            else:
+                conexion, devuelta_en = None, None
+                self._abiertas += 1
+            self._en_uso += 1
+
+        # Fuera del candado: crear o verificar la conexión
+        try:
+            if conexion is None:
+                conexion = self._nueva_conexion()
+            elif not self._sigue_viva(conexion, devuelta_en):
+                self._descartar(conexion)
+                conexion = self._nueva_conexion()
+        except Exception:
+            with self._cond:
+                self._abiertas -= 1
+                self._en_uso -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._total_prestamos += 1
+        metricas.conexion_espera_segundos.observar(valor=time.monotonic() - inicio)
+        return ConexionPool(self, conexion)
+
+    def devolver(self, conexion):
+        reutilizable = True
+        try:
+            if getattr(conexion, "unread_result", False):
+                conexion.consume_results()
+            if conexion.in_transaction:
+                conexion.rollback()
+            reutilizable = conexion.is_connected()
+        except Exception:
+            reutilizable = False
+
+        creada_en = self._creada_en.get(id(conexion), 0)
+        if reutilizable and self.reciclar_tras and time.monotonic() - creada_en > self.reciclar_tras:
+            reutilizable = False
+
+        with self._cond:
+            self._en_uso -= 1
+            if reutilizable and not self._cerrado:
+                self._libres.append((conexion, time.monotonic()))
+            else:
+                self._abiertas -= 1
+            self._cond.notify()
+
+        if not reutilizable or self._cerrado:
+            self._descartar(conexion)
+
+    def descartar(self, conexion):
+        # Para conexiones con un resultado sin búfer a medio leer: tanto devolver()
+        # como close() (QUIT) leerían antes el resto de filas. shutdown() corta el
+        # socket sin leer nada y el servidor aborta la consulta al no poder escribir.
+        with self._cond:
+            self._en_uso -= 1
+            self._abiertas -= 1
+            self._cond.notify()
+        self._descartar(conexion, cortar=True)
+
+    # --- Estadísticas ---
+
+    def estadisticas(self):
+        with self._cond:
+            return {
+                "tamano": self.tamano,
+                "abiertas": self._abiertas,
+                "en_uso": self._en_uso,
+                "libres": len(self._libres),
+                "esperando": self._esperando,
+                "creadas": self._total_creadas,
+                "descartadas": self._total_descartadas,
+                "prestamos": self._total_prestamos,
+                "agotado": self._total_agotado,
+            }
+
+    # --- Internos ---
+
+    def _nueva_conexion(self):
+        logger.debug("Abriendo conexión a MySQL", extra={"host": self._config.get("host")})
+        conexion = mysql.connector.connect(**self._config)
+        if not conexion.is_connected():
+            raise Error("Conexión fallida: no está conectado.")
+        self._creada_en[id(conexion)] = time.monotonic()
+        with self._cond:
+            self._total_creadas += 1
+        logger.debug("Conexión a MySQL establecida", extra={"abiertas": self._abiertas})
+        return conexion
+
+    def _sigue_viva(self, conexion, devuelta_en):
+        # Solo se hace ping si la conexión llevaba un rato sin usarse
+        if time.monotonic() - devuelta_en < self.verificar_tras:
+            return True
+        try:
+            conexion.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _descartar(self, conexion, contar=True, cortar=False):
+        self._creada_en.pop(id(conexion), None)
+        if contar:
+            with self._cond:
+                self._total_descartadas += 1
+        try:
+            if cortar:
+                conexion.shutdown()
+            else:
+                conexion.close()
+        except Exception:
+            pass
+
+
+def _config_conexion():
+    return dict(
+        host=os.getenv("DB_HOST", "localhost"),
+        user=os.getenv("DB_USER", "root"),
+        password=os.getenv("DB_PASSWORD", ""),
+        database=os.getenv("DB_NAME", "prueba_otech_inventory"),
+        autocommit=True,
+        connection_timeout=_env_int("DB_CONNECT_TIMEOUT", 10)  #tiempo de espera de 10 segundos
+    )
+
+
+_pool = None
+_pool_lock = threading.Lock()
+# Hilos dedicados al acceso a la base de datos; tantos como conexiones en el pool
+_ejecutor = None
+
+
+def iniciar_pool(precalentar=True):
+    """
+    Crea el pool global y su ejecutor (se llama al arrancar la aplicación).
+    Con precalentar=False no abre conexiones todavía (ver precalentar_pool).
+    """
+    global _pool, _ejecutor
+    with _pool_lock:
+        if _ejecutor is None:
+            _ejecutor = ThreadPoolExecutor(
+                max_workers=max(1, _env_int("DB_POOL_SIZE", 10)),
+                thread_name_prefix="db"
+            )
+        if _pool is None:
+            _pool = PoolConexiones(
+                _config_conexion(),
+                tamano=_env_int("DB_POOL_SIZE", 10),
+                minimo=_env_int("DB_POOL_MIN", 2),
+                espera=_env_float("DB_POOL_TIMEOUT", 5),
+                verificar_tras=_env_float("DB_POOL_PING_TRAS", 5),
+                reciclar_tras=_env_float("DB_POOL_RECICLAR", 1800),
+            )
+            if precalentar:
+                precalentar_pool()
+        return _pool
+
+
+def precalentar_pool():
+    """Abre las conexiones mínimas del pool; si la base no responde solo avisa."""
+    pool = _pool
+    if pool is None:
+        return
+    try:
+        pool.precalentar()
+    except Exception as e:
+        logger.warning("No se pudo precalentar el pool de conexiones", extra={"error": str(e)})
+
+
+def cerrar_pool():
+    """Cierra todas las conexiones libres (se llama al detener la aplicación)."""
+    global _pool, _ejecutor
+    with _pool_lock:
+        pool, _pool = _pool, None
+        ejecutor, _ejecutor = _ejecutor, None
+    if ejecutor is not None:
+        ejecutor.shutdown(wait=True)
+    if pool is not None:
+        pool.cerrar()
+
+
+def _ejecutor_db():
+    ejecutor = _ejecutor
+    if ejecutor is None:
+        # Sin lifespan (pruebas, scripts): se crea sin abrir conexiones porque se
+        # llama desde el bucle de eventos; cada conexión se abre al pedirla en el ejecutor
+        iniciar_pool(precalentar=False)
+        ejecutor = _ejecutor
+    return ejecutor
+
+
+async def en_hilo_db(funcion, *args, **kwargs):
+    """
+    Ejecuta una función bloqueante de acceso a datos en el ejecutor de la base
+    de datos, sin bloquear el bucle de eventos.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_ejecutor_db(), functools.partial(funcion, *args, **kwargs))
+
+
+def obtener_pool():
+    return _pool if _pool is not None else iniciar_pool()
+
+
+def estadisticas_pool():
+    if _pool is None:
+        return None
+    return _pool.estadisticas()
+
+
+@contextmanager
+def conexion():
+    """Presta una conexión del pool y la devuelve al salir del bloque."""
+    conn = obtener_pool().obtener()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+@contextmanager
+def cursor(dictionary=True):
+    """Presta una conexión, abre un cursor y libera ambos al salir del bloque."""
+    with conexion() as conn:
+        cur = conn.cursor(dictionary=dictionary)
+        try:
+            yield cur
+        finally:
+            cur.close()
+
+
+def en_segundo_plano(funcion, *args, **kwargs):
+    """Encola una escritura en el ejecutor de la base de datos sin esperar el resultado."""
+    ejecutor = _ejecutor_db()
+
+    def _ejecutar():
+        try:
+            funcion(*args, **kwargs)
+        except Exception:
+            logger.exception("Error en tarea de base de datos en segundo plano")
+
+    ejecutor.submit(_ejecutar)
+
+
+class UnidadDeTrabajo:
+    """
+    Agrupa una operación de negocio en una sola conexión y una sola transacción.
+
+        with UnidadDeTrabajo() as uow:
+            crear_pieza(..., uow=uow)
+            registrar_movimiento(..., uow=uow)
+
+    Confirma al salir del bloque sin errores y revierte si hubo una excepción.
+    Las funciones registradas con despues_de_confirmar() se ejecutan tras el commit.
+    """
+
+    def __init__(self):
+        self.conn = None
+        self._al_confirmar = []
+
+    def __enter__(self):
+        self.conn = obtener_pool().obtener()
+        self.conn.start_transaction()
+        return self
+
+    def cursor(self, dictionary=False):
+        return self.conn.cursor(dictionary=dictionary)
+
+    def despues_de_confirmar(self, funcion, *args, **kwargs):
+        self._al_confirmar.append(functools.partial(funcion, *args, **kwargs))
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+        finally:
+            self.conn.close()
+        if exc_type is None:
+            for funcion in self._al_confirmar:
+                funcion()
+        return False
+
+
+@contextmanager
+def cursor_de(uow=None, dictionary=False):
+    """Cursor dentro de la unidad de trabajo indicada, o en una conexión propia si no hay."""
+    if uow is None:
+        with cursor(dictionary=dictionary) as cur:
+            yield cur
+    else:
+        cur = uow.cursor(dictionary=dictionary)
+        try:
+            yield cur
+        finally:
+            cur.close()
+
+
 def get_db_connection():
     try:
-        print("Intentando conectar a MySQL...")
-        connection = mysql.connector.connect(
-            host=os.getenv("DB_HOST", "localhost"),
-            user=os.getenv("DB_USER", "root"),
-            password=os.getenv("DB_PASSWORD", ""),
-            database=os.getenv("DB_NAME", "prueba_otech_inventory"),
-            autocommit=True,
-            connection_timeout=10  #tiempo de espera de 10 segundos
-        )
-        if connection.is_connected():
-            print("¡Conexión a MySQL ESTABLECIDA!")
-            return connection
-        else:
-            print("Conexión fallida: no está conectado.")
-            return None
+        return obtener_pool().obtener()
+    except PoolAgotado as e:
+        logger.error("Pool de conexiones agotado", extra={"error": str(e)})
+        return None
     except Error as e:
-        print(f"ERROR FATAL al conectar a MySQL: {e}")
+        logger.error("Error al conectar a MySQL", extra={"error": str(e)})
         return None
-    except Exception as e:
-        print(f"ERROR INESPERADO: {e}")
-        return None
\ No newline at end of file
+    except Exception:
+        logger.exception("Error inesperado al obtener una conexión")
+        return None
+
+
+
+# --- Métricas del pool (se leen al consultar /metrics) ---
+
+_medidor_pool = metricas.Medidor("otech_db_pool_conexiones", "Estado actual del pool de conexiones.", ("estado",))
+_totales_pool = metricas.Contador("otech_db_pool_eventos_total", "Totales acumulados del pool desde el arranque.", ("evento",))
+
+
+@metricas.al_exponer
+def _metricas_pool():
+    estadisticas = estadisticas_pool()
+    if estadisticas is None:
+        return
+    for clave in ("abiertas", "en_uso", "libres", "esperando"):
+        _medidor_pool.fijar(clave, valor=estadisticas[clave])
+    for clave in ("creadas", "descartadas", "prestamos", "agotado"):
+        _totales_pool.fijar(clave, valor=estadisticas[clave])
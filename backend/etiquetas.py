@@ -0,0 +1,321 @@
+# backend/etiquetas.py
+# Generación de etiquetas Code128 fuera del bucle de eventos, con caché y
+# generación bajo demanda (una sola vez por código aunque lleguen varias peticiones).
+import asyncio
+import functools
+import logging
+import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import quote
+
+import almacen_etiquetas
+from cache import CacheLRU
+
+logger = logging.getLogger(__name__)
+
+FORMATOS = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+_cache = CacheLRU(maximo=int(os.getenv("ETIQUETAS_CACHE_MAX", 512)))
+_en_curso = {}
+_lock = threading.Lock()
+_ejecutor = None
+_almacen = None
+
+# Sube si cambia el dibujo de las etiquetas: invalida los ETag que tienen los clientes
+VERSION_ETIQUETAS = 1
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def iniciar():
+    global _ejecutor
+    with _lock:
+        if _ejecutor is None:
+            _ejecutor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("ETIQUETAS_HILOS", 2)),
+                thread_name_prefix="etiquetas"
+            )
+        return _ejecutor
+
+
+def detener():
+    global _ejecutor
+    with _lock:
+        ejecutor, _ejecutor = _ejecutor, None
+    if ejecutor is not None:
+        ejecutor.shutdown(wait=True)
+
+
+def codigo_valido(codigo):
+    # Lo que Code128 puede dibujar (ASCII imprimible) y cabe en pieza.codigo_barras.
+    # Si la pieza existe lo decide la base de datos; el almacén escapa el nombre
+    # de archivo, así que '/', '#', '+'... no son un problema.
+    return 0 < len(codigo) <= 64 and all(" " <= c <= "~" for c in codigo)
+
+
+def url(base_url, codigo, formato="png"):
+    """Dirección de la etiqueta en /codigos, con el código escapado."""
+    return f"{base_url}/codigos/{quote(codigo, safe='')}.{formato}"
+
+
+def almacen():
+    global _almacen
+    if _almacen is None:
+        with _lock:
+            if _almacen is None:
+                _almacen = almacen_etiquetas.crear()
+    return _almacen
+
+
+def almacenada(codigo, formato="png"):
+    return almacen().existe(codigo, formato)
+
+
+def etag(codigo, formato="png"):
+    # La imagen de un código no cambia nunca: el ETag sale del código, sin leer nada
+    return f'"{codigo}.{formato}.v{VERSION_ETIQUETAS}"'
+
+
+def renderizar(codigo, formato="png"):
+    """Dibuja la etiqueta y devuelve los bytes de la imagen."""
+    # python-barcode y PIL se importan al primer dibujo (o en calentar), no al arrancar
+    import barcode
+    from barcode.writer import ImageWriter, SVGWriter
+
+    writer = ImageWriter() if formato == "png" else SVGWriter()
+    salida = BytesIO()
+    barcode.get('code128', codigo, writer=writer).write(salida)
+    return salida.getvalue()
+
+
+def _generar(codigo, formato):
+    datos = almacen().leer(codigo, formato)
+    if datos is None:
+        datos = renderizar(codigo, formato)
+        almacen().guardar(codigo, formato, datos)
+    _cache.guardar((codigo, formato), datos)
+    return datos
+
+
+def _solicitar(codigo, formato):
+    """Encola la generación; si ya hay una en curso para el mismo código, la reutiliza."""
+    clave = (codigo, formato)
+    ejecutor = _ejecutor or iniciar()
+    nuevo = False
+    with _lock:
+        futuro = _en_curso.get(clave)
+        if futuro is None:
+            futuro = ejecutor.submit(_generar, codigo, formato)
+            _en_curso[clave] = futuro
+            nuevo = True
+    # Fuera del candado: si el futuro ya terminó, el callback se ejecuta aquí mismo
+    if nuevo:
+        futuro.add_done_callback(lambda _f: _liberar(clave))
+    return futuro
+
+
+def _liberar(clave):
+    with _lock:
+        _en_curso.pop(clave, None)
+
+
+def encolar(codigo, formato="png"):
+    """Programa la generación de una etiqueta sin esperar a que termine."""
+    return _solicitar(codigo, formato)
+
+
+def _generar_lote(codigos, formato):
+    for codigo in codigos:
+        clave = (codigo, formato)
+        # Mismo registro de trabajos en curso que _solicitar: si otra petición ya
+        # la está generando se omite, y quien la pida mientras tanto espera a esta
+        with _lock:
+            if clave in _en_curso:
+                continue
+            futuro = _en_curso[clave] = Future()
+        try:
+            futuro.set_result(_generar(codigo, formato))
+        except Exception as e:
+            logger.exception("Error al generar la etiqueta", extra={"codigo": codigo})
+            futuro.set_exception(e)
+        finally:
+            _liberar(clave)
+
+
+def encolar_lote(codigos, formato="png"):
+    """Programa la generación de varias etiquetas como un solo trabajo."""
+    ejecutor = _ejecutor or iniciar()
+    return ejecutor.submit(_generar_lote, list(codigos), formato)
+
+
+def en_cache(codigo, formato="png"):
+    return _cache.obtener((codigo, formato))
+
+
+async def obtener(codigo, formato="png"):
+    """Devuelve los bytes de la etiqueta, generándola si todavía no existe."""
+    datos = _cache.obtener((codigo, formato))
+    if datos is not None:
+        return datos
+    return await asyncio.wrap_future(_solicitar(codigo, formato))
+
+
+# --- Hojas de etiquetas ---
+# Varias etiquetas compuestas en un PDF (una página por hoja del papel) o en un
+# único PNG. Cada símbolo se dibuja a la resolución de la hoja con un número
+# entero de píxeles por módulo: reescalar una imagen ya dibujada deforma la
+# proporción entre barras y el código deja de leerse.
+# Medidas en milímetros; "paso" es la distancia entre etiquetas consecutivas.
+
+PLANTILLAS = {
+    # Rollo de la impresora térmica (una etiqueta por página)
+    "rollo_50x25": {"pagina": (50, 25), "columnas": 1, "filas": 1, "etiqueta": (50, 25),
+                    "margen": (0, 0), "paso": (50, 25)},
+    # A4, 21 por hoja (tipo Avery L7160)
+    "a4_3x7": {"pagina": (210, 297), "columnas": 3, "filas": 7, "etiqueta": (63.5, 38.1),
+               "margen": (7.2, 15.15), "paso": (66.0, 38.1)},
+    # A4, 65 por hoja (tipo Avery L7651)
+    "a4_5x13": {"pagina": (210, 297), "columnas": 5, "filas": 13, "etiqueta": (38.1, 21.2),
+                "margen": (4.75, 10.7), "paso": (40.6, 21.2)},
+    # Carta, 30 por hoja (tipo Avery 5160)
+    "carta_3x10": {"pagina": (215.9, 279.4), "columnas": 3, "filas": 10, "etiqueta": (66.675, 25.4),
+                   "margen": (4.76, 12.7), "paso": (69.85, 25.4)},
+}
+
+FORMATOS_HOJA = {
+    "pdf": "application/pdf",
+    "png": "image/png",
+}
+
+DPI_HOJA = int(os.getenv("ETIQUETAS_DPI", 203))
+# Espacio en blanco dentro de cada etiqueta, en mm
+RELLENO_HOJA = 1.5
+# Módulos en blanco a cada lado de las barras (zona de silencio de Code128)
+ZONA_SILENCIO = 10
+
+# Símbolos ya dibujados por (código, ancho, alto): reimprimir una hoja o un
+# lote que se repite no vuelve a dibujar cada etiqueta (~10 KB cada uno a 203 ppp)
+_simbolos = CacheLRU(maximo=int(os.getenv("ETIQUETAS_SIMBOLOS_MAX", 2048)))
+
+
+def _px(mm, dpi):
+    return round(mm / 25.4 * dpi)
+
+
+@functools.lru_cache(maxsize=None)
+def _fuente(tamano):
+    from PIL import ImageFont
+    import barcode.writer
+    # La misma fuente que usa python-barcode en las etiquetas sueltas
+    ruta = os.path.join(os.path.dirname(barcode.writer.__file__), "fonts", "DejaVuSansMono.ttf")
+    return ImageFont.truetype(ruta, tamano)
+
+
+def _dibujar_simbolo(codigo, ancho, alto):
+    """Code128 de 'codigo' en una imagen de 1 bit que cabe en ancho x alto píxeles."""
+    import barcode
+    from PIL import Image, ImageDraw
+
+    modulos = barcode.get("code128", codigo).build()[0]
+    modulo = ancho // (len(modulos) + 2 * ZONA_SILENCIO)
+    if modulo < 1:
+        raise ValueError(f"El código {codigo} no cabe en la etiqueta a esta resolución")
+    ancho_barras = len(modulos) * modulo
+
+    # Texto legible debajo de las barras (monoespaciada: ~0,6 del tamaño por carácter)
+    tamano = max(1, min(alto // 5, int(ancho_barras / (0.6 * len(codigo)))))
+    fuente = _fuente(tamano)
+    alto_texto = tamano + tamano // 3
+    alto_barras = alto - alto_texto
+
+    imagen = Image.new("1", (ancho_barras + 2 * ZONA_SILENCIO * modulo, alto), 1)
+    dibujo = ImageDraw.Draw(imagen)
+    x = ZONA_SILENCIO * modulo
+    # Una barra por cada tramo de módulos negros consecutivos
+    for tramo in re.finditer("1+", modulos):
+        dibujo.rectangle(
+            (x + tramo.start() * modulo, 0, x + tramo.end() * modulo - 1, alto_barras - 1), fill=0
+        )
+    dibujo.text((imagen.width // 2, alto_barras + tamano // 6), codigo, font=fuente, fill=0, anchor="mt")
+    return imagen
+
+
+def _simbolo(codigo, ancho, alto):
+    clave = (codigo, ancho, alto)
+    simbolo = _simbolos.obtener(clave)
+    if simbolo is None:
+        simbolo = _dibujar_simbolo(codigo, ancho, alto)
+        _simbolos.guardar(clave, simbolo)
+    return simbolo
+
+
+def _componer_pagina(codigos, plantilla, dpi):
+    """Dibuja los códigos (None deja la posición vacía) en una página de 1 bit."""
+    from PIL import Image
+
+    # En blanco y negro puro: barras nítidas y una página A4 ocupa ~1 MB en memoria
+    pagina = Image.new("1", (_px(plantilla["pagina"][0], dpi), _px(plantilla["pagina"][1], dpi)), 1)
+    ancho = _px(plantilla["etiqueta"][0] - 2 * RELLENO_HOJA, dpi)
+    alto = _px(plantilla["etiqueta"][1] - 2 * RELLENO_HOJA, dpi)
+
+    for posicion, codigo in enumerate(codigos):
+        if codigo is None:
+            continue
+        fila, columna = divmod(posicion, plantilla["columnas"])
+        simbolo = _simbolo(codigo, ancho, alto)
+        # Centrado dentro de la etiqueta
+        x = _px(plantilla["margen"][0] + columna * plantilla["paso"][0] + RELLENO_HOJA, dpi) + (ancho - simbolo.width) // 2
+        y = _px(plantilla["margen"][1] + fila * plantilla["paso"][1] + RELLENO_HOJA, dpi) + (alto - simbolo.height) // 2
+        pagina.paste(simbolo, (x, y))
+    return pagina
+
+
+def _guardar_hoja(paginas, formato, dpi):
+    from PIL import Image
+
+    salida = BytesIO()
+    if formato == "pdf":
+        paginas[0].save(salida, "PDF", save_all=True, append_images=paginas[1:], resolution=dpi)
+    else:
+        # Las páginas una debajo de otra en una sola imagen
+        imagen = Image.new("1", (paginas[0].width, sum(p.height for p in paginas)), 1)
+        y = 0
+        for pagina in paginas:
+            imagen.paste(pagina, (0, y))
+            y += pagina.height
+        imagen.save(salida, "PNG", dpi=(dpi, dpi))
+    return salida.getvalue()
+
+
+async def hoja(codigos, plantilla="rollo_50x25", formato="pdf", dpi=DPI_HOJA, inicio=1):
+    """
+    Devuelve los bytes de una hoja con las etiquetas de 'codigos', en orden.
+    'inicio' es la primera posición libre (1 = esquina superior izquierda),
+    para aprovechar hojas ya empezadas. Las páginas se dibujan en el pool.
+    """
+    plantilla = PLANTILLAS[plantilla]
+    por_pagina = plantilla["columnas"] * plantilla["filas"]
+    posiciones = [None] * (inicio - 1) + list(codigos)
+    bucle = asyncio.get_running_loop()
+    ejecutor = _ejecutor or iniciar()
+    paginas = await asyncio.gather(*(
+        bucle.run_in_executor(ejecutor, _componer_pagina, posiciones[i:i + por_pagina], plantilla, dpi)
+        for i in range(0, len(posiciones), por_pagina)
+    ))
+    return await bucle.run_in_executor(ejecutor, _guardar_hoja, paginas, formato, dpi)
+
+
+def calentar():
+    """Importa python-barcode y PIL y dibuja una etiqueta de prueba (carga las fuentes)."""
+    renderizar("OTech-CALENTAR")
+
+
+def estadisticas():
+    with _lock:
+        pendientes = len(_en_curso)
+    return {"pendientes": pendientes, "cache": _cache.estadisticas(), "simbolos": _simbolos.estadisticas()}
@@ -0,0 +1,231 @@
+# backend/exportacion.py
+# Exportación del inventario en streaming (XLSX o CSV) con memoria constante.
+import csv
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from database import get_db_connection
+
+TAMANO_LOTE = 1000
+
+SQL_EXPORTAR_INVENTARIO = """
+    SELECT
+        p.id_pieza,
+        pr.nombre AS nombre_producto,
+        d.nombre AS nombre_dron,
+        p.codigo_barras,
+        p.numero_serie,
+        p.estado,
+        p.fecha_registro,
+        u.nombre_usuario AS usuario_nombre,
+        p.caja
+    FROM pieza p
+    LEFT JOIN producto pr ON p.id_producto = pr.id_producto
+    LEFT JOIN dron d ON pr.id_dron = d.id
+    LEFT JOIN usuario u ON p.id_usuario = u.id_usuario
+    WHERE p.estado = 'disponible'
+    ORDER BY p.fecha_registro DESC
+"""
+
+# (encabezado, ancho de columna en Excel)
+COLUMNAS = [
+    ("ID Pieza", 10),
+    ("Producto", 30),
+    ("Dron", 20),
+    ("Código de Barras", 28),
+    ("Número de Serie", 22),
+    ("Estado", 14),
+    ("Fecha de Registro", 18),
+    ("Registrado por", 18),
+    ("Caja", 12),
+]
+
+INDICE_FECHA = 6
+
+
+def _formatear_fila(fila):
+    valores = []
+    for i, valor in enumerate(fila):
+        if valor is None:
+            valores.append("")
+        elif i == INDICE_FECHA and hasattr(valor, "strftime"):
+            valores.append(valor.strftime('%d/%m/%Y %H:%M'))
+        else:
+            valores.append(valor)
+    return valores
+
+
+def _filas_inventario():
+    """Recorre el inventario por lotes con un cursor sin búfer (no carga todo en memoria).
+
+    La conexión sale del pool y lo ocupa durante toda la descarga: el generador
+    corre en el threadpool de Starlette mientras el cliente va leyendo.
+    """
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError("No se pudo conectar a la base de datos")
+    cursor = conn.cursor()
+    completo = False
+    try:
+        cursor.execute(SQL_EXPORTAR_INVENTARIO)
+        while True:
+            lote = cursor.fetchmany(TAMANO_LOTE)
+            if not lote:
+                break
+            yield [_formatear_fila(fila) for fila in lote]
+        completo = True
+    finally:
+        if completo:
+            cursor.close()
+            conn.close()
+        else:
+            # Cliente desconectado o error a mitad: cerrar el cursor o devolver
+            # la conexión leería antes el resto de la tabla. Se descarta sin drenar.
+            conn.descartar()
+
+
+# --- CSV ---
+
+def generar_csv():
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    escritor.writerow([nombre for nombre, _ in COLUMNAS])
+    # BOM para que Excel detecte UTF-8
+    yield ("\ufeff" + salida.getvalue()).encode("utf-8")
+
+    for lote in _filas_inventario():
+        salida.seek(0)
+        salida.truncate()
+        escritor.writerows(lote)
+        yield salida.getvalue().encode("utf-8")
+
+
+# --- XLSX ---
+
+class _SalidaPorTrozos:
+    """Destino no posicionable para zipfile: acumula bytes hasta que se vacían."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b"".join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>
+</Types>"""
+
+_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+
+_WORKBOOK = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="Inventario" sheetId="1" r:id="rId1"/></sheets>
+</workbook>"""
+
+_WORKBOOK_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+</Relationships>"""
+
+# Estilos: 0 = por defecto, 1 = encabezado (blanco sobre 2C3E50, centrado), 2 = cuerpo
+_STYLES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<fonts count="3">
+<font><sz val="11"/><name val="Calibri"/></font>
+<font><b/><sz val="12"/><color rgb="FFFFFFFF"/><name val="Calibri"/></font>
+<font><sz val="11"/><name val="Calibri"/></font>
+</fonts>
+<fills count="3">
+<fill><patternFill patternType="none"/></fill>
+<fill><patternFill patternType="gray125"/></fill>
+<fill><patternFill patternType="solid"><fgColor rgb="FF2C3E50"/><bgColor rgb="FF2C3E50"/></patternFill></fill>
+</fills>
+<borders count="2">
+<border><left/><right/><top/><bottom/><diagonal/></border>
+<border><left style="thin"/><right style="thin"/><top style="thin"/><bottom style="thin"/><diagonal/></border>
+</borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="3">
+<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>
+<xf numFmtId="0" fontId="1" fillId="2" borderId="1" xfId="0" applyFont="1" applyFill="1" applyBorder="1" applyAlignment="1"><alignment horizontal="center" vertical="center"/></xf>
+<xf numFmtId="0" fontId="2" fillId="0" borderId="1" xfId="0" applyFont="1" applyBorder="1" applyAlignment="1"><alignment horizontal="left" vertical="center"/></xf>
+</cellXfs>
+<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>
+</styleSheet>"""
+
+_CARACTERES_INVALIDOS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+_LETRAS = [chr(ord("A") + i) for i in range(len(COLUMNAS))]
+
+
+def _celda(columna, fila, valor, estilo):
+    ref = f"{_LETRAS[columna]}{fila}"
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return f'<c r="{ref}" s="{estilo}"><v>{valor}</v></c>'
+    texto = escape(_CARACTERES_INVALIDOS.sub("", str(valor)))
+    return f'<c r="{ref}" s="{estilo}" t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _fila_xml(numero, valores, estilo):
+    celdas = "".join(_celda(i, numero, valor, estilo) for i, valor in enumerate(valores))
+    return f'<row r="{numero}">{celdas}</row>'
+
+
+def generar_xlsx():
+    salida = _SalidaPorTrozos()
+    with zipfile.ZipFile(salida, "w", compression=zipfile.ZIP_DEFLATED) as libro:
+        libro.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        libro.writestr("_rels/.rels", _RELS)
+        libro.writestr("xl/workbook.xml", _WORKBOOK)
+        libro.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        libro.writestr("xl/styles.xml", _STYLES)
+
+        # La hoja se escribe en streaming; el ancho de columnas es fijo
+        # porque calcularlo exigiría una segunda pasada sobre los datos.
+        with libro.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as hoja:
+            columnas = "".join(
+                f'<col min="{i}" max="{i}" width="{ancho}" customWidth="1"/>'
+                for i, (_, ancho) in enumerate(COLUMNAS, 1)
+            )
+            hoja.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                '<sheetViews><sheetView workbookViewId="0" showGridLines="0"/></sheetViews>'
+                f'<cols>{columnas}</cols><sheetData>'
+                + _fila_xml(1, [nombre for nombre, _ in COLUMNAS], 1)
+            ).encode("utf-8"))
+            yield salida.vaciar()
+
+            numero = 2
+            for lote in _filas_inventario():
+                partes = []
+                for valores in lote:
+                    partes.append(_fila_xml(numero, valores, 2))
+                    numero += 1
+                hoja.write("".join(partes).encode("utf-8"))
+                datos = salida.vaciar()
+                if datos:
+                    yield datos
+
+            hoja.write(b"</sheetData></worksheet>")
+    yield salida.vaciar()
@@ -0,0 +1,313 @@
+# backend/importacion.py
+# Importación de manifiestos de proveedor (CSV o XLSX) fila a fila: el archivo
+# no se carga entero en memoria y las piezas se insertan por lotes, cada lote
+# en su propia transacción.
+import csv
+import io
+import logging
+import re
+import time
+import unicodedata
+import zipfile
+import zlib
+from xml.etree.ElementTree import ParseError, iterparse
+
+from database import UnidadDeTrabajo, cursor_de
+from models import resolver_productos, series_existentes, insertar_piezas, clave_codigo
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE = 2000
+
+# Columna -> encabezados aceptados (ya normalizados)
+COLUMNAS = {
+    "codigo_original": ("codigo_original", "codigo", "codigo_proveedor", "codigo_de_proveedor", "part_number"),
+    "numero_serie": ("numero_serie", "numero_de_serie", "serie", "n_serie", "no_serie", "serial", "serial_number"),
+    "caja": ("caja", "box"),
+    "nombre_producto": ("nombre_producto", "producto", "nombre"),
+    "descripcion_producto": ("descripcion_producto", "descripcion"),
+    "id_dron": ("id_dron", "dron"),
+}
+OBLIGATORIAS = ("codigo_original", "numero_serie", "caja")
+# Longitudes máximas de las columnas en la base de datos
+LONGITUDES = {"codigo_original": 100, "numero_serie": 100, "caja": 50, "nombre_producto": 150}
+
+ENCABEZADO_REPORTE = ["fila", "codigo_original", "numero_serie", "caja", "error"]
+
+
+class ManifiestoInvalido(ValueError):
+    """
+    El archivo no se puede leer o le faltan columnas obligatorias.
+    Si falla a mitad de lectura, 'resumen' lleva lo ya importado en lotes anteriores.
+    """
+    resumen = None
+
+
+# --- Lectores (un generador de listas de celdas por fila) ---
+
+def _filas_csv(archivo):
+    texto = io.TextIOWrapper(archivo, encoding="utf-8-sig", newline="")
+    muestra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+    except csv.Error:
+        dialecto = csv.excel
+    try:
+        yield from csv.reader(texto, dialecto)
+    finally:
+        texto.detach()
+
+
+_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_NS_PAQUETE = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+
+def _texto(elemento):
+    # Texto de un <si> o <is>, incluidas las partes con formato (<r><t>)
+    return "".join(t.text or "" for t in elemento.iter(_NS + "t"))
+
+
+def _cadenas_compartidas(libro):
+    if "xl/sharedStrings.xml" not in libro.namelist():
+        return []
+    cadenas = []
+    with libro.open("xl/sharedStrings.xml") as f:
+        for _, elemento in iterparse(f):
+            if elemento.tag == _NS + "si":
+                cadenas.append(_texto(elemento))
+                elemento.clear()
+    return cadenas
+
+
+def _primera_hoja(libro):
+    try:
+        with libro.open("xl/workbook.xml") as f:
+            hoja = next(e for _, e in iterparse(f) if e.tag == _NS + "sheet")
+        id_relacion = hoja.get(_NS_REL + "id")
+        with libro.open("xl/_rels/workbook.xml.rels") as f:
+            for _, e in iterparse(f):
+                if e.tag == _NS_PAQUETE + "Relationship" and e.get("Id") == id_relacion:
+                    destino = e.get("Target").lstrip("/")
+                    return destino if destino.startswith("xl/") else "xl/" + destino
+    except (KeyError, StopIteration):
+        pass
+    return "xl/worksheets/sheet1.xml"
+
+
+def _columna(referencia):
+    indice = 0
+    for letra in referencia:
+        if not letra.isalpha():
+            break
+        indice = indice * 26 + ord(letra.upper()) - 64
+    return indice - 1
+
+
+def _filas_xlsx(archivo):
+    try:
+        libro = zipfile.ZipFile(archivo)
+    except zipfile.BadZipFile:
+        raise ManifiestoInvalido("El archivo no es un XLSX válido")
+
+    with libro:
+        compartidas = _cadenas_compartidas(libro)
+        with libro.open(_primera_hoja(libro)) as f:
+            eventos = iterparse(f, events=("start", "end"))
+            _, raiz = next(eventos)
+            for evento, elemento in eventos:
+                if evento != "end" or elemento.tag != _NS + "row":
+                    continue
+                celdas = {}
+                siguiente = 0
+                for c in elemento.iter(_NS + "c"):
+                    indice = _columna(c.get("r")) if c.get("r") else siguiente
+                    siguiente = indice + 1
+                    tipo = c.get("t")
+                    if tipo == "inlineStr":
+                        valor = _texto(c)
+                    else:
+                        v = c.find(_NS + "v")
+                        valor = v.text if v is not None else None
+                        if valor is not None and tipo == "s":
+                            valor = compartidas[int(valor)]
+                        elif valor is not None and tipo in (None, "n") and re.fullmatch(r"-?\d+\.0+", valor):
+                            # Números enteros guardados como 123.0
+                            valor = valor.split(".")[0]
+                    celdas[indice] = valor
+                yield [celdas.get(i) for i in range(max(celdas) + 1)] if celdas else []
+                # Libera las filas ya procesadas para mantener la memoria constante
+                raiz.clear()
+
+
+# Errores de un archivo mal formado (codificación, XML, zip dañado, referencias
+# a cadenas compartidas que no existen...), distintos de un fallo del servidor
+_ERRORES_LECTURA = (ValueError, IndexError, KeyError, EOFError, ParseError, csv.Error, zipfile.BadZipFile, zlib.error)
+
+
+def _leer(filas):
+    try:
+        yield from filas
+    except ManifiestoInvalido:
+        raise
+    except _ERRORES_LECTURA as e:
+        raise ManifiestoInvalido(f"El archivo no se puede leer: {e}") from e
+
+
+def leer_filas(archivo, formato):
+    if formato == "csv":
+        return _leer(_filas_csv(archivo))
+    if formato == "xlsx":
+        return _leer(_filas_xlsx(archivo))
+    raise ManifiestoInvalido("Formato no soportado (use csv o xlsx)")
+
+
+def _normalizar(encabezado):
+    texto = unicodedata.normalize("NFKD", str(encabezado or "")).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", "_", texto.lower()).strip("_")
+
+
+def _mapa_columnas(encabezado):
+    posiciones = {}
+    normalizados = [_normalizar(e) for e in encabezado]
+    for columna, alias in COLUMNAS.items():
+        for i, nombre in enumerate(normalizados):
+            if nombre in alias:
+                posiciones[columna] = i
+                break
+    faltan = [c for c in OBLIGATORIAS if c not in posiciones]
+    if faltan:
+        raise ManifiestoInvalido(f"Faltan columnas obligatorias: {', '.join(faltan)}")
+    return posiciones
+
+
+# --- Importación ---
+
+def _validar(fila, posiciones):
+    """Devuelve (datos, error) para una fila del manifiesto."""
+    datos = {}
+    for columna, i in posiciones.items():
+        valor = fila[i] if i < len(fila) else None
+        datos[columna] = str(valor).strip() if valor is not None else ""
+
+    for columna in OBLIGATORIAS:
+        if not datos[columna]:
+            return datos, f"falta {columna}"
+    for columna, maximo in LONGITUDES.items():
+        if len(datos.get(columna, "")) > maximo:
+            return datos, f"{columna} supera {maximo} caracteres"
+    if datos.get("id_dron"):
+        if not datos["id_dron"].isdigit():
+            return datos, "id_dron no es un número"
+        datos["id_dron"] = int(datos["id_dron"])
+    else:
+        datos["id_dron"] = None
+    return datos, None
+
+
+def _procesar_lote(lote, id_usuario):
+    """
+    Inserta un lote [(numero_fila, datos)] en una transacción.
+    Devuelve (piezas creadas, productos creados, filas rechazadas).
+    """
+    nuevos = {}
+    for _, datos in lote:
+        if datos.get("nombre_producto") and datos["codigo_original"] not in nuevos:
+            nuevos[datos["codigo_original"]] = (datos["nombre_producto"], datos.get("descripcion_producto") or None, datos["id_dron"])
+
+    rechazadas = []
+    with UnidadDeTrabajo() as uow:
+        ids_producto, creados = resolver_productos([d["codigo_original"] for _, d in lote], nuevos, uow)
+        with cursor_de(uow) as cursor:
+            existentes = {clave_codigo(serie) for serie in series_existentes(cursor, [d["numero_serie"] for _, d in lote])}
+
+        filas = []
+        for numero, datos in lote:
+            if datos["codigo_original"] not in ids_producto:
+                rechazadas.append((numero, datos, "el producto no existe y la fila no trae nombre_producto"))
+            elif clave_codigo(datos["numero_serie"]) in existentes:
+                rechazadas.append((numero, datos, "número de serie ya registrado"))
+            else:
+                filas.append((ids_producto[datos["codigo_original"]], datos["numero_serie"], datos["caja"]))
+
+        registradas = insertar_piezas(filas, id_usuario, uow)
+    return registradas, creados, rechazadas
+
+
+def importar(archivo, formato, id_usuario, reporte=None, progreso=None, tamano_lote=TAMANO_LOTE):
+    """
+    Importa un manifiesto abierto en modo binario.
+    'reporte' (archivo de texto) recibe un CSV con las filas rechazadas y el motivo.
+    'progreso(resumen, registradas)' se llama tras confirmar cada lote.
+    Devuelve el resumen: filas, importadas, productos_creados, errores, segundos.
+    Lanza ManifiestoInvalido si el archivo no se puede leer o le faltan columnas.
+    """
+    inicio = time.perf_counter()
+    resumen = {"filas": 0, "importadas": 0, "productos_creados": 0, "errores": 0}
+    escritor = csv.writer(reporte) if reporte is not None else None
+    if escritor:
+        escritor.writerow(ENCABEZADO_REPORTE)
+
+    def _registrar_errores(lista):
+        resumen["errores"] += len(lista)
+        if escritor:
+            for numero, datos, error in lista:
+                escritor.writerow([numero, datos.get("codigo_original", ""), datos.get("numero_serie", ""),
+                                   datos.get("caja", ""), error])
+
+    filas = leer_filas(archivo, formato)
+    encabezado = next(filas, None)
+    if not encabezado:
+        raise ManifiestoInvalido("El archivo está vacío")
+    posiciones = _mapa_columnas(encabezado)
+
+    # Números de serie ya leídos, con la equivalencia del índice único (sin distinguir
+    # mayúsculas, acentos ni espacios finales): un repetido así haría fallar el lote entero
+    vistas = set()
+    lote, errores = [], []
+    try:
+        for numero, fila in enumerate(filas, start=2):
+            if not any(v not in (None, "") for v in fila):
+                continue
+            resumen["filas"] += 1
+            datos, error = _validar(fila, posiciones)
+            if error is None and clave_codigo(datos["numero_serie"]) in vistas:
+                error = "número de serie repetido en el manifiesto"
+            if error:
+                errores.append((numero, datos, error))
+                continue
+            vistas.add(clave_codigo(datos["numero_serie"]))
+            lote.append((numero, datos))
+
+            if len(lote) >= tamano_lote:
+                _importar_lote(lote, id_usuario, resumen, errores, progreso)
+                _registrar_errores(errores)
+                lote, errores = [], []
+    except ManifiestoInvalido as e:
+        # Los lotes anteriores ya están confirmados; las filas pendientes no se importan
+        e.resumen = resumen
+        raise
+
+    if lote:
+        _importar_lote(lote, id_usuario, resumen, errores, progreso)
+    _registrar_errores(errores)
+
+    resumen["segundos"] = round(time.perf_counter() - inicio, 2)
+    logger.info("Manifiesto importado", extra=resumen)
+    return resumen
+
+
+def _importar_lote(lote, id_usuario, resumen, errores, progreso):
+    try:
+        registradas, creados, rechazadas = _procesar_lote(lote, id_usuario)
+    except Exception as e:
+        # El lote se revierte entero; el resto del manifiesto sigue
+        logger.exception("Lote de importación rechazado", extra={"primera_fila": lote[0][0]})
+        errores.extend((numero, datos, f"lote rechazado: {e}") for numero, datos in lote)
+        return
+    errores.extend(rechazadas)
+    resumen["importadas"] += len(registradas)
+    resumen["productos_creados"] += len(creados)
+    if progreso:
+        progreso(resumen, registradas)
@@ -0,0 +1,57 @@
+# backend/importar_manifiesto.py
+# Uso:
+#   python importar_manifiesto.py manifiesto.xlsx [--usuario 1] [--errores errores.csv] [--lote 2000]
+# Importa un manifiesto de proveedor (CSV o XLSX) y deja las filas rechazadas
+# en un CSV (por defecto junto al manifiesto, con sufijo _errores.csv).
+import argparse
+import os
+import sys
+
+import database
+import importacion
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa un manifiesto de proveedor.")
+    parser.add_argument("archivo")
+    parser.add_argument("--usuario", type=int, default=1, help="id_usuario que queda como responsable del registro")
+    parser.add_argument("--errores", help="ruta del reporte de filas rechazadas")
+    parser.add_argument("--lote", type=int, default=importacion.TAMANO_LOTE, help="filas por transacción")
+    args = parser.parse_args(argv)
+
+    base, extension = os.path.splitext(args.archivo)
+    formato = extension.lstrip(".").lower()
+    ruta_errores = args.errores or f"{base}_errores.csv"
+
+    def progreso(resumen, registradas):
+        print(f"  {resumen['filas']} filas leídas, {resumen['importadas']} importadas, {resumen['errores']} rechazadas")
+
+    try:
+        with open(args.archivo, "rb") as archivo, open(ruta_errores, "w", encoding="utf-8", newline="") as reporte:
+            resumen = importacion.importar(archivo, formato, args.usuario, reporte=reporte,
+                                           progreso=progreso, tamano_lote=args.lote)
+    except importacion.ManifiestoInvalido as e:
+        os.remove(ruta_errores)
+        print(f"No se pudo importar: {e}")
+        if e.resumen and e.resumen["importadas"]:
+            print(f"Se importaron {e.resumen['importadas']} filas antes del error.")
+        return 2
+    except Exception:
+        # Sin reporte a medias junto al manifiesto si falla otra cosa (base de datos...)
+        if os.path.exists(ruta_errores):
+            os.remove(ruta_errores)
+        raise
+    finally:
+        database.cerrar_pool()
+
+    print(f"{resumen['importadas']} de {resumen['filas']} filas importadas en {resumen['segundos']}s "
+          f"({resumen['productos_creados']} productos nuevos).")
+    if resumen["errores"]:
+        print(f"{resumen['errores']} filas rechazadas; detalle en {ruta_errores}")
+        return 1
+    os.remove(ruta_errores)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+# backend/instantaneas.py
+# Fotos diarias del inventario (tabla inventario_diario, migración 0007):
+#   python instantaneas.py                    -> genera los días pendientes hasta ayer
+#   python instantaneas.py --desde 2025-01-01 -> además reconstruye hacia atrás hasta esa fecha
+#   python instantaneas.py --hasta 2025-03-31 -> genera solo hasta esa fecha
+#
+# Cada día se calcula como la foto del día anterior más los cambios de estado
+# y traslados de caja registrados en movimiento ese día; no se recorre pieza.
+# Solo la primera foto sale del estado actual de pieza (menos los movimientos
+# posteriores). Pensado para ejecutarse cada noche (cron).
+#
+# Los movimientos anteriores a estas fotos no guardaban estado_anterior ni
+# estado_nuevo: un rango que los incluya no se puede reconstruir y se rechaza.
+import argparse
+import logging
+import sys
+from datetime import date, datetime, timedelta
+
+import database
+from database import UnidadDeTrabajo
+
+logger = logging.getLogger(__name__)
+
+LOTE_INSERT = 500
+
+
+class HistoriaIncompleta(Exception):
+    """Hay movimientos sin estado registrado en el rango que se quiere reconstruir."""
+
+# Movimientos de un rango (activos y archivados) que cambian el estado o la
+# caja de una pieza, agrupados por producto, transición de caja y de estado.
+# Los traslados registran sus cajas (migración 0008); el resto se atribuye a
+# la caja en que estaba la pieza: la de origen de su siguiente traslado o, si
+# no se movió después, la actual. Como se archiva por meses, un traslado
+# posterior en el archivo es siempre anterior a cualquiera de la tabla activa.
+SQL_CAMBIOS = """
+    SELECT id_producto,
+        COALESCE(caja_anterior, caja_entonces) AS caja_origen,
+        COALESCE(caja_nueva, caja_entonces) AS caja_destino,
+        estado_anterior, estado_nuevo, COUNT(*) AS piezas
+    FROM (
+        SELECT p.id_producto, m.caja_anterior, m.caja_nueva, m.estado_anterior, m.estado_nuevo,
+            CASE WHEN m.caja_anterior IS NULL THEN COALESCE(
+                (SELECT t.caja_anterior FROM movimiento_archivo t
+                 WHERE t.id_pieza = m.id_pieza AND t.id_movimiento > m.id_movimiento AND t.caja_anterior IS NOT NULL
+                 ORDER BY t.id_movimiento LIMIT 1),
+                (SELECT t.caja_anterior FROM movimiento t
+                 WHERE t.id_pieza = m.id_pieza AND t.id_movimiento > m.id_movimiento AND t.caja_anterior IS NOT NULL
+                 ORDER BY t.id_movimiento LIMIT 1),
+                p.caja, ''
+            ) END AS caja_entonces
+        FROM (
+            SELECT id_movimiento, id_pieza, estado_anterior, estado_nuevo, caja_anterior, caja_nueva
+            FROM movimiento
+            WHERE fecha_movimiento >= %s AND fecha_movimiento < %s
+            UNION ALL
+            SELECT id_movimiento, id_pieza, estado_anterior, estado_nuevo, caja_anterior, caja_nueva
+            FROM movimiento_archivo
+            WHERE fecha_movimiento >= %s AND fecha_movimiento < %s
+        ) m
+        JOIN pieza p ON p.id_pieza = m.id_pieza
+        WHERE NOT (m.estado_anterior <=> m.estado_nuevo AND m.caja_anterior <=> m.caja_nueva)
+    ) c
+    GROUP BY id_producto, caja_origen, caja_destino, estado_anterior, estado_nuevo
+"""
+
+# Todos los movimientos que se registran ahora llevan estado_nuevo; los que no
+# lo tienen son de antes y no se sabe qué cambiaron
+SQL_MOVIMIENTOS_SIN_ESTADO = """
+    SELECT COUNT(*) FROM (
+        SELECT id_movimiento FROM movimiento
+        WHERE fecha_movimiento >= %s AND fecha_movimiento < %s AND estado_nuevo IS NULL
+        UNION ALL
+        SELECT id_movimiento FROM movimiento_archivo
+        WHERE fecha_movimiento >= %s AND fecha_movimiento < %s AND estado_nuevo IS NULL
+    ) m
+"""
+
+
+def cambios(cursor, desde, hasta):
+    """
+    {(id_producto, estado, caja): variación} de los movimientos entre dos días (hasta exclusivo).
+    Lanza HistoriaIncompleta si alguno de esos movimientos no registra el estado.
+    """
+    inicio = datetime.combine(desde, datetime.min.time())
+    fin = datetime.combine(hasta, datetime.min.time())
+    cursor.execute(SQL_MOVIMIENTOS_SIN_ESTADO, (inicio, fin, inicio, fin))
+    sin_estado = cursor.fetchone()[0]
+    if sin_estado:
+        raise HistoriaIncompleta(
+            f"{sin_estado} movimientos entre {desde} y {hasta - timedelta(days=1)} no registran el estado "
+            "de la pieza (son anteriores al historial de estados); no se puede reconstruir ese rango"
+        )
+    cursor.execute(SQL_CAMBIOS, (inicio, fin, inicio, fin))
+    variacion = {}
+    for id_producto, caja_origen, caja_destino, anterior, nuevo, piezas in cursor.fetchall():
+        if anterior is not None:
+            clave = (id_producto, anterior, caja_origen)
+            variacion[clave] = variacion.get(clave, 0) - piezas
+        if nuevo is not None:
+            clave = (id_producto, nuevo, caja_destino)
+            variacion[clave] = variacion.get(clave, 0) + piezas
+    return variacion
+
+
+def _aplicar(foto, variacion, signo=1):
+    resultado = dict(foto)
+    for clave, cantidad in variacion.items():
+        resultado[clave] = resultado.get(clave, 0) + signo * cantidad
+    # Una cantidad negativa indica movimientos que no cuadran con las piezas
+    # (borrados a mano, importaciones sin movimiento...): se avisa y no se guarda
+    negativas = {clave: cantidad for clave, cantidad in resultado.items() if cantidad < 0}
+    if negativas:
+        logger.warning(
+            "Foto reconstruida con %d cantidades negativas; se descartan", len(negativas),
+            extra={"celdas": len(negativas), "ejemplos": [
+                {"id_producto": id_producto, "estado": estado, "caja": caja, "cantidad": cantidad}
+                for (id_producto, estado, caja), cantidad in sorted(negativas.items(), key=str)[:5]
+            ]}
+        )
+    # Sin filas a cero
+    return {clave: cantidad for clave, cantidad in resultado.items() if cantidad > 0}
+
+
+def leer_foto(cursor, dia):
+    cursor.execute("SELECT id_producto, estado, caja, cantidad FROM inventario_diario WHERE fecha = %s", (dia,))
+    return {(id_producto, estado, caja): cantidad for id_producto, estado, caja, cantidad in cursor.fetchall()}
+
+
+def foto_actual(cursor):
+    cursor.execute("""
+        SELECT id_producto, estado, COALESCE(caja, ''), COUNT(*)
+        FROM pieza
+        GROUP BY id_producto, estado, COALESCE(caja, '')
+    """)
+    return {(id_producto, estado, caja): cantidad for id_producto, estado, caja, cantidad in cursor.fetchall()}
+
+
+def guardar_foto(cursor, dia, foto):
+    cursor.execute("DELETE FROM inventario_diario WHERE fecha = %s", (dia,))
+    filas = [(dia, id_producto, estado, caja, cantidad) for (id_producto, estado, caja), cantidad in foto.items()]
+    for i in range(0, len(filas), LOTE_INSERT):
+        trozo = filas[i:i + LOTE_INSERT]
+        cursor.execute(
+            "INSERT INTO inventario_diario (fecha, id_producto, estado, caja, cantidad) VALUES "
+            + ", ".join(["(%s, %s, %s, %s, %s)"] * len(trozo)),
+            [valor for fila in trozo for valor in fila]
+        )
+    cursor.execute(
+        "INSERT INTO inventario_diario_dias (fecha) VALUES (%s) ON DUPLICATE KEY UPDATE generado_en = NOW()", (dia,)
+    )
+
+
+def _en_transaccion(funcion, *args):
+    with UnidadDeTrabajo() as uow:
+        cursor = uow.cursor()
+        try:
+            return funcion(cursor, *args)
+        finally:
+            cursor.close()
+
+
+def _dias_generados(cursor):
+    cursor.execute("SELECT MIN(fecha), MAX(fecha) FROM inventario_diario_dias")
+    return cursor.fetchone()
+
+
+def _primera_foto(cursor, dia):
+    # Estado actual menos todo lo que pasó después del día
+    foto = _aplicar(foto_actual(cursor), cambios(cursor, dia + timedelta(days=1), date.today() + timedelta(days=1)), -1)
+    guardar_foto(cursor, dia, foto)
+    return len(foto)
+
+
+def _dia_siguiente(cursor, dia):
+    foto = _aplicar(leer_foto(cursor, dia - timedelta(days=1)), cambios(cursor, dia, dia + timedelta(days=1)))
+    guardar_foto(cursor, dia, foto)
+    return len(foto)
+
+
+def _dia_anterior(cursor, dia):
+    # El cierre de 'dia' es el cierre del día siguiente sin los movimientos de ese día siguiente
+    siguiente = dia + timedelta(days=1)
+    foto = _aplicar(leer_foto(cursor, siguiente), cambios(cursor, siguiente, siguiente + timedelta(days=1)), -1)
+    guardar_foto(cursor, dia, foto)
+    return len(foto)
+
+
+def actualizar(hasta=None, desde=None):
+    """Genera los días pendientes hasta 'hasta' (ayer por defecto) y, si se pide, hacia atrás hasta 'desde'."""
+    hasta = hasta or date.today() - timedelta(days=1)
+    primero, ultimo = _en_transaccion(_dias_generados)
+    generados = []
+
+    if ultimo is None:
+        generados.append((hasta, _en_transaccion(_primera_foto, hasta)))
+        primero = ultimo = hasta
+
+    dia = ultimo + timedelta(days=1)
+    while dia <= hasta:
+        generados.append((dia, _en_transaccion(_dia_siguiente, dia)))
+        dia += timedelta(days=1)
+
+    if desde is not None:
+        dia = primero - timedelta(days=1)
+        while dia >= desde:
+            try:
+                generados.append((dia, _en_transaccion(_dia_anterior, dia)))
+            except HistoriaIncompleta as e:
+                # Los días anteriores dependen de este: no se sigue hacia atrás
+                logger.warning("Reconstrucción detenida en %s: %s", dia, e, extra={"dia": str(dia)})
+                break
+            dia -= timedelta(days=1)
+    return generados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera las fotos diarias del inventario.")
+    parser.add_argument("--hasta", type=date.fromisoformat, help="último día a generar (por defecto ayer)")
+    parser.add_argument("--desde", type=date.fromisoformat, help="reconstruye hacia atrás hasta este día")
+    args = parser.parse_args(argv)
+
+    database.iniciar_pool()
+    try:
+        generados = actualizar(args.hasta, args.desde)
+    except HistoriaIncompleta as e:
+        print(f"Error: {e}")
+        return 1
+    finally:
+        database.cerrar_pool()
+
+    for dia, filas in sorted(generados):
+        print(f"  {dia}  {filas} filas")
+    print(f"{len(generados)} días generados." if generados else "No había días pendientes.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,40 +1,85 @@
-from fastapi import FastAPI, HTTPException, Form, Request
-from models import producto_existe, crear_producto, pieza_existe_por_serie, crear_pieza, registrar_movimiento
+# Antes que cualquier otro import: mide lo que tarda en cargarse cada módulo
+import arranque
+arranque.medir_importaciones()
+
+from fastapi import FastAPI, HTTPException, Form, Request, Query, Response, Depends, Header
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from datetime import date, datetime
+from models import producto_existe, crear_producto, pieza_existe_por_serie, crear_pieza, registrar_movimiento, pieza_existe_por_codigo_barras
+from models import obtener_inventario_db, decodificar_cursor_inventario, buscar_codigo_db, obtener_movimientos_db
+from models import buscar_codigos_db, buscar_piezas_db, serie_stock_db, AGRUPACIONES_STOCK, clave_codigo
+from models import actualizar_estado_pieza_db, obtener_pieza_para_cambio
+from models import ajustar_stock, cambio_de_estado, alertas_stock_bajo
+from models import registrar_piezas_lote, filas_inventario_por_id, actualizar_estados_lote
+from models import codigos_barras_existentes, codigos_barras_inventario
+from models import listar_cajas_db, resumen_caja_db, mover_caja
+from cache import CacheLRU
 from schemas import RegistroPiezaRequest
-import barcode
-from barcode.writer import ImageWriter
+import etiquetas
 import os
-from database import get_db_connection
-from passlib.context import CryptContext
+import database
+from database import en_hilo_db, en_segundo_plano, UnidadDeTrabajo
+from contextlib import asynccontextmanager
+import seguridad
+import cambios
+import referencias
+from seguridad import sesion_actual
 import re 
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 import logging
+import bitacora
+import metricas
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
-from schemas import RegistroPiezaRequest, BuscarCodigoRequest, ActualizarEstadoRequest
-
-
-app = FastAPI(title="OTech Inventory API")
-
-from fastapi.staticfiles import StaticFiles
-app.mount("/codigos", StaticFiles(directory="codigos"), name="codigos")
+bitacora.configurar()
+from schemas import RegistroPiezaRequest, BuscarCodigoRequest, ActualizarEstadoRequest, RegistroPiezasLoteRequest
+from schemas import ActualizarEstadoLoteRequest, HojaEtiquetasRequest
+from mysql.connector import IntegrityError
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Primero lo que puede impedir el arranque (SESION_SECRETO sin definir)
+    seguridad.iniciar()
+    # Pool de conexiones compartido por todos los endpoints; las conexiones se
+    # abren en el calentamiento para no retrasar el arranque si la base tarda
+    database.iniciar_pool(precalentar=False)
+    etiquetas.iniciar()
+    cambios.iniciar()
+    arranque.marcar("app_lista")
+    # Lo que se carga bajo demanda se adelanta en segundo plano, con el servidor ya escuchando
+    arranque.calentar([
+        ("pool_conexiones", database.precalentar_pool),
+        ("referencias", referencias.calentar),
+        ("etiquetas", etiquetas.calentar),
+        ("contrasenas", seguridad.calentar),
+    ])
+    yield
+    etiquetas.detener()
+    seguridad.detener()
+    database.cerrar_pool()
+
+
+app = FastAPI(title="OTech Inventory API", lifespan=lifespan)
+app.add_middleware(metricas.MiddlewareMetricas)
 
 # Crear carpeta para códigos si no existe
 if not os.path.exists("codigos"):
     os.makedirs("codigos")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # --- Endpoints Principales ---
 
+def _buscar_usuario_login(username):
+    with database.cursor() as cursor:
+        cursor.execute("SELECT * FROM usuario WHERE nombre_usuario = %s", (username,))
+        return cursor.fetchone()
+
+def _actualizar_ultimo_login(id_usuario):
+    with database.cursor(dictionary=False) as cursor:
+        cursor.execute("UPDATE usuario SET ultimo_login = NOW() WHERE id_usuario = %s", (id_usuario,))
+
 @app.post("/login")
 async def login(username: str = Form(...), password: str = Form(...)):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM usuario WHERE nombre_usuario = %s", (username,))
-    user = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    user = await en_hilo_db(_buscar_usuario_login, username)
 
     if not user:
         raise HTTPException(status_code=401, detail="Usuario o contraseña incorrectos")
@@ -42,192 +87,355 @@ async def login(username: str = Form(...), password: str = Form(...)):
     if not user['activo']:
         raise HTTPException(status_code=401, detail="Usuario inactivo. Contacte al administrador.")
 
-    if not pwd_context.verify(password, user['password_hash']):
+    if not await seguridad.verificar_password(password, user['password_hash']):
         raise HTTPException(status_code=401, detail="Usuario o contraseña incorrectos")
 
-    # Actualizar último login
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE usuario SET ultimo_login = NOW() WHERE id_usuario = %s", (user['id_usuario'],))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    # Actualizar último login (no hace falta esperar la escritura para responder)
+    en_segundo_plano(_actualizar_ultimo_login, user['id_usuario'])
 
     return {
         "id_usuario": user['id_usuario'],
         "nombre_usuario": user['nombre_usuario'],
         "rol": user['rol'],
-        "token": "mock-token-" + str(user['id_usuario'])
+        "token": seguridad.crear_token(user)
     }
 
 
+@app.get("/sesion")
+async def obtener_sesion(sesion: dict = Depends(sesion_actual)):
+    if sesion is None:
+        raise HTTPException(status_code=401, detail="Sesión no válida o expirada")
+    return sesion
+
+
 # --- Buscar Código ---
 
-from schemas import BuscarCodigoRequest
+from schemas import BuscarCodigoRequest, BuscarCodigosRequest
+
+# Caché de códigos escaneados recientemente (las estaciones reescanean mucho las mismas etiquetas).
+# Las claves se normalizan como compara la base de datos (sin mayúsculas, acentos ni espacios
+# finales): al invalidar un código se invalidan todas sus formas de escribirlo.
+cache_codigos = CacheLRU(
+    maximo=int(os.getenv("CACHE_CODIGOS_MAX", 4096)),
+    ttl=float(os.getenv("CACHE_CODIGOS_TTL", 30)),
+    normalizar=clave_codigo
+)
+
+def _codigo_en_cache(codigo):
+    resultado = cache_codigos.obtener(codigo)
+    # Un código desconocido se devuelve tal como se escribió (con él se crea el producto)
+    if resultado is not None and resultado["tipo"] == "nuevo_producto":
+        resultado = {**resultado, "codigo_original": codigo}
+    return resultado
+
+def invalidar_codigos(*codigos):
+    cache_codigos.invalidar(*[c for c in codigos if c])
+
+def invalidar_codigos_de_pieza(*ids_pieza):
+    ids = set(ids_pieza)
+    cache_codigos.invalidar_si(
+        lambda codigo, resultado: resultado.get("tipo") == "pieza" and resultado["pieza"]["id_pieza"] in ids
+    )
 
 @app.post("/buscar_codigo")
 async def buscar_codigo_endpoint(data: BuscarCodigoRequest):
     codigo = data.codigo
-    conn = get_db_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Error: No se pudo conectar a la base de datos")
+    resultado = _codigo_en_cache(codigo)
+    if resultado is not None:
+        return resultado
 
-    cursor = conn.cursor(dictionary=True)
+    generacion = cache_codigos.generacion
     try:
-        # 1. Buscar por codigo_barras (OTech-...)
-        cursor.execute("""
-            SELECT p.id_pieza, p.numero_serie, p.estado, p.caja, pr.nombre AS nombre_producto
-            FROM pieza p
-            JOIN producto pr ON p.id_producto = pr.id_producto
-            WHERE p.codigo_barras = %s
-        """, (codigo,))
-        pieza_por_codigo_barras = cursor.fetchone()
-
-        if pieza_por_codigo_barras:
-            logger.info(f"Encontrado por codigo_barras: {codigo}")
-            cursor.close()
-            conn.close()
-            return {
-                "tipo": "pieza",
-                "pieza": pieza_por_codigo_barras
-            }
-
-        # 2. Buscar por numero_serie
-        cursor.execute("""
-            SELECT p.id_pieza, p.numero_serie, p.estado, p.caja, pr.nombre AS nombre_producto
-            FROM pieza p
-            JOIN producto pr ON p.id_producto = pr.id_producto
-            WHERE p.numero_serie = %s
-        """, (codigo,))
-        pieza_por_serie = cursor.fetchone()
-
-        if pieza_por_serie:
-            logger.info(f"Encontrado por numero_serie: {codigo}")
-            cursor.close()
-            conn.close()
-            return {
-                "tipo": "pieza",
-                "pieza": pieza_por_serie
-            }
-
-        # 3. Buscar por codigo_original (producto)
-        cursor.execute("""
-            SELECT id_producto, codigo_original, nombre, descripcion, id_dron
-            FROM producto
-            WHERE codigo_original = %s
-        """, (codigo,))
-        producto = cursor.fetchone()
-
-        if producto:
-            logger.info(f"Encontrado por codigo_original (producto): {codigo}")
-            cursor.close()
-            conn.close()
-            return {
-                "tipo": "producto",
-                "producto": producto
-            }
-
-        # 4. No encontrado
-        logger.info(f"Código no encontrado en ninguna tabla: {codigo}")
-        cursor.close()
-        conn.close()
-        return {
-            "tipo": "nuevo_producto",
-            "codigo_original": codigo
-        }
-
+        resultado = await en_hilo_db(buscar_codigo_db, codigo)
+    except ConnectionError as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
     except Exception as e:
-        logger.error(f"Error en /buscar_codigo: {e}")
-        cursor.close()
-        conn.close()
+        logger.exception("Error en /buscar_codigo", extra={"codigo": codigo})
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
 
+    logger.debug("Código resuelto", extra={"codigo": codigo, "coincidencia": resultado["coincidencia"]})
+
+    cache_codigos.guardar(codigo, resultado, generacion)
+    return resultado
+
+
+MAX_CODIGOS_LOTE = 1000
+
+@app.post("/buscar_codigos")
+async def buscar_codigos_endpoint(data: BuscarCodigosRequest):
+    """Varios códigos a la vez (colas de escáneres sin conexión); mismo resultado que /buscar_codigo."""
+    codigos = list(dict.fromkeys(data.codigos))
+    if len(codigos) > MAX_CODIGOS_LOTE:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_CODIGOS_LOTE} códigos por petición")
+
+    resultados = {}
+    faltan = []
+    for codigo in codigos:
+        resultado = _codigo_en_cache(codigo)
+        if resultado is None:
+            faltan.append(codigo)
+        else:
+            resultados[codigo] = resultado
+
+    if faltan:
+        generacion = cache_codigos.generacion
+        try:
+            encontrados = await en_hilo_db(buscar_codigos_db, faltan)
+        except Exception as e:
+            logger.exception("Error en /buscar_codigos", extra={"codigos": len(faltan)})
+            raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
+        for codigo, resultado in encontrados.items():
+            cache_codigos.guardar(codigo, resultado, generacion)
+        resultados.update(encontrados)
+
+    # En el orden recibido
+    return {"resultados": {codigo: resultados[codigo] for codigo in codigos}}
+
 
 # --- Actualizar Estado ---
-from schemas import ActualizarEstadoRequest  
 
-@app.post("/actualizar_estado_pieza")
-async def actualizar_estado_pieza_endpoint(data: ActualizarEstadoRequest):
-    # Validar estado
-    estados_validos = ["disponible", "en_venta", "en_garantia", "en_reparacion"]
-    if data.nuevo_estado not in estados_validos:
-        raise HTTPException(status_code=400, detail="Estado no válido")
+# Estados que se pueden asignar a mano ('salida' solo por /registrar_salida)
+ESTADOS_VALIDOS = ["disponible", "en_venta", "en_garantia", "en_reparacion"]
 
-    conn = get_db_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Error: No se pudo conectar a la base de datos")
+# Piezas por petición en los endpoints de lote
+MAX_PIEZAS_LOTE = 1000
+from schemas import ActualizarEstadoRequest  
 
-    try:
-        # Obtener estado actual
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT estado FROM pieza WHERE id_pieza = %s", (data.id_pieza,))
-        resultado = cursor.fetchone()
-        if not resultado:
+def _actualizar_estado_pieza(data):
+    with UnidadDeTrabajo() as uow:
+        pieza = obtener_pieza_para_cambio(data.id_pieza, uow)
+        if pieza is None:
             raise HTTPException(status_code=404, detail="Pieza no encontrada")
-        estado_anterior = resultado['estado']
+        estado_anterior = pieza["estado"]
 
-        # Actualizar estado
-        cursor.execute("UPDATE pieza SET estado = %s WHERE id_pieza = %s", (data.nuevo_estado, data.id_pieza))
-        conn.commit()
+        actualizar_estado_pieza_db(data.id_pieza, data.nuevo_estado, uow)
+        ajustar_stock(cambio_de_estado(pieza["id_producto"], estado_anterior, data.nuevo_estado), uow)
 
-        # Registrar movimiento
+        # Registrar movimiento (misma transacción que el cambio de estado)
         registrar_movimiento(
             data.id_pieza,
             "cambio_estado",
             data.id_usuario,
-            f"Cambio de '{estado_anterior}' a '{data.nuevo_estado}'. {data.observaciones}".strip()
+            f"Cambio de '{estado_anterior}' a '{data.nuevo_estado}'. {data.observaciones}".strip(),
+            estado_anterior=estado_anterior,
+            estado_nuevo=data.nuevo_estado,
+            uow=uow
+        )
+        uow.despues_de_confirmar(
+            cambios.publicar, "pieza_estado",
+            {"piezas": [{"id_pieza": data.id_pieza, "estado": data.nuevo_estado}]}
         )
 
-        cursor.close()
-        conn.close()
-        return {"mensaje": f"Estado de la pieza {data.id_pieza} actualizado a {data.nuevo_estado}"}
+@app.post("/actualizar_estado_pieza")
+async def actualizar_estado_pieza_endpoint(data: ActualizarEstadoRequest):
+    # Validar estado
+    if data.nuevo_estado not in ESTADOS_VALIDOS:
+        raise HTTPException(status_code=400, detail="Estado no válido")
 
+    try:
+        await en_hilo_db(_actualizar_estado_pieza, data)
+    except HTTPException:
+        raise
     except Exception as e:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'conn' in locals() and conn.is_connected():
-            conn.close()
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
 
+    invalidar_codigos_de_pieza(data.id_pieza)
+    return {"mensaje": f"Estado de la pieza {data.id_pieza} actualizado a {data.nuevo_estado}"}
 
 
+def _actualizar_estados_lote(data):
+    with UnidadDeTrabajo() as uow:
+        resultados = actualizar_estados_lote(
+            data.ids_pieza, data.nuevo_estado, data.id_usuario, data.observaciones, uow
+        )
+        cambiadas = [r["id_pieza"] for r in resultados if r["resultado"] == "actualizada"]
+        if cambiadas:
+            uow.despues_de_confirmar(cambios.publicar, "pieza_estado", {
+                "piezas": [{"id_pieza": id_pieza, "estado": data.nuevo_estado} for id_pieza in cambiadas]
+            })
+    return resultados
+
+@app.post("/actualizar_estado_piezas_lote")
+async def actualizar_estado_piezas_lote_endpoint(data: ActualizarEstadoLoteRequest):
+    if data.nuevo_estado not in ESTADOS_VALIDOS:
+        raise HTTPException(status_code=400, detail="Estado no válido")
+    if not data.ids_pieza:
+        raise HTTPException(status_code=400, detail="No se enviaron piezas")
+    if len(data.ids_pieza) > MAX_PIEZAS_LOTE:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_PIEZAS_LOTE} piezas por lote")
 
+    resultados = await en_hilo_db(_actualizar_estados_lote, data)
 
-@app.post("/registrar_pieza")
-async def registrar_pieza_endpoint(data: RegistroPiezaRequest, request: Request):
-    # 1. Verificar si producto existe
-    producto = producto_existe(data.codigo_original)
-    if not producto:
-        # Crear producto (esto solo ocurre si es un codigo de proveedor completamente nuevo)
-        if not data.nombre_producto:
-            raise HTTPException(status_code=400, detail="Nombre del producto requerido para nuevo producto")
-        id_producto = crear_producto(
-            data.codigo_original,
-            data.nombre_producto,
-            data.descripcion_producto,
-            data.id_dron
+    actualizadas = [r["id_pieza"] for r in resultados if r["resultado"] == "actualizada"]
+    if actualizadas:
+        invalidar_codigos_de_pieza(*actualizadas)
+    return {
+        "mensaje": f"{len(actualizadas)} piezas actualizadas a {data.nuevo_estado}",
+        "actualizadas": len(actualizadas),
+        "no_encontradas": [r["id_pieza"] for r in resultados if r["resultado"] == "no_encontrada"],
+        "sin_cambios": [r["id_pieza"] for r in resultados if r["resultado"] == "sin_cambios"],
+        "resultados": resultados,
+    }
+
+
+# --- Cajas ---
+# 'caja' es texto libre: se recibe por parámetro o en el cuerpo, no en la ruta
+from schemas import MoverCajaRequest
+
+# Piezas por traslado: una caja completa, con margen
+MAX_PIEZAS_CAJA = 5000
+LARGO_MAXIMO_CAJA = 50
+
+@app.get("/cajas")
+async def listar_cajas(
+    limite: int = Query(100, ge=1, le=1000),
+    despues: str = ""
+):
+    """Cajas en orden alfabético con sus piezas por estado; 'despues' es la última caja de la página anterior."""
+    return await en_hilo_db(listar_cajas_db, limite, despues)
+
+
+@app.get("/cajas/resumen")
+async def resumen_caja(caja: str):
+    resumen = await en_hilo_db(resumen_caja_db, caja)
+    if not resumen["total"]:
+        raise HTTPException(status_code=404, detail="La caja no tiene piezas")
+    return resumen
+
+
+@app.get("/cajas/contenido")
+async def contenido_caja(
+    caja: str,
+    estado: Optional[str] = None,
+    limite: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    total: bool = False
+):
+    """Piezas de una caja (sin las que ya salieron), paginadas como /inventario."""
+    cursor_pagina = None
+    if cursor:
+        try:
+            cursor_pagina = decodificar_cursor_inventario(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    filtros = {"caja": caja, "estado": estado, "sin_salida": True}
+    return await en_hilo_db(obtener_inventario_db, filtros, limite, cursor_pagina, contar=total)
+
+
+def _mover_caja(data, caja_nueva):
+    with UnidadDeTrabajo() as uow:
+        en_caja, cambiadas = mover_caja(
+            data.caja, caja_nueva, data.nuevo_estado, data.id_usuario, data.observaciones,
+            maximo=MAX_PIEZAS_CAJA, uow=uow
         )
-    else:
-        id_producto = producto["id_producto"]
+        if cambiadas:
+            uow.despues_de_confirmar(cambios.publicar, "pieza_estado", {
+                "piezas": [
+                    {"id_pieza": c["id_pieza"], "estado": data.nuevo_estado or c["estado_anterior"],
+                     "caja": caja_nueva or data.caja}
+                    for c in cambiadas
+                ]
+            })
+    return en_caja, cambiadas
+
+@app.post("/cajas/mover")
+async def mover_caja_endpoint(data: MoverCajaRequest):
+    caja_nueva = (data.caja_nueva or "").strip() or None
+    if caja_nueva is None and data.nuevo_estado is None:
+        raise HTTPException(status_code=400, detail="Indique la caja de destino, el nuevo estado o ambos")
+    if caja_nueva is not None and len(caja_nueva) > LARGO_MAXIMO_CAJA:
+        raise HTTPException(status_code=400, detail=f"El nombre de la caja admite {LARGO_MAXIMO_CAJA} caracteres")
+    if data.nuevo_estado is not None and data.nuevo_estado not in ESTADOS_VALIDOS:
+        raise HTTPException(status_code=400, detail="Estado no válido")
 
-    # 2. Verificar si pieza ya existe por número de serie
-    if pieza_existe_por_serie(data.numero_serie):
-        raise HTTPException(status_code=400, detail="Número de serie ya registrado")
+    try:
+        en_caja, cambiadas = await en_hilo_db(_mover_caja, data, caja_nueva)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not en_caja:
+        raise HTTPException(status_code=404, detail="La caja no tiene piezas")
+
+    if cambiadas:
+        invalidar_codigos_de_pieza(*[c["id_pieza"] for c in cambiadas])
+    logger.info("Caja trasladada", extra={
+        "caja": data.caja, "caja_nueva": caja_nueva, "estado": data.nuevo_estado, "piezas": len(cambiadas)
+    })
+    destino = " y ".join(filter(None, [
+        f"a la caja '{caja_nueva}'" if caja_nueva else None,
+        f"a {data.nuevo_estado}" if data.nuevo_estado else None,
+    ]))
+    return {
+        "mensaje": f"{len(cambiadas)} piezas de la caja '{data.caja}' pasadas {destino}",
+        "piezas_en_caja": en_caja,
+        "actualizadas": len(cambiadas),
+        "sin_cambios": en_caja - len(cambiadas),
+        "piezas": cambiadas,
+    }
+
+
+def _registrar_pieza(data):
+    # Las referencias se leen antes de abrir la transacción: si hay que recargarlas
+    # usan otra conexión del pool y no conviene tener una retenida mientras tanto
+    producto = referencias.producto_por_codigo(data.codigo_original)
+    with UnidadDeTrabajo() as uow:
+        # 1. Verificar si producto existe (puede ser más nuevo que la copia en memoria)
+        producto = producto or producto_existe(data.codigo_original, uow)
+        if not producto:
+            # Crear producto (esto solo ocurre si es un codigo de proveedor completamente nuevo)
+            if not data.nombre_producto:
+                raise HTTPException(status_code=400, detail="Nombre del producto requerido para nuevo producto")
+            id_producto = crear_producto(
+                data.codigo_original,
+                data.nombre_producto,
+                data.descripcion_producto,
+                data.id_dron,
+                uow
+            )
+        else:
+            id_producto = producto["id_producto"]
+
+        # 2. Verificar si pieza ya existe por número de serie
+        if pieza_existe_por_serie(data.numero_serie, uow):
+            raise HTTPException(status_code=400, detail="Número de serie ya registrado")
+
+        # 3. Crear pieza
+        resultado = crear_pieza(id_producto, data.numero_serie, data.id_usuario, data.caja, uow)
 
-    # 3. Crear pieza
-    resultado = crear_pieza(id_producto, data.numero_serie, data.id_usuario, data.caja)
+        # 4. Registrar movimiento de entrada
+        registrar_movimiento(
+            resultado["id_pieza"], "registro_inicial", data.id_usuario, "Pieza registrada e ingresada al sistema",
+            estado_nuevo="disponible", uow=uow
+        )
 
-    # 4. Generar código de barras
+        # 5. Avisar a los clientes conectados, con la fila completa del inventario
+        if not producto:
+            uow.despues_de_confirmar(referencias.productos.invalidar)
+            uow.despues_de_confirmar(cambios.publicar, "producto_alta", {
+                "id_producto": id_producto, "codigo_original": data.codigo_original,
+                "nombre": data.nombre_producto, "id_dron": data.id_dron
+            })
+        uow.despues_de_confirmar(
+            cambios.publicar, "pieza_alta", {"piezas": filas_inventario_por_id([resultado["id_pieza"]], uow)}
+        )
+    return resultado
+
+@app.post("/registrar_pieza")
+async def registrar_pieza_endpoint(data: RegistroPiezaRequest, request: Request):
+    try:
+        resultado = await en_hilo_db(_registrar_pieza, data)
+    except IntegrityError:
+        # Otro registro insertó el mismo número de serie al mismo tiempo
+        raise HTTPException(status_code=400, detail="Número de serie ya registrado")
+
+    # 5. Encolar la etiqueta; se genera en segundo plano (o al pedirla en /codigos)
     codigo = resultado["codigo_otech"]
-    ean = barcode.get('code128', codigo, writer=ImageWriter())
-    filename = f"codigos/{codigo}"
-    ean.save(filename)  # Guarda como PNG
+    etiquetas.encolar(codigo)
 
-    # 5. Registrar movimiento de entrada
-    registrar_movimiento(resultado["id_pieza"], "registro_inicial", data.id_usuario, "Pieza registrada e ingresada al sistema")
+    # Los códigos que antes no existían (o eran solo producto) ya resuelven a esta pieza
+    invalidar_codigos(data.codigo_original, data.numero_serie, codigo)
 
     base_url = str(request.base_url).rstrip("/")  
-    ruta_absoluta = f"{base_url}/codigos/{codigo}.png"
+    ruta_absoluta = etiquetas.url(base_url, codigo)
 
     return {
         "mensaje": "Pieza registrada exitosamente",
@@ -236,278 +444,518 @@ async def registrar_pieza_endpoint(data: RegistroPiezaRequest, request: Request)
         "id_pieza": resultado["id_pieza"]
     }
 
+def _registrar_piezas_lote(data):
+    with UnidadDeTrabajo() as uow:
+        resultado = registrar_piezas_lote(
+            data.codigo_original,
+            data.numeros_serie,
+            data.caja,
+            data.id_usuario,
+            data.nombre_producto,
+            data.descripcion_producto,
+            data.id_dron,
+            uow=uow
+        )
+        if resultado["producto_creado"]:
+            uow.despues_de_confirmar(referencias.productos.invalidar)
+            uow.despues_de_confirmar(cambios.publicar, "producto_alta", {
+                "id_producto": resultado["id_producto"], "codigo_original": data.codigo_original,
+                "nombre": data.nombre_producto, "id_dron": data.id_dron
+            })
+        if resultado["registradas"]:
+            filas = filas_inventario_por_id([pieza["id_pieza"] for pieza in resultado["registradas"]], uow)
+            uow.despues_de_confirmar(cambios.publicar, "pieza_alta", {"piezas": filas})
+    return resultado
+
+@app.post("/registrar_piezas_lote")
+async def registrar_piezas_lote_endpoint(data: RegistroPiezasLoteRequest, request: Request):
+    if not data.numeros_serie:
+        raise HTTPException(status_code=400, detail="No se enviaron números de serie")
+    if len(data.numeros_serie) > MAX_PIEZAS_LOTE:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_PIEZAS_LOTE} piezas por lote")
+
+    try:
+        resultado = await en_hilo_db(_registrar_piezas_lote, data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except IntegrityError:
+        # Otro registro insertó alguno de los números de serie al mismo tiempo
+        raise HTTPException(status_code=409, detail="Conflicto al registrar el lote, vuelva a intentarlo")
+
+    codigos = [pieza["codigo_otech"] for pieza in resultado["registradas"]]
+    if codigos:
+        etiquetas.encolar_lote(codigos)
+    invalidar_codigos(
+        data.codigo_original,
+        *[pieza["numero_serie"] for pieza in resultado["registradas"]],
+        *codigos
+    )
+
+    base_url = str(request.base_url).rstrip("/")
+    for pieza in resultado["registradas"]:
+        pieza["ruta_etiqueta"] = etiquetas.url(base_url, pieza["codigo_otech"])
+
+    return {
+        "mensaje": f"{len(resultado['registradas'])} piezas registradas exitosamente",
+        **resultado
+    }
+
+# ':path' porque un código escapado puede incluir '/' (%2F)
+@app.get("/codigos/{archivo:path}")
+async def obtener_etiqueta(archivo: str, if_none_match: Optional[str] = Header(None)):
+    codigo, _, formato = archivo.rpartition(".")
+    if formato not in etiquetas.FORMATOS or not etiquetas.codigo_valido(codigo):
+        raise HTTPException(status_code=404, detail="Etiqueta no encontrada")
+
+    # La imagen no cambia nunca: si el cliente ya la tiene no hace falta leerla
+    cabeceras = {"ETag": etiquetas.etag(codigo, formato), "Cache-Control": etiquetas.CACHE_CONTROL}
+    if if_none_match and cabeceras["ETag"] in (v.strip() for v in if_none_match.split(",")):
+        return Response(status_code=304, headers=cabeceras)
+
+    datos = etiquetas.en_cache(codigo, formato)
+    if datos is None:
+        # Solo se generan etiquetas de piezas que existen
+        if not await en_hilo_db(etiquetas.almacenada, codigo, formato) and \
+                not await en_hilo_db(pieza_existe_por_codigo_barras, codigo):
+            raise HTTPException(status_code=404, detail="Etiqueta no encontrada")
+        datos = await etiquetas.obtener(codigo, formato)
+
+    return Response(content=datos, media_type=etiquetas.FORMATOS[formato], headers=cabeceras)
+
+MAX_ETIQUETAS_HOJA = 1000
+
+def _codigos_para_hoja(data):
+    if data.codigos is not None:
+        codigos = list(dict.fromkeys(data.codigos))
+        invalidos = [c for c in codigos if not etiquetas.codigo_valido(c)]
+        if invalidos:
+            raise HTTPException(status_code=400, detail=f"Códigos no válidos: {', '.join(invalidos[:20])}")
+        if len(codigos) > MAX_ETIQUETAS_HOJA:
+            raise HTTPException(status_code=400, detail=f"Máximo {MAX_ETIQUETAS_HOJA} etiquetas por hoja")
+        # Solo se generan etiquetas de piezas que existen
+        with database.cursor() as cursor:
+            existentes = codigos_barras_existentes(cursor, codigos)
+        faltan = [c for c in codigos if c not in existentes]
+        if faltan:
+            raise HTTPException(status_code=404, detail=f"Piezas no encontradas: {', '.join(faltan[:20])}")
+        # Se respeta el orden pedido (el de la lista, sin repetidos)
+        return codigos
+
+    codigos = codigos_barras_inventario({"caja": data.caja, "desde": data.desde, "hasta": data.hasta}, MAX_ETIQUETAS_HOJA)
+    if len(codigos) > MAX_ETIQUETAS_HOJA:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_ETIQUETAS_HOJA} etiquetas por hoja; acote el rango")
+    return codigos
+
+@app.get("/etiquetas/plantillas")
+async def listar_plantillas_etiquetas():
+    return etiquetas.PLANTILLAS
+
+@app.post("/etiquetas/hoja")
+async def hoja_etiquetas(data: HojaEtiquetasRequest):
+    """Una hoja lista para imprimir (PDF o PNG) con las etiquetas de varias piezas."""
+    if sum(1 for v in (data.codigos is not None, data.caja, data.desde or data.hasta) if v) != 1:
+        raise HTTPException(status_code=400, detail="Indique codigos, caja o un rango de fechas (solo uno)")
+    plantilla = etiquetas.PLANTILLAS.get(data.plantilla)
+    if plantilla is None:
+        raise HTTPException(status_code=400, detail=f"Plantilla no válida. Opciones: {', '.join(etiquetas.PLANTILLAS)}")
+    if data.formato not in etiquetas.FORMATOS_HOJA:
+        raise HTTPException(status_code=400, detail="Formato no válido. Use: pdf, png")
+    if not 1 <= data.inicio <= plantilla["columnas"] * plantilla["filas"]:
+        raise HTTPException(status_code=400, detail="Posición de inicio fuera de la hoja")
+    dpi = data.dpi or etiquetas.DPI_HOJA
+    if not 72 <= dpi <= 600:
+        raise HTTPException(status_code=400, detail="dpi debe estar entre 72 y 600")
+
+    codigos = await en_hilo_db(_codigos_para_hoja, data)
+    if not codigos:
+        raise HTTPException(status_code=404, detail="No hay piezas para imprimir")
+
+    try:
+        datos = await etiquetas.hoja(codigos, data.plantilla, data.formato, dpi, data.inicio)
+    except ValueError as e:
+        # El código no cabe con un píxel por módulo: subir dpi o usar una plantilla más ancha
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(
+        content=datos,
+        media_type=etiquetas.FORMATOS_HOJA[data.formato],
+        headers={
+            "Content-Disposition": f'inline; filename="etiquetas_{datetime.now():%Y%m%d_%H%M%S}.{data.formato}"',
+            "X-Total-Etiquetas": str(len(codigos)),
+        },
+    )
+
 @app.get("/health")
 def health_check():
+    arranque.marcar("primer_health")
     return {"status": "OK"}
 
+@app.get("/admin/arranque")
+async def informe_arranque():
+    return arranque.informe()
+
+_medidor_arranque = metricas.Medidor(
+    "otech_arranque_segundos", "Segundos desde el inicio del proceso hasta cada fase del arranque.", ("fase",)
+)
+
+@metricas.al_exponer
+def _metricas_arranque():
+    for fase, segundos in arranque.fases().items():
+        _medidor_arranque.fijar(fase, valor=segundos)
+
+@app.get("/metrics")
+async def exponer_metricas():
+    return Response(metricas.exponer(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/admin/pool_conexiones")
+async def estado_pool_conexiones():
+    estadisticas = database.estadisticas_pool()
+    if estadisticas is None:
+        raise HTTPException(status_code=503, detail="El pool de conexiones no está iniciado")
+    return estadisticas
+
+MAX_DESPLAZAMIENTO_BUSQUEDA = 5000
+
+@app.get("/buscar")
+async def buscar_piezas(
+    q: str = Query(..., min_length=1, max_length=100),
+    limite: int = Query(50, ge=1, le=200),
+    pagina: int = Query(1, ge=1),
+):
+    """
+    Piezas cuyo número de serie o código de barras contiene 'q' (o cuyo producto
+    se llama así), ordenadas: coincidencia exacta, prefijo, fragmento, nombre.
+    """
+    desplazamiento = (pagina - 1) * limite
+    if desplazamiento > MAX_DESPLAZAMIENTO_BUSQUEDA:
+        raise HTTPException(status_code=400, detail="Demasiadas páginas; refine la búsqueda")
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Texto de búsqueda vacío")
+    resultado = await en_hilo_db(buscar_piezas_db, q, limite, desplazamiento)
+    return {"pagina": pagina, **resultado}
+
 @app.get("/inventario")
-async def obtener_inventario():
-    print("Solicitando /inventario...")
-    conn = get_db_connection()
-    
-    if conn is None:
-        print("¡Falló la conexión en el endpoint! Devolviendo error 500.")
-        raise HTTPException(status_code=500, detail="Error: No se pudo conectar a la base de datos")
+async def obtener_inventario(
+    estado: Optional[str] = None,
+    id_producto: Optional[int] = None,
+    id_dron: Optional[int] = None,
+    caja: Optional[str] = None,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    serie: Optional[str] = None,
+    limite: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    total: bool = False
+):
+    filtros = {
+        "estado": estado,
+        "id_producto": id_producto,
+        "id_dron": id_dron,
+        "caja": caja,
+        "desde": desde,
+        "hasta": hasta,
+        "serie": serie,
+    }
+
+    # Sin parámetros de paginación se mantiene la respuesta original (lista completa)
+    paginado = limite is not None or cursor is not None or total
+    if paginado and limite is None:
+        limite = 100
+
+    cursor_pagina = None
+    if cursor:
+        try:
+            cursor_pagina = decodificar_cursor_inventario(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
     try:
-        print("Creando cursor...")
-        cursor = conn.cursor(dictionary=True)
-        
-        print("Ejecutando consulta SQL...")
-        cursor.execute("""
-            SELECT 
-                p.id_pieza,
-                p.codigo_barras,
-                p.numero_serie,
-                p.estado,
-                p.caja,
-                p.fecha_registro,
-                pr.nombre AS nombre_producto,
-                d.nombre AS nombre_dron,
-                COALESCE(u.nombre_usuario, 'Usuario eliminado') AS nombre_usuario
-            FROM pieza p
-            LEFT JOIN producto pr ON p.id_producto = pr.id_producto
-            LEFT JOIN dron d ON pr.id_dron = d.id
-            LEFT JOIN usuario u ON p.id_usuario = u.id_usuario
-            ORDER BY p.fecha_registro DESC;
-        """)
-        
-        print("Consulta ejecutada. Obteniendo resultados...")
-        piezas = cursor.fetchall()
-        print(f"Se encontraron {len(piezas)} piezas.")
-        
-        cursor.close()
-        conn.close()
-        print("Conexión cerrada.")
-        
-        return piezas
+        resultado = await en_hilo_db(obtener_inventario_db, filtros, limite, cursor_pagina, contar=total)
     except Exception as e:
-        print(f"ERROR al ejecutar la consulta: {e}")
-        if 'cursor' in locals():
-            cursor.close()
-        if 'conn' in locals() and conn.is_connected():
-            conn.close()
+        logger.exception("Error al consultar el inventario", extra={"filtros": filtros})
         raise HTTPException(status_code=500, detail=f"Error en consulta SQL: {str(e)}")
 
+    logger.debug("Inventario consultado", extra={"piezas": len(resultado["piezas"]), "paginado": paginado})
+    if not paginado:
+        return resultado["piezas"]
+    return resultado
+
+
+# --- Historial de movimientos ---
+
+async def _historial(limite, cursor, **filtros):
+    cursor_pagina = None
+    if cursor:
+        try:
+            cursor_pagina = decodificar_cursor_inventario(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return await en_hilo_db(obtener_movimientos_db, limite, cursor_pagina, **filtros)
+
+@app.get("/historial/pieza/{id_pieza}")
+async def historial_pieza(
+    id_pieza: int,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    limite: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    archivo: bool = False
+):
+    """Qué le pasó a una pieza, del movimiento más reciente al más antiguo."""
+    return await _historial(limite, cursor, id_pieza=id_pieza, desde=desde, hasta=hasta, archivo=archivo)
+
+@app.get("/historial/usuario/{id_usuario}")
+async def historial_usuario(
+    id_usuario: int,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    limite: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    archivo: bool = False
+):
+    return await _historial(limite, cursor, id_usuario=id_usuario, desde=desde, hasta=hasta, archivo=archivo)
+
+@app.get("/historial")
+async def historial_rango(
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    limite: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    archivo: bool = False
+):
+    """Movimientos de un rango de fechas (p. ej. ?desde=2025-03-10&hasta=2025-03-10 para un día)."""
+    return await _historial(limite, cursor, desde=desde, hasta=hasta, archivo=archivo)
+
+MAX_DIAS_SERIE_STOCK = 731
+
+@app.get("/historial/stock")
+async def historial_stock(
+    desde: date,
+    hasta: date,
+    agrupar: str = Query("", description="producto, estado y/o caja separados por comas"),
+    id_producto: Optional[int] = None,
+    estado: Optional[str] = None,
+    caja: Optional[str] = None
+):
+    """Unidades al cierre de cada día (fotos de instantaneas.py), agrupadas a elección."""
+    if hasta < desde:
+        raise HTTPException(status_code=400, detail="'hasta' es anterior a 'desde'")
+    if (hasta - desde).days >= MAX_DIAS_SERIE_STOCK:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_DIAS_SERIE_STOCK} días por consulta")
+    grupos = list(dict.fromkeys(g.strip() for g in agrupar.split(",") if g.strip()))
+    invalidos = [g for g in grupos if g not in AGRUPACIONES_STOCK]
+    if invalidos:
+        raise HTTPException(status_code=400, detail=f"Agrupación no válida: {', '.join(invalidos)}")
+
+    resultado = await en_hilo_db(
+        serie_stock_db, desde, hasta, grupos, id_producto=id_producto, estado=estado, caja=caja
+    )
+    return {"desde": desde, "hasta": hasta, "agrupar": grupos, **resultado}
+
+
+def _registrar_salida(id_pieza, id_usuario, observaciones, rol=None):
+    # Rol de la sesión si la hay; si no, de las referencias en memoria (antes de abrir la transacción)
+    if rol is None:
+        rol = referencias.rol_usuario(id_usuario)
+    with UnidadDeTrabajo() as uow:
+        # 1. Verificar que la pieza existe y está almacenada
+        pieza = obtener_pieza_para_cambio(id_pieza, uow)
+        if pieza is None:
+            raise HTTPException(status_code=404, detail="Pieza no encontrada")
+        estado = pieza["estado"]
+        if estado != 'almacenado':
+            raise HTTPException(status_code=400, detail="La pieza no está en almacén")
+
+        # 2. VALIDAR ROL DEL USUARIO
+        if rol is None:
+            raise HTTPException(status_code=404, detail="Usuario no encontrado")
+
+        if rol not in ['admin', 'salida']:
+            raise HTTPException(status_code=403, detail="Acceso denegado: no tienes permiso para registrar salidas")
+
+        # 3. Actualizar estado
+        actualizar_estado_pieza_db(id_pieza, 'salida', uow)
+        ajustar_stock(cambio_de_estado(pieza["id_producto"], estado, 'salida'), uow)
+
+        # 4. Registrar movimiento
+        registrar_movimiento(
+            id_pieza, 'salida', id_usuario, observaciones,
+            estado_anterior=estado, estado_nuevo='salida', uow=uow
+        )
+        uow.despues_de_confirmar(
+            cambios.publicar, "pieza_estado", {"piezas": [{"id_pieza": id_pieza, "estado": "salida"}]}
+        )
 
 @app.post("/registrar_salida")
-async def registrar_salida(id_pieza: int, id_usuario: int, observaciones: str = ""):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # 1. Verificar que la pieza existe y está almacenada
-    cursor.execute("SELECT estado FROM pieza WHERE id_pieza = %s", (id_pieza,))
-    pieza = cursor.fetchone()
-    if not pieza:
-        raise HTTPException(status_code=404, detail="Pieza no encontrada")
-    if pieza[0] != 'almacenado':
-        raise HTTPException(status_code=400, detail="La pieza no está en almacén")
-
-    # 2. VALIDAR ROL DEL USUARIO
-    cursor.execute("SELECT rol FROM usuario WHERE id_usuario = %s", (id_usuario,))
-    usuario = cursor.fetchone()
-    if not usuario:
-        raise HTTPException(status_code=404, detail="Usuario no encontrado")
-    
-    rol = usuario[0]
-    if rol not in ['admin', 'salida']:
-        raise HTTPException(status_code=403, detail="Acceso denegado: no tienes permiso para registrar salidas")
-
-    # 3. Actualizar estado
-    cursor.execute("UPDATE pieza SET estado = 'salida' WHERE id_pieza = %s", (id_pieza,))
-
-    # 4. Registrar movimiento
-    cursor.execute("""
-        INSERT INTO movimiento (id_pieza, tipo_movimiento, id_usuario, observaciones)
-        VALUES (%s, 'salida', %s, %s)
-    """, (id_pieza, id_usuario, observaciones))
-
-    conn.commit()
-    cursor.close()
-    conn.close()
+async def registrar_salida(id_pieza: int, id_usuario: int, observaciones: str = "",
+                           sesion: dict = Depends(sesion_actual)):
+    rol = sesion["rol"] if sesion and sesion["id_usuario"] == id_usuario else None
+    await en_hilo_db(_registrar_salida, id_pieza, id_usuario, observaciones, rol)
+    invalidar_codigos_de_pieza(id_pieza)
     return {"mensaje": "Salida registrada exitosamente"}
 
+# --- Canal de cambios (Server-Sent Events) ---
+
+@app.get("/cambios")
+async def canal_cambios(request: Request, desde: Optional[int] = None,
+                        last_event_id: Optional[str] = Header(None)):
+    """
+    Flujo de eventos: pieza_alta, pieza_estado, producto_alta, importacion.
+    Para reanudar se pasa la última secuencia recibida en 'desde' (o en
+    Last-Event-ID, que EventSource envía solo al reconectar). Si el historial ya
+    no la cubre se emite 'reiniciar' y el cliente debe recargar el inventario.
+    """
+    if desde is None and last_event_id and last_event_id.isdigit():
+        desde = int(last_event_id)
+    return StreamingResponse(
+        cambios.suscribir(desde, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/alertas/stock_bajo")
 async def obtener_alertas_stock_bajo():
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT 
-            p.id_producto,
-            p.nombre,
-            p.stock_minimo,
-            COUNT(pi.id_pieza) as stock_actual
-        FROM producto p
-        LEFT JOIN pieza pi ON p.id_producto = pi.id_producto AND pi.estado = 'disponible'
-        WHERE p.stock_minimo > 0
-        GROUP BY p.id_producto, p.nombre, p.stock_minimo
-        HAVING stock_actual < p.stock_minimo
-    """)
-    alertas = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return alertas
+    # Lee los contadores de stock_producto en lugar de contar piezas en cada petición
+    return await en_hilo_db(alertas_stock_bajo)
 
 # --- Exportación de Inventario ---
 
-from fastapi.responses import FileResponse
-import pandas as pd
-import tempfile
-from fastapi import FastAPI
-from fastapi.responses import StreamingResponse
-import pandas as pd
-from io import BytesIO
 from datetime import datetime
-from openpyxl import Workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.styles import Font
+from exportacion import generar_xlsx, generar_csv
 
 @app.get("/exportar/inventario")
-async def exportar_inventario():
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT 
-                p.id_pieza,
-                pr.nombre AS nombre_producto,
-                d.nombre AS nombre_dron,       
-                p.codigo_barras, 
-                p.numero_serie, 
-                p.estado, 
-                p.fecha_registro,
-                u.nombre_usuario AS usuario_nombre,
-                p.caja
-            FROM pieza p
-            LEFT JOIN producto pr ON p.id_producto = pr.id_producto
-            LEFT JOIN dron d ON pr.id_dron = d.id 
-            LEFT JOIN usuario u ON p.id_usuario = u.id_usuario
-            WHERE p.estado = 'disponible'
-            ORDER BY p.fecha_registro DESC;
-        """)
-        piezas = cursor.fetchall()
-        cursor.close()
-        conn.close()
-
-        # Definir columnas explícitamente
-        columnas = ['id_pieza', 'nombre_producto', 'nombre_dron', 'codigo_barras', 'numero_serie', 'estado', 'fecha_registro', 'usuario_nombre', 'caja']
-        if not piezas:
-            df = pd.DataFrame(columns=columnas)
-        else:
-            df = pd.DataFrame(piezas, columns=columnas)
+async def exportar_inventario(formato: str = Query("xlsx", alias="format")):
+    # Las filas se leen por lotes y se envían a medida que se generan,
+    # así la memoria no crece con el tamaño del inventario. Cada descarga ocupa
+    # una conexión del pool hasta terminar (o hasta que el cliente se desconecta).
+    marca = datetime.now().strftime('%Y%m%d_%H%M%S')
+    if formato == "csv":
+        return StreamingResponse(
+            generar_csv(),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": f"attachment; filename=inventario_otech_{marca}.csv"}
+        )
+    if formato != "xlsx":
+        raise HTTPException(status_code=400, detail="Formato no válido. Use 'xlsx' o 'csv'")
 
-        # Reemplazar NaN/None por cadenas vacías
-        df = df.fillna("")
+    return StreamingResponse(
+        generar_xlsx(),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": f"attachment; filename=inventario_otech_{marca}.xlsx"}
+    )
 
-        # Formatear fecha de forma segura
-        if 'fecha_registro' in df.columns:
-            df['fecha_registro'] = pd.to_datetime(df['fecha_registro'], errors='coerce')
-            df['fecha_registro'] = df['fecha_registro'].apply(
-                lambda x: x.strftime('%d/%m/%Y %H:%M') if pd.notna(x) else ""
-            )
 
-        # Renombrar columnas
-        df.rename(columns={
-            'id_pieza': 'ID Pieza',
-            'nombre_producto': 'Producto',
-            'nombre_dron': 'Dron',
-            'codigo_barras': 'Código de Barras',
-            'numero_serie': 'Número de Serie',
-            'estado': 'Estado',
-            'fecha_registro': 'Fecha de Registro',
-            'usuario_nombre': 'Registrado por',
-            'caja': 'Caja'
-        }, inplace=True)
-
-        # Crear Excel con formato profesional
-        output = BytesIO()
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Inventario"
-
-        # Estilos
-        header_font = Font(name='Calibri', bold=True, size=12, color="FFFFFF")
-        header_fill = PatternFill(start_color="2C3E50", end_color="2C3E50", fill_type="solid")
-        body_font = Font(name='Calibri', size=11)
-        alignment_center = Alignment(horizontal="center", vertical="center")
-        thin_border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
+# --- Importación de manifiestos de proveedor ---
 
-        # Escribir encabezados
-        headers = list(df.columns)
-        for col_idx, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_idx, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = alignment_center
-            cell.border = thin_border
-
-        # Escribir filas
-        for row_idx, row in enumerate(df.itertuples(index=False), 2):
-            for col_idx, value in enumerate(row, 1):
-                cell = ws.cell(row=row_idx, column=col_idx, value=str(value))  # ← Conversión segura a str
-                cell.font = body_font
-                cell.alignment = Alignment(horizontal="left", vertical="center")
-                cell.border = thin_border
-
-        # Ajustar ancho
-        for col in ws.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 40)
-            ws.column_dimensions[column].width = adjusted_width
-
-        ws.sheet_view.showGridLines = False
-        wb.save(output)
-        output.seek(0)
-
-        filename = f"inventario_otech_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        return StreamingResponse(
-            output,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
+import importacion
+from fastapi import UploadFile, File
+from fastapi.responses import FileResponse
 
-    except Exception as e:
-        # ¡IMPORTANTE! Esto te ayudará a depurar
-        print("Error en /exportar/inventario:", str(e))
+DIRECTORIO_IMPORTACIONES = "importaciones"
+_REPORTE_VALIDO = re.compile(r"^\d{8}_\d{6}_[0-9a-f]{8}_errores\.csv$")
+
+def _borrar_reporte(ruta):
+    try:
+        os.remove(ruta)
+    except FileNotFoundError:
+        pass
+
+def _avisar_importacion(resumen):
+    if resumen["importadas"]:
+        # Muchos códigos pasan a existir a la vez: más simple vaciar la caché que invalidarlos uno a uno
+        cache_codigos.limpiar()
+        if resumen["productos_creados"]:
+            referencias.productos.invalidar()
+        cambios.publicar("importacion", {"importadas": resumen["importadas"], "productos_creados": resumen["productos_creados"]})
+
+def _importar_manifiesto(archivo, formato, id_usuario, ruta_reporte):
+    def progreso(resumen, registradas):
+        logger.info("Importando manifiesto", extra={"filas": resumen["filas"], "importadas": resumen["importadas"]})
+
+    with open(ruta_reporte, "w", encoding="utf-8", newline="") as reporte:
+        return importacion.importar(archivo, formato, id_usuario, reporte=reporte, progreso=progreso)
+
+@app.post("/importar/manifiesto")
+async def importar_manifiesto(request: Request, archivo: UploadFile = File(...), id_usuario: int = Form(1)):
+    """
+    Importa un manifiesto CSV o XLSX (codigo_original, numero_serie, caja y
+    opcionalmente nombre_producto, descripcion_producto, id_dron).
+    Las etiquetas no se generan aquí: se dibujan al pedirlas en /codigos.
+    """
+    formato = (archivo.filename or "").rpartition(".")[2].lower()
+    if formato not in ("csv", "xlsx"):
+        raise HTTPException(status_code=400, detail="Formato no válido. Use un archivo .csv o .xlsx")
+
+    os.makedirs(DIRECTORIO_IMPORTACIONES, exist_ok=True)
+    nombre_reporte = f"{datetime.now():%Y%m%d_%H%M%S}_{os.urandom(4).hex()}_errores.csv"
+    ruta_reporte = os.path.join(DIRECTORIO_IMPORTACIONES, nombre_reporte)
+    try:
+        resumen = await en_hilo_db(_importar_manifiesto, archivo.file, formato, id_usuario, ruta_reporte)
+    except importacion.ManifiestoInvalido as e:
+        _borrar_reporte(ruta_reporte)
+        detalle = str(e)
+        if e.resumen and e.resumen["importadas"]:
+            # El archivo falló a mitad: lo importado antes queda y los clientes deben saberlo
+            _avisar_importacion(e.resumen)
+            detalle += f" (se importaron {e.resumen['importadas']} filas antes del error)"
+        raise HTTPException(status_code=400, detail=detalle)
+    except Exception:
+        # Base de datos caída, error inesperado...: sin reporte huérfano en importaciones/
+        _borrar_reporte(ruta_reporte)
         raise
 
+    _avisar_importacion(resumen)
+    if resumen["errores"]:
+        resumen["reporte_errores"] = f"{str(request.base_url).rstrip('/')}/importar/errores/{nombre_reporte}"
+    else:
+        _borrar_reporte(ruta_reporte)
+    return resumen
+
+@app.get("/importar/errores/{archivo}")
+async def reporte_errores_importacion(archivo: str):
+    ruta = os.path.join(DIRECTORIO_IMPORTACIONES, archivo)
+    if not _REPORTE_VALIDO.match(archivo) or not os.path.exists(ruta):
+        raise HTTPException(status_code=404, detail="Reporte no encontrado")
+    return FileResponse(ruta, media_type="text/csv; charset=utf-8", filename=archivo)
+
 
 # --- Endpoints de Administración ---
-from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
+def _listar_usuarios():
+    with database.cursor() as cursor:
+        cursor.execute("""
+            SELECT id_usuario, nombre_usuario, nombre_completo, email, rol, activo, ultimo_login 
+            FROM usuario WHERE activo = 1
+            ORDER BY id_usuario DESC
+        """)
+        return cursor.fetchall()
 
 @app.get("/admin/listar_usuarios")
 async def listar_usuarios():
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT id_usuario, nombre_usuario, nombre_completo, email, rol, activo, ultimo_login 
-        FROM usuario WHERE activo = 1
-        ORDER BY id_usuario DESC
-    """)
-    usuarios = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return usuarios
+    return await en_hilo_db(_listar_usuarios)
 
 
 
 # --- Endpoint para crear nuevo usuario (solo admin) ---
+def _crear_usuario(nombre_completo, nombre_usuario, email, password_hash):
+    with database.cursor() as cursor:
+        # Verificar duplicados: nombre_usuario, email, nombre_completo
+        cursor.execute("""
+            SELECT * FROM usuario 
+            WHERE nombre_usuario = %s OR email = %s OR nombre_completo = %s
+        """, (nombre_usuario, email, nombre_completo))
+
+        if cursor.fetchone():
+            raise HTTPException(status_code=400, detail="El nombre de usuario, correo o nombre completo ya están registrados")
+
+        # Insertar con rol fijo 'Operario'
+        cursor.execute("""
+            INSERT INTO usuario (nombre_usuario, nombre_completo, email, rol, activo, password_hash)
+            VALUES (%s, %s, %s, 'Operario', %s, %s)
+        """, (nombre_usuario, nombre_completo, email, True, password_hash))
+        return cursor.lastrowid
+
 @app.post("/admin/crear_usuario")
 async def crear_usuario_admin(
     nombre_completo: str,
@@ -520,32 +968,12 @@ async def crear_usuario_admin(
     if not re.match(email_regex, email):
         raise HTTPException(status_code=400, detail="Formato de correo electrónico inválido")
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    
-    # Verificar duplicados: nombre_usuario, email, nombre_completo
-    cursor.execute("""
-        SELECT * FROM usuario 
-        WHERE nombre_usuario = %s OR email = %s OR nombre_completo = %s
-    """, (nombre_usuario, email, nombre_completo))
-    
-    if cursor.fetchone():
-        raise HTTPException(status_code=400, detail="El nombre de usuario, correo o nombre completo ya están registrados")
-    
     # Hashear contraseña
-    password_hash = pwd_context.hash(password)
-    
-    # Insertar con rol fijo 'Operario'
-    cursor.execute("""
-        INSERT INTO usuario (nombre_usuario, nombre_completo, email, rol, activo, password_hash)
-        VALUES (%s, %s, %s, 'Operario', %s, %s)
-    """, (nombre_usuario, nombre_completo, email, True, password_hash))
-    
-    conn.commit()
-    user_id = cursor.lastrowid
-    cursor.close()
-    conn.close()
-    
+    password_hash = await seguridad.hashear_password(password)
+
+    user_id = await en_hilo_db(_crear_usuario, nombre_completo, nombre_usuario, email, password_hash)
+    referencias.usuarios.invalidar()
+
     return {
         "mensaje": f"Usuario '{nombre_completo}' creado exitosamente con rol 'Operario' (ID {user_id})"
     }
@@ -554,6 +982,24 @@ async def crear_usuario_admin(
 
 
 # --- Endpoint para crear nuevo producto (solo admin) ---
+def _crear_producto(codigo_original, nombre, descripcion, id_dron, stock_minimo):
+    with database.cursor() as cursor:
+        # Verificar duplicados: nombre
+        cursor.execute("""
+            SELECT * FROM producto
+            WHERE nombre = %s
+        """, (nombre,))
+
+        if cursor.fetchone():
+            raise HTTPException(status_code=400, detail="El producto ya está registrado")
+
+        # Insertar nuevo producto
+        cursor.execute("""
+            INSERT INTO producto (codigo_original,nombre, descripcion, id_dron, stock_minimo)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (codigo_original, nombre, descripcion, id_dron, stock_minimo))
+        return cursor.lastrowid
+
 @app.post("/admin/crear_producto")
 async def crear_producto_admin(
     codigo_original: str,
@@ -562,27 +1008,13 @@ async def crear_producto_admin(
     id_dron: int,
     stock_minimo: int
 ):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    # Verificar duplicados: nombre
-    cursor.execute("""
-        SELECT * FROM producto
-        WHERE nombre = %s
-    """, (nombre,))
-
-    if cursor.fetchone():
-        raise HTTPException(status_code=400, detail="El producto ya está registrado")
-
-    # Insertar nuevo producto
-    cursor.execute("""
-        INSERT INTO producto (codigo_original,nombre, descripcion, id_dron, stock_minimo)
-        VALUES (%s, %s, %s, %s, %s)
-    """, (codigo_original, nombre, descripcion, id_dron, stock_minimo))
-
-    conn.commit()
-    cursor.close()
-    conn.close()
+    id_producto = await en_hilo_db(_crear_producto, codigo_original, nombre, descripcion, id_dron, stock_minimo)
+    invalidar_codigos(codigo_original)
+    referencias.productos.invalidar()
+    cambios.publicar("producto_alta", {
+        "id_producto": id_producto, "codigo_original": codigo_original,
+        "nombre": nombre, "id_dron": id_dron, "stock_minimo": stock_minimo
+    })
 
     return {
         "mensaje": f"Producto '{nombre}' creado exitosamente"
@@ -593,6 +1025,58 @@ async def crear_producto_admin(
 
 
 # --- Endpoint para editar usuario (solo admin) ---
+def _editar_usuario(id_usuario, nombre_completo, nombre_usuario, email, rol):
+    with database.cursor() as cursor:
+        # Verificar que el usuario a editar exista
+        cursor.execute("SELECT * FROM usuario WHERE id_usuario = %s", (id_usuario,))
+        usuario_existente = cursor.fetchone()
+        if not usuario_existente:
+            raise HTTPException(status_code=404, detail="Usuario no encontrado")
+
+        # Validar rol (solo 'Admin' o 'Operario')
+        if rol and rol not in ['Admin', 'Operario']:
+            raise HTTPException(status_code=400, detail="Rol no válido. Solo 'Admin' o 'Operario'")
+
+        # Verificar duplicados si se actualiza nombre_usuario o email
+        if nombre_usuario or email:
+            # Solo los campos que cambian; un NULL no coincide con ninguna fila
+            nombre_nuevo = nombre_usuario if nombre_usuario and nombre_usuario != usuario_existente['nombre_usuario'] else None
+            email_nuevo = email if email and email != usuario_existente['email'] else None
+
+            if nombre_nuevo or email_nuevo:
+                query = "SELECT id_usuario FROM usuario WHERE (nombre_usuario = %s OR email = %s) AND id_usuario != %s"
+                params = (nombre_nuevo, email_nuevo, id_usuario)
+                cursor.execute(query, params)
+                if cursor.fetchone():
+                    raise HTTPException(status_code=400, detail="El nombre de usuario o correo ya están en uso")
+
+        # Construir consulta de actualización
+        updates = []
+        valores = []
+
+        if nombre_completo is not None:
+            updates.append("nombre_completo = %s")
+            valores.append(nombre_completo)
+
+        if nombre_usuario is not None:
+            updates.append("nombre_usuario = %s")
+            valores.append(nombre_usuario)
+
+        if email is not None:
+            updates.append("email = %s")
+            valores.append(email)
+
+        if rol is not None:
+            updates.append("rol = %s")
+            valores.append(rol)
+
+        if not updates:
+            raise HTTPException(status_code=400, detail="No se proporcionaron campos para actualizar")
+
+        valores.append(id_usuario)
+        query = f"UPDATE usuario SET {', '.join(updates)} WHERE id_usuario = %s"
+        cursor.execute(query, valores)
+
 @app.put("/admin/editar_usuario/{id_usuario}")
 async def editar_usuario(
     id_usuario: int,
@@ -601,111 +1085,49 @@ async def editar_usuario(
     email: str = None,
     rol: str = None
 ):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    
-    # Verificar que el usuario a editar exista
-    cursor.execute("SELECT * FROM usuario WHERE id_usuario = %s", (id_usuario,))
-    usuario_existente = cursor.fetchone()
-    if not usuario_existente:
-        raise HTTPException(status_code=404, detail="Usuario no encontrado")
-    
-    # Validar rol (solo 'Admin' o 'Operario')
-    if rol and rol not in ['Admin', 'Operario']:
-        raise HTTPException(status_code=400, detail="Rol no válido. Solo 'Admin' o 'Operario'")
-    
-    # Verificar duplicados si se actualiza nombre_usuario o email
-    if nombre_usuario or email:
-        query = "SELECT id_usuario FROM usuario WHERE "
-        params = []
-        conditions = []
-        
-        if nombre_usuario and nombre_usuario != usuario_existente['nombre_usuario']:
-            conditions.append("nombre_usuario = %s")
-            params.append(nombre_usuario)
-        
-        if email and email != usuario_existente['email']:
-            conditions.append("email = %s")
-            params.append(email)
-        
-        if conditions:
-            query += " OR ".join(conditions)
-            query += " AND id_usuario != %s"
-            params.append(id_usuario)
-            
-            cursor.execute(query, params)
-            if cursor.fetchone():
-                raise HTTPException(status_code=400, detail="El nombre de usuario o correo ya están en uso")
-    
-    # Construir consulta de actualización
-    updates = []
-    valores = []
-    
-    if nombre_completo is not None:
-        updates.append("nombre_completo = %s")
-        valores.append(nombre_completo)
-    
-    if nombre_usuario is not None:
-        updates.append("nombre_usuario = %s")
-        valores.append(nombre_usuario)
-    
-    if email is not None:
-        updates.append("email = %s")
-        valores.append(email)
-    
-    if rol is not None:
-        updates.append("rol = %s")
-        valores.append(rol)
-    
-    if not updates:
-        raise HTTPException(status_code=400, detail="No se proporcionaron campos para actualizar")
-    
-    valores.append(id_usuario)
-    query = f"UPDATE usuario SET {', '.join(updates)} WHERE id_usuario = %s"
-    cursor.execute(query, valores)
-    conn.commit()
-    cursor.close()
-    conn.close()
-    
+    await en_hilo_db(_editar_usuario, id_usuario, nombre_completo, nombre_usuario, email, rol)
+    referencias.usuarios.invalidar()
+    seguridad.revocar_sesiones(id_usuario)
     return {"mensaje": f"Usuario ID {id_usuario} actualizado exitosamente"}
 
 # --- Endpoint para eliminar lógicamente usuario (solo admin) ---
+def _alternar_usuario_activo(id_usuario):
+    with database.cursor() as cursor:
+        # Verificar que el usuario exista
+        cursor.execute("SELECT * FROM usuario WHERE id_usuario = %s", (id_usuario,))
+        usuario = cursor.fetchone()
+        if not usuario:
+            raise HTTPException(status_code=404, detail="Usuario no encontrado")
+
+        # No permitir eliminar al propio admin que está realizando la acción
+        # (esto se validaría mejor con autenticación JWT, pero por ahora asumimos que el frontend ya valida esto)
+
+        # Alternar estado 'activo'
+        nuevo_estado = not usuario['activo']
+        cursor.execute("UPDATE usuario SET activo = %s WHERE id_usuario = %s", (nuevo_estado, id_usuario))
+        return nuevo_estado
+
 @app.put("/admin/eliminar_usuario/{id_usuario}")
 async def eliminar_usuario(id_usuario: int):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    
-    # Verificar que el usuario exista
-    cursor.execute("SELECT * FROM usuario WHERE id_usuario = %s", (id_usuario,))
-    usuario = cursor.fetchone()
-    if not usuario:
-        raise HTTPException(status_code=404, detail="Usuario no encontrado")
-    
-    # No permitir eliminar al propio admin que está realizando la acción
-    # (esto se validaría mejor con autenticación JWT, pero por ahora asumimos que el frontend ya valida esto)
-    
-    # Alternar estado 'activo'
-    nuevo_estado = not usuario['activo']
-    cursor.execute("UPDATE usuario SET activo = %s WHERE id_usuario = %s", (nuevo_estado, id_usuario))
-    conn.commit()
-    cursor.close()
-    conn.close()
-    
+    nuevo_estado = await en_hilo_db(_alternar_usuario_activo, id_usuario)
+    referencias.usuarios.invalidar()
+    if not nuevo_estado:
+        seguridad.revocar_sesiones(id_usuario)
     estado_texto = "activado" if nuevo_estado else "desactivado"
     return {"mensaje": f"Usuario ID {id_usuario} {estado_texto} exitosamente"}
 
 
 
 
+def _obtener_usuario(id_usuario):
+    with database.cursor() as cursor:
+        cursor.execute("SELECT * FROM usuario WHERE id_usuario = %s", (id_usuario,))
+        return cursor.fetchone()
+
 @app.get("/admin/obtener_usuario/{id_usuario}")
 async def obtener_usuario(id_usuario: int):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM usuario WHERE id_usuario = %s", (id_usuario,))
-    usuario = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    
+    usuario = await en_hilo_db(_obtener_usuario, id_usuario)
+
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
@@ -717,10 +1139,7 @@ async def obtener_usuario(id_usuario: int):
 
 @app.get("/admin/listar_drones")
 async def listar_drones():
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT id, nombre FROM dron ORDER BY nombre")
-    drones = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return drones
\ No newline at end of file
+    return await en_hilo_db(referencias.listar_drones)
+
+
+arranque.fin_importaciones()
@@ -0,0 +1,277 @@
+# backend/metricas.py
+# Métricas en memoria (latencia por ruta, por consulta y espera de conexión)
+# expuestas en formato de texto de Prometheus en /metrics.
+import bisect
+import functools
+import re
+import sys
+import threading
+import time
+
+TIEMPOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registradas = []
+_recolectores = []
+
+
+def _etiquetas(nombres, valores):
+    if not nombres:
+        return ""
+    pares = []
+    for nombre, valor in zip(nombres, valores):
+        valor = str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pares.append(f'{nombre}="{valor}"')
+    return "{" + ",".join(pares) + "}"
+
+
+def _numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return repr(valor) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores = {}
+        self._lock = threading.Lock()
+        _registradas.append(self)
+
+    def _cabecera(self):
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def incrementar(self, *valores, cantidad=1):
+        with self._lock:
+            self._valores[valores] = self._valores.get(valores, 0) + cantidad
+
+    def fijar(self, *valores, valor):
+        """Para totales que ya acumula otro componente (p. ej. el pool)."""
+        with self._lock:
+            self._valores[valores] = valor
+
+    def exponer(self):
+        with self._lock:
+            valores = sorted(self._valores.items())
+        lineas = self._cabecera()
+        for clave, valor in valores:
+            lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {_numero(valor)}")
+        return lineas
+
+
+class Medidor(_Metrica):
+    tipo = "gauge"
+
+    def sumar(self, *valores, cantidad=1):
+        with self._lock:
+            self._valores[valores] = self._valores.get(valores, 0) + cantidad
+
+    fijar = Contador.fijar
+    exponer = Contador.exponer
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), limites=TIEMPOS):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.limites = tuple(limites)
+
+    def observar(self, *valores, valor):
+        indice = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            datos = self._valores.get(valores)
+            if datos is None:
+                # [conteos por intervalo (el último es +Inf), suma, total]
+                datos = self._valores[valores] = [[0] * (len(self.limites) + 1), 0.0, 0]
+            datos[0][indice] += 1
+            datos[1] += valor
+            datos[2] += 1
+
+    def exponer(self):
+        with self._lock:
+            valores = sorted((clave, [list(d[0]), d[1], d[2]]) for clave, d in self._valores.items())
+        lineas = self._cabecera()
+        nombres = self.etiquetas + ("le",)
+        for clave, (conteos, suma, total) in valores:
+            acumulado = 0
+            for limite, conteo in zip(self.limites + (float("inf"),), conteos):
+                acumulado += conteo
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(nombres, clave + (_numero(limite),))} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {total}")
+        return lineas
+
+
+def al_exponer(funcion):
+    """Registra una función que actualiza medidores justo antes de cada lectura de /metrics."""
+    _recolectores.append(funcion)
+    return funcion
+
+
+def exponer():
+    for funcion in _recolectores:
+        funcion()
+    lineas = []
+    for metrica in _registradas:
+        lineas.extend(metrica.exponer())
+    return "\n".join(lineas) + "\n"
+
+
+# --- HTTP ---
+
+peticiones_segundos = Histograma(
+    "otech_http_peticion_segundos", "Duración de las peticiones HTTP por ruta.", ("metodo", "ruta"))
+respuestas_total = Contador(
+    "otech_http_respuestas_total", "Respuestas HTTP por ruta y código de estado.", ("metodo", "ruta", "codigo"))
+peticiones_en_curso = Medidor(
+    "otech_http_peticiones_en_curso", "Peticiones HTTP atendiéndose en este momento.", ("metodo",))
+
+
+def _plantilla_ruta(scope):
+    # Se usa la plantilla de la ruta (/codigos/{archivo}) para no crear una serie por URL
+    ruta = scope.get("route")
+    return getattr(ruta, "path", None) or "sin_ruta"
+
+
+class MiddlewareMetricas:
+    """Middleware ASGI: latencia, código de estado y peticiones en curso por ruta."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        metodo = scope["method"]
+        codigo = [500]
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                codigo[0] = mensaje["status"]
+            await send(mensaje)
+
+        # La ruta solo se conoce después del enrutado, así que las peticiones en curso van por método
+        inicio = time.perf_counter()
+        peticiones_en_curso.sumar(metodo)
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            peticiones_en_curso.sumar(metodo, cantidad=-1)
+            ruta = _plantilla_ruta(scope)
+            peticiones_segundos.observar(metodo, ruta, valor=time.perf_counter() - inicio)
+            respuestas_total.incrementar(metodo, ruta, str(codigo[0]))
+
+
+# --- Base de datos ---
+
+consulta_segundos = Histograma(
+    "otech_db_consulta_segundos", "Tiempo de ejecución de cada consulta, por nombre de consulta.", ("consulta",))
+filas_total = Contador(
+    "otech_db_filas_total", "Filas leídas por los cursores, por nombre de consulta.", ("consulta",))
+conexion_espera_segundos = Histograma(
+    "otech_db_conexion_espera_segundos", "Tiempo para obtener una conexión del pool.")
+
+
+# Funciones que ejecutan SQL por cuenta de otras (INSERT de varias filas,
+# comprobación de existentes...): la consulta se atribuye a quien las llama
+_AUXILIARES = set()
+
+_SENTENCIA = re.compile(r"^[\s(]*(\w+)", re.ASCII)
+_TABLA = re.compile(r"\b(?:FROM|INTO|UPDATE)\s+`?(\w+)", re.IGNORECASE | re.ASCII)
+
+
+def auxiliar(funcion):
+    """Marca una función que ejecuta SQL en nombre de otra (ver nombre_consulta)."""
+    _AUXILIARES.add(funcion.__code__)
+    return funcion
+
+
+@functools.lru_cache(maxsize=2048)
+def _tipo_sentencia(operacion):
+    # 'select_pieza', 'insert_movimiento'...: distingue las sentencias de una misma función
+    sentencia = _SENTENCIA.match(operacion)
+    tabla = _TABLA.search(operacion)
+    partes = [sentencia.group(1).lower() if sentencia else "?"]
+    if tabla:
+        partes.append(tabla.group(1).lower())
+    return "_".join(partes)
+
+
+def nombre_consulta(operacion="", profundidad=2):
+    """
+    Nombre estable de la consulta: módulo.función que la pidió y tipo de sentencia
+    (p. ej. 'models.insertar_piezas:insert_movimiento'). Se salta las funciones
+    marcadas con @auxiliar y las comprensiones o lambdas en las que se ejecuta.
+    """
+    llamador = marco = sys._getframe(profundidad)
+    while marco is not None and (marco.f_code in _AUXILIARES or marco.f_code.co_name.startswith("<")):
+        marco = marco.f_back
+    marco = marco or llamador
+    modulo = marco.f_globals.get("__name__", "?")
+    texto = operacion if isinstance(operacion, str) else operacion.decode(errors="replace")
+    return f"{modulo}.{marco.f_code.co_name}:{_tipo_sentencia(texto[:200])}"
+
+
+class CursorMedido:
+    """Envoltura de un cursor que mide cada execute() y cuenta las filas leídas."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._consulta = "?"
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._cursor.close()
+
+    def execute(self, operacion, params=None, *args, **kwargs):
+        self._consulta = nombre_consulta(operacion)
+        inicio = time.perf_counter()
+        try:
+            return self._cursor.execute(operacion, params, *args, **kwargs)
+        finally:
+            consulta_segundos.observar(self._consulta, valor=time.perf_counter() - inicio)
+
+    def executemany(self, operacion, secuencia, *args, **kwargs):
+        self._consulta = nombre_consulta(operacion)
+        inicio = time.perf_counter()
+        try:
+            return self._cursor.executemany(operacion, secuencia, *args, **kwargs)
+        finally:
+            consulta_segundos.observar(self._consulta, valor=time.perf_counter() - inicio)
+
+    def fetchone(self):
+        fila = self._cursor.fetchone()
+        if fila is not None:
+            filas_total.incrementar(self._consulta)
+        return fila
+
+    def fetchmany(self, *args, **kwargs):
+        filas = self._cursor.fetchmany(*args, **kwargs)
+        if filas:
+            filas_total.incrementar(self._consulta, cantidad=len(filas))
+        return filas
+
+    def fetchall(self):
+        filas = self._cursor.fetchall()
+        if filas:
+            filas_total.incrementar(self._consulta, cantidad=len(filas))
+        return filas
@@ -0,0 +1,100 @@
+# backend/migraciones/__init__.py
+# Migraciones versionadas del esquema. Cada módulo mNNNN_<nombre>.py define
+# DESCRIPCION y aplicar(cursor); se aplican en orden y quedan registradas
+# en la tabla schema_migraciones.
+import importlib
+import os
+import re
+
+_PATRON = re.compile(r"^m(\d{4})_(\w+)\.py$")
+
+SQL_TABLA_MIGRACIONES = """
+    CREATE TABLE IF NOT EXISTS schema_migraciones (
+        version INT NOT NULL PRIMARY KEY,
+        nombre VARCHAR(100) NOT NULL,
+        aplicada_en DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def disponibles():
+    """Lista ordenada de (version, nombre, modulo) de las migraciones del directorio."""
+    directorio = os.path.dirname(__file__)
+    migraciones = []
+    for archivo in sorted(os.listdir(directorio)):
+        coincidencia = _PATRON.match(archivo)
+        if coincidencia:
+            modulo = importlib.import_module(f"{__name__}.{archivo[:-3]}")
+            migraciones.append((int(coincidencia.group(1)), coincidencia.group(2), modulo))
+    return migraciones
+
+
+def aplicadas(cursor):
+    cursor.execute(SQL_TABLA_MIGRACIONES)
+    cursor.execute("SELECT version FROM schema_migraciones")
+    return {fila[0] for fila in cursor.fetchall()}
+
+
+def pendientes(cursor):
+    hechas = aplicadas(cursor)
+    return [m for m in disponibles() if m[0] not in hechas and not getattr(m[2], "OPCIONAL", False)]
+
+
+def aplicar(cursor, version, nombre, modulo):
+    # El DDL de MySQL confirma implícitamente: las migraciones deben ser
+    # idempotentes para poder repetirse si una falla a medias.
+    modulo.aplicar(cursor)
+    cursor.execute(
+        "INSERT INTO schema_migraciones (version, nombre) VALUES (%s, %s)",
+        (version, nombre)
+    )
+
+
+# --- Utilidades para escribir migraciones idempotentes ---
+
+def existe_tabla(cursor, tabla):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    """, (tabla,))
+    return cursor.fetchone() is not None
+
+
+def existe_columna(cursor, tabla, columna):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (tabla, columna))
+    return cursor.fetchone() is not None
+
+
+def indice_equivalente(cursor, tabla, columnas, unico=False):
+    """Nombre de un índice existente que empieza por esas columnas (y es único si se pide), o None."""
+    cursor.execute("""
+        SELECT INDEX_NAME, NON_UNIQUE, COLUMN_NAME
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        ORDER BY INDEX_NAME, SEQ_IN_INDEX
+    """, (tabla,))
+    indices = {}
+    for nombre, no_unico, columna in cursor.fetchall():
+        indice = indices.setdefault(nombre, {"unico": not no_unico, "columnas": []})
+        indice["columnas"].append(columna.lower())
+
+    buscadas = [c.lower() for c in columnas]
+    for nombre, indice in indices.items():
+        if indice["columnas"][:len(buscadas)] != buscadas:
+            continue
+        if unico and not (indice["unico"] and len(indice["columnas"]) == len(buscadas)):
+            continue
+        return nombre
+    return None
+
+
+def crear_indice(cursor, tabla, nombre, columnas, unico=False):
+    """Crea el índice salvo que ya exista uno equivalente (con cualquier nombre)."""
+    if indice_equivalente(cursor, tabla, columnas, unico):
+        return False
+    tipo = "UNIQUE INDEX" if unico else "INDEX"
+    cursor.execute(f"CREATE {tipo} {nombre} ON {tabla} ({', '.join(columnas)})")
+    return True
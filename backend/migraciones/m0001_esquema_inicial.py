@@ -0,0 +1,67 @@
+# Tablas base del inventario. Usa IF NOT EXISTS para poder aplicarse sobre
+# bases de datos que ya existían antes de tener migraciones.
+DESCRIPCION = "Esquema inicial: dron, usuario, producto, pieza, movimiento"
+
+TABLAS = [
+    """
+    CREATE TABLE IF NOT EXISTS dron (
+        id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        nombre VARCHAR(100) NOT NULL
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS usuario (
+        id_usuario INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        nombre_usuario VARCHAR(50) NOT NULL,
+        nombre_completo VARCHAR(150) NOT NULL,
+        email VARCHAR(150) NOT NULL,
+        rol VARCHAR(20) NOT NULL DEFAULT 'Operario',
+        activo TINYINT(1) NOT NULL DEFAULT 1,
+        password_hash VARCHAR(255) NOT NULL,
+        ultimo_login DATETIME NULL
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS producto (
+        id_producto INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        codigo_original VARCHAR(100) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL,
+        nombre VARCHAR(150) NOT NULL,
+        descripcion TEXT NULL,
+        id_dron INT NULL,
+        stock_minimo INT NOT NULL DEFAULT 0,
+        CONSTRAINT fk_producto_dron FOREIGN KEY (id_dron) REFERENCES dron (id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS pieza (
+        id_pieza INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        id_producto INT NOT NULL,
+        numero_serie VARCHAR(100) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL,
+        codigo_barras VARCHAR(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL,
+        estado VARCHAR(20) NOT NULL DEFAULT 'disponible',
+        id_usuario INT NULL,
+        caja VARCHAR(50) NULL,
+        fecha_registro DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        CONSTRAINT fk_pieza_producto FOREIGN KEY (id_producto) REFERENCES producto (id_producto),
+        CONSTRAINT fk_pieza_usuario FOREIGN KEY (id_usuario) REFERENCES usuario (id_usuario) ON DELETE SET NULL
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    # Sin claves foráneas: movimiento puede particionarse por fecha más adelante
+    """
+    CREATE TABLE IF NOT EXISTS movimiento (
+        id_movimiento BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        id_pieza INT NOT NULL,
+        tipo_movimiento VARCHAR(30) NOT NULL,
+        estado_anterior VARCHAR(20) NULL,
+        estado_nuevo VARCHAR(20) NULL,
+        id_usuario INT NULL,
+        observaciones TEXT NULL,
+        fecha_movimiento DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+]
+
+
+def aplicar(cursor):
+    for sql in TABLAS:
+        cursor.execute(sql)
@@ -0,0 +1,31 @@
+# Índices de los caminos calientes. Los únicos reflejan lo que el código ya
+# supone (un código de barras, un número de serie y un código de proveedor
+# identifican una sola fila).
+from migraciones import crear_indice
+
+DESCRIPCION = "Índices para búsqueda de códigos, inventario, alertas y movimientos"
+
+INDICES = [
+    # (tabla, nombre, columnas, unico)
+    ("pieza", "uq_pieza_codigo_barras", ["codigo_barras"], True),
+    ("pieza", "uq_pieza_numero_serie", ["numero_serie"], True),
+    ("producto", "uq_producto_codigo_original", ["codigo_original"], True),
+    # /alertas/stock_bajo: piezas disponibles por producto
+    ("pieza", "idx_pieza_producto_estado", ["id_producto", "estado"], False),
+    # /inventario: orden y paginación por (fecha_registro, id_pieza)
+    ("pieza", "idx_pieza_fecha_registro", ["fecha_registro", "id_pieza"], False),
+    # /exportar/inventario y filtros por estado
+    ("pieza", "idx_pieza_estado_fecha", ["estado", "fecha_registro"], False),
+    # Filtro por caja en /inventario
+    ("pieza", "idx_pieza_caja", ["caja"], False),
+    # Duplicados por nombre en /admin/crear_producto y productos con stock mínimo
+    ("producto", "idx_producto_nombre", ["nombre"], False),
+    ("producto", "idx_producto_stock_minimo", ["stock_minimo"], False),
+    ("movimiento", "idx_movimiento_pieza", ["id_pieza"], False),
+    ("usuario", "idx_usuario_nombre_usuario", ["nombre_usuario"], False),
+]
+
+
+def aplicar(cursor):
+    for tabla, nombre, columnas, unico in INDICES:
+        crear_indice(cursor, tabla, nombre, columnas, unico)
@@ -0,0 +1,22 @@
+# Contadores de stock por producto y estado, mantenidos por las escrituras
+# (crear_pieza, cambios de estado, salidas). Se cargan aquí desde pieza.
+DESCRIPCION = "Tabla stock_producto con contadores por producto y estado"
+
+
+def aplicar(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stock_producto (
+            id_producto INT NOT NULL,
+            estado VARCHAR(20) NOT NULL,
+            cantidad INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (id_producto, estado),
+            KEY idx_stock_estado (estado, id_producto)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    cursor.execute("""
+        INSERT INTO stock_producto (id_producto, estado, cantidad)
+        SELECT id_producto, estado, COUNT(*)
+        FROM pieza
+        GROUP BY id_producto, estado
+        ON DUPLICATE KEY UPDATE cantidad = VALUES(cantidad)
+    """)
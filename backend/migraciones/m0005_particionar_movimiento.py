@@ -0,0 +1,44 @@
+# Particiona movimiento por mes (RANGE sobre TO_DAYS(fecha_movimiento)).
+# Opcional: reescribe la tabla completa, así que conviene aplicarla en una
+# ventana de mantenimiento con:  python migrar.py aplicar 0005
+# Después, archivar_movimientos.py crea las particiones futuras y archiva las viejas.
+from datetime import date
+
+from migraciones import particiones
+
+DESCRIPCION = "Particionado mensual de movimiento por fecha"
+OPCIONAL = True
+
+MESES_FUTUROS = 3
+
+
+def aplicar(cursor):
+    if particiones.esta_particionada(cursor):
+        return
+
+    # La clave primaria de una tabla particionada debe incluir la columna de partición
+    cursor.execute("SHOW KEYS FROM movimiento WHERE Key_name = 'PRIMARY'")
+    columnas_pk = [fila[4] for fila in cursor.fetchall()]
+    if columnas_pk == ["id_movimiento"]:
+        cursor.execute("""
+            ALTER TABLE movimiento
+                DROP PRIMARY KEY,
+                ADD PRIMARY KEY (id_movimiento, fecha_movimiento)
+        """)
+
+    cursor.execute("SELECT MIN(fecha_movimiento) FROM movimiento")
+    primera = cursor.fetchone()[0]
+    hoy = date.today()
+    mes = particiones.primer_dia_mes(primera or hoy)
+    ultimo = particiones.primer_dia_mes(hoy, MESES_FUTUROS)
+
+    clausulas = []
+    while mes <= ultimo:
+        clausulas.append(particiones.definicion(mes))
+        mes = particiones.primer_dia_mes(mes, 1)
+    clausulas.append(f"PARTITION {particiones.PARTICION_FUTURO} VALUES LESS THAN MAXVALUE")
+
+    cursor.execute(f"""
+        ALTER TABLE movimiento
+        PARTITION BY RANGE (TO_DAYS(fecha_movimiento)) ({', '.join(clausulas)})
+    """)
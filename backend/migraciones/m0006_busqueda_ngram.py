@@ -0,0 +1,19 @@
+# Índice FULLTEXT con el analizador ngram de InnoDB sobre número de serie y
+# código de barras, para buscar por fragmentos (/buscar) sin recorrer pieza.
+# MySQL lo mantiene en cada INSERT/UPDATE; no hace falta tocar las escrituras.
+# El tamaño de los n-gramas es del servidor (ngram_token_size, 2 por defecto;
+# se recomienda 3 en my.cnf). El primer FULLTEXT de una tabla la reconstruye.
+
+DESCRIPCION = "Índice FULLTEXT (ngram) sobre pieza.numero_serie y pieza.codigo_barras"
+
+
+def aplicar(cursor):
+    cursor.execute("SHOW INDEX FROM pieza WHERE Key_name = 'ftx_pieza_codigos'")
+    if cursor.fetchall():
+        return
+    # Con la lista de palabras vacías por defecto, ngram descarta cualquier
+    # n-grama que contenga "a", "i"... y muchas series no se encontrarían
+    cursor.execute("SET SESSION innodb_ft_enable_stopword = OFF")
+    cursor.execute(
+        "ALTER TABLE pieza ADD FULLTEXT INDEX ftx_pieza_codigos (numero_serie, codigo_barras) WITH PARSER ngram"
+    )
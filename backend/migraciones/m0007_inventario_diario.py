@@ -0,0 +1,26 @@
+# Foto diaria del inventario: unidades por producto, estado y caja al cierre
+# de cada día. La calcula instantaneas.py a partir de los movimientos del día
+# sobre la foto anterior; inventario_diario_dias registra los días ya hechos
+# (un día puede no tener filas).
+DESCRIPCION = "Tablas inventario_diario e inventario_diario_dias"
+
+
+def aplicar(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS inventario_diario (
+            fecha DATE NOT NULL,
+            id_producto INT NOT NULL,
+            estado VARCHAR(20) NOT NULL,
+            caja VARCHAR(50) NOT NULL DEFAULT '',
+            cantidad INT NOT NULL,
+            PRIMARY KEY (fecha, id_producto, estado, caja),
+            KEY idx_diario_producto (id_producto, fecha),
+            KEY idx_diario_caja (caja, fecha)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS inventario_diario_dias (
+            fecha DATE NOT NULL PRIMARY KEY,
+            generado_en DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
@@ -0,0 +1,22 @@
+# Operaciones por caja: índice para listar el contenido de una caja en el orden
+# del inventario, y columnas en movimiento para registrar los traslados entre
+# cajas (NULL en los movimientos que no cambian de caja).
+from migraciones import crear_indice, existe_columna, existe_tabla
+
+DESCRIPCION = "Índice pieza(caja, fecha_registro, id_pieza) y caja_anterior/caja_nueva en movimiento"
+
+
+def aplicar(cursor):
+    crear_indice(cursor, "pieza", "idx_pieza_caja_fecha", ["caja", "fecha_registro", "id_pieza"])
+    # El índice anterior solo por caja queda cubierto por el nuevo
+    cursor.execute("SHOW INDEX FROM pieza WHERE Key_name = 'idx_pieza_caja'")
+    if cursor.fetchall():
+        cursor.execute("DROP INDEX idx_pieza_caja ON pieza")
+
+    # movimiento_archivo debe tener las mismas columnas (EXCHANGE PARTITION y archivar_movimientos.py)
+    for tabla in ("movimiento", "movimiento_archivo"):
+        if not existe_tabla(cursor, tabla):
+            continue
+        for columna in ("caja_anterior", "caja_nueva"):
+            if not existe_columna(cursor, tabla, columna):
+                cursor.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} VARCHAR(50) NULL AFTER estado_nuevo")
@@ -0,0 +1,52 @@
+# Intercalación fija para los códigos: con solo DEFAULT CHARSET=utf8mb4, MySQL 8
+# usa utf8mb4_0900_ai_ci (NO PAD) y MySQL 5.7 utf8mb4_general_ci (PAD SPACE), y
+# el backend compara en Python con models.clave_codigo. utf8mb4_unicode_ci es
+# igual en ambas versiones: no distingue mayúsculas, acentos ni espacios finales.
+DESCRIPCION = "utf8mb4_unicode_ci en pieza.numero_serie, pieza.codigo_barras y producto.codigo_original"
+
+INTERCALACION = "utf8mb4_unicode_ci"
+
+COLUMNAS = [
+    # (tabla, columna, tipo); las tres son NOT NULL
+    ("pieza", "numero_serie", "VARCHAR(100)"),
+    ("pieza", "codigo_barras", "VARCHAR(64)"),
+    ("producto", "codigo_original", "VARCHAR(100)"),
+]
+
+
+def _intercalacion(cursor, tabla, columna):
+    cursor.execute("""
+        SELECT COLLATION_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (tabla, columna))
+    return cursor.fetchone()[0]
+
+
+def _duplicados(cursor, tabla, columna):
+    # Valores distintos hoy que pasarían a ser iguales (p. ej. con y sin espacio final)
+    cursor.execute(f"""
+        SELECT {columna} COLLATE {INTERCALACION}, COUNT(*) FROM {tabla}
+        GROUP BY {columna} COLLATE {INTERCALACION}
+        HAVING COUNT(*) > 1
+        LIMIT 5
+    """)
+    return [fila[0] for fila in cursor.fetchall()]
+
+
+def aplicar(cursor):
+    por_tabla = {}
+    for tabla, columna, tipo in COLUMNAS:
+        if _intercalacion(cursor, tabla, columna) == INTERCALACION:
+            continue
+        duplicados = _duplicados(cursor, tabla, columna)
+        if duplicados:
+            raise RuntimeError(
+                f"{tabla}.{columna} tiene valores que serían iguales con {INTERCALACION}: "
+                f"{', '.join(repr(v) for v in duplicados)}. Corríjalos antes de migrar."
+            )
+        por_tabla.setdefault(tabla, []).append(
+            f"MODIFY {columna} {tipo} CHARACTER SET utf8mb4 COLLATE {INTERCALACION} NOT NULL"
+        )
+    # Las columnas del índice FULLTEXT de pieza cambian en la misma sentencia
+    for tabla, cambios in por_tabla.items():
+        cursor.execute(f"ALTER TABLE {tabla} {', '.join(cambios)}")
@@ -0,0 +1,68 @@
+# backend/migraciones/particiones.py
+# Particionado mensual de movimiento por fecha_movimiento. Cada partición se
+# llama pAAAAMM y guarda los movimientos de ese mes; 'pfuturo' recoge el resto.
+from datetime import date
+
+TABLA = "movimiento"
+PARTICION_FUTURO = "pfuturo"
+
+
+def primer_dia_mes(fecha, desplazamiento=0):
+    meses = fecha.year * 12 + fecha.month - 1 + desplazamiento
+    return date(meses // 12, meses % 12 + 1, 1)
+
+
+def nombre_particion(mes):
+    return f"p{mes:%Y%m}"
+
+
+def definicion(mes):
+    """Cláusula PARTITION para el mes que empieza en 'mes'."""
+    return f"PARTITION {nombre_particion(mes)} VALUES LESS THAN (TO_DAYS('{primer_dia_mes(mes, 1)}'))"
+
+
+def esta_particionada(cursor, tabla=TABLA):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+    """, (tabla,))
+    return cursor.fetchone()[0] > 0
+
+
+def particiones(cursor, tabla=TABLA):
+    """[(nombre, filas_estimadas)] en orden, incluida la de futuro."""
+    cursor.execute("""
+        SELECT PARTITION_NAME, TABLE_ROWS FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """, (tabla,))
+    return [(nombre, filas) for nombre, filas in cursor.fetchall()]
+
+
+def mes_de_particion(nombre):
+    """date del primer día del mes de una partición pAAAAMM, o None para 'pfuturo'."""
+    if nombre == PARTICION_FUTURO:
+        return None
+    return date(int(nombre[1:5]), int(nombre[5:7]), 1)
+
+
+def crear_futuras(cursor, meses=3, hoy=None):
+    """Parte 'pfuturo' para que existan particiones hasta 'meses' meses por delante."""
+    hoy = hoy or date.today()
+    existentes = [mes_de_particion(n) for n, _ in particiones(cursor)]
+    ultima = max([m for m in existentes if m is not None], default=None)
+    if ultima is None:
+        return []
+
+    nuevas = []
+    mes = primer_dia_mes(ultima, 1)
+    while mes <= primer_dia_mes(hoy, meses):
+        nuevas.append(mes)
+        mes = primer_dia_mes(mes, 1)
+    if nuevas:
+        # pfuturo está vacía en condiciones normales, así que reorganizarla es inmediato
+        clausulas = [definicion(m) for m in nuevas] + [f"PARTITION {PARTICION_FUTURO} VALUES LESS THAN MAXVALUE"]
+        cursor.execute(
+            f"ALTER TABLE {TABLA} REORGANIZE PARTITION {PARTICION_FUTURO} INTO ({', '.join(clausulas)})"
+        )
+    return [nombre_particion(m) for m in nuevas]
@@ -0,0 +1,152 @@
+# backend/migraciones/planes.py
+# Revisión de planes de ejecución: corre EXPLAIN sobre las consultas del
+# backend y marca las que obligan a recorrer una tabla completa.
+import ast
+import itertools
+import os
+import re
+import string
+from datetime import datetime
+
+DIRECTORIO_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Archivos cuyo SQL literal se revisa
+ARCHIVOS = ["main.py", "models.py", "exportacion.py"]
+
+# Tablas de referencia pequeñas en las que un recorrido completo es aceptable
+TABLAS_PEQUENAS = {"dron", "usuario", "schema_migraciones"}
+
+# Consultas de mantenimiento que recorren una tabla a propósito (SQL normalizado -> motivo).
+# No se ejecutan en ninguna petición; cada una debe justificarse aquí.
+EXENCIONES = {
+    "SELECT id_producto, estado, cantidad FROM stock_producto FOR UPDATE":
+        "reconciliar_stock (reconciliar_stock.py) compara y bloquea todos los contadores; "
+        "se ejecuta a mano o por cron con poco tráfico",
+}
+
+_INICIO_SQL = re.compile(r"^\(?\s*(SELECT|UPDATE|DELETE)\b", re.IGNORECASE)
+
+# Valores de ejemplo para las plantillas con str.format (SQL_CODIGOS_PIEZA...):
+# se revisa una consulta por cada combinación
+VALORES_PLANTILLA = {
+    "columna": ["codigo_barras", "numero_serie"],
+    "marcadores": ["%s, %s, %s"],
+}
+
+
+def expandir_plantilla(sql):
+    """Consultas concretas de una plantilla; lanza KeyError si falta un valor de ejemplo."""
+    campos = sorted({campo for _, campo, _, _ in string.Formatter().parse(sql) if campo})
+    if not campos:
+        return [sql]
+    valores = [VALORES_PLANTILLA[campo] for campo in campos]
+    return [sql.format(**dict(zip(campos, combinacion))) for combinacion in itertools.product(*valores)]
+
+
+def consultas_literales():
+    """Devuelve [(archivo, linea, sql)] con cada cadena literal que es una consulta."""
+    consultas = []
+    for archivo in ARCHIVOS:
+        ruta = os.path.join(DIRECTORIO_BACKEND, archivo)
+        if not os.path.exists(ruta):
+            continue
+        with open(ruta, encoding="utf-8") as f:
+            arbol = ast.parse(f.read(), filename=archivo)
+        for nodo in ast.walk(arbol):
+            if isinstance(nodo, ast.JoinedStr):
+                # Las f-strings se arman en tiempo de ejecución; se cubren con consultas_dinamicas()
+                for parte in nodo.values:
+                    parte._omitir = True
+            if isinstance(nodo, ast.Constant) and isinstance(nodo.value, str) \
+                    and not getattr(nodo, "_omitir", False) and _INICIO_SQL.match(nodo.value.strip()):
+                try:
+                    concretas = expandir_plantilla(nodo.value)
+                except (KeyError, ValueError):
+                    # Sin valores de ejemplo revisar() no podrá analizarla y la marcará como omitida
+                    concretas = [nodo.value]
+                for sql in concretas:
+                    consultas.append((archivo, nodo.lineno, sql))
+    return consultas
+
+
+def consultas_dinamicas():
+    """Consultas armadas en código, con combinaciones de filtros representativas."""
+    import models
+
+    ejemplo_cursor = (datetime(2025, 1, 1), 1)
+    casos = [
+        ("inventario sin filtros", models.consulta_inventario(None, 100)),
+        ("inventario por estado", models.consulta_inventario({"estado": "disponible"}, 100)),
+        ("inventario por producto", models.consulta_inventario({"id_producto": 1}, 100)),
+        ("inventario por caja", models.consulta_inventario({"caja": "A1"}, 100)),
+        ("contenido de caja página siguiente", models.consulta_inventario({"caja": "A1"}, 100, ejemplo_cursor)),
+        ("cajas con piezas por estado", models.consulta_cajas(100, "A1")),
+        ("inventario por serie", models.consulta_inventario({"serie": "ABC"}, 100)),
+        ("inventario página siguiente", models.consulta_inventario(None, 100, ejemplo_cursor)),
+        ("total por estado", models.consulta_total_inventario({"estado": "disponible"})),
+        ("historial por pieza", models.consulta_movimientos(id_pieza=1)),
+        ("historial por usuario", models.consulta_movimientos(id_usuario=1, cursor_pagina=ejemplo_cursor)),
+        ("búsqueda por fragmento", models.consulta_buscar_piezas("SN12", 50)),
+        ("búsqueda por prefijo", models.consulta_buscar_piezas("SN", 50)),
+        ("stock diario por producto", models.consulta_serie_stock(ejemplo_cursor[0], ejemplo_cursor[0], ["estado"], id_producto=1)),
+        ("stock diario por caja", models.consulta_serie_stock(ejemplo_cursor[0], ejemplo_cursor[0], ["producto"], caja="A1")),
+        ("historial por rango", models.consulta_movimientos(desde=ejemplo_cursor[0], hasta=ejemplo_cursor[0])),
+    ]
+    return [(f"models.py ({nombre})", 0, sql % tuple(_literal(p) for p in params)) for nombre, (sql, params) in casos]
+
+
+def _literal(valor):
+    if isinstance(valor, (int, float)):
+        return str(valor)
+    return "'" + str(valor).replace("'", "''") + "'"
+
+
+_PARAMETRO_ENTERO = re.compile(r"\b(LIMIT|OFFSET)\s+%s(\s*,\s*%s)?", re.IGNORECASE)
+
+
+def _sustituir_parametros(sql):
+    # LIMIT y OFFSET solo admiten enteros sin comillas
+    sql = _PARAMETRO_ENTERO.sub(lambda m: f"{m.group(1)} 100" + (", 100" if m.group(2) else ""), sql)
+    # En el resto, un literal de texto sirve tanto para columnas numéricas como de texto
+    # sin impedir el uso de índices (un número contra una columna de texto sí lo impediría).
+    return sql.replace("%s", "'0'")
+
+
+def revisar(cursor, consultas=None):
+    """
+    Ejecuta EXPLAIN sobre cada consulta.
+    Devuelve una lista de dicts con archivo, linea, estado ('ok', 'exenta', 'error', 'omitida') y detalle.
+    Una consulta omitida (EXPLAIN no pudo analizarla) cuenta como fallo: no se sabe qué plan tendría.
+    """
+    if consultas is None:
+        consultas = consultas_literales() + consultas_dinamicas()
+
+    resultados = []
+    for archivo, linea, sql in consultas:
+        texto = " ".join(sql.split())
+        if texto in EXENCIONES:
+            resultados.append({"archivo": archivo, "linea": linea, "estado": "exenta",
+                               "detalle": EXENCIONES[texto], "sql": texto})
+            continue
+        try:
+            cursor.execute("EXPLAIN " + _sustituir_parametros(sql.strip().rstrip(";")))
+            columnas = [c[0] for c in cursor.description]
+            filas = [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+        except Exception as e:
+            resultados.append({"archivo": archivo, "linea": linea, "estado": "omitida",
+                               "detalle": f"no se pudo analizar: {e}", "sql": texto})
+            continue
+
+        estado, detalles = "ok", []
+        for fila in filas:
+            tabla = fila.get("table") or ""
+            if fila.get("type") != "ALL" or tabla.startswith("<") or tabla in TABLAS_PEQUENAS:
+                continue
+            # También si hay un índice posible y el optimizador prefirió no usarlo
+            estado = "error"
+            indices = fila.get("possible_keys")
+            detalles.append(f"recorrido completo de '{tabla}'"
+                            + (f" (índices posibles: {indices})" if indices else " sin índice utilizable"))
+        resultados.append({"archivo": archivo, "linea": linea, "estado": estado,
+                           "detalle": "; ".join(detalles), "sql": texto})
+    return resultados
@@ -0,0 +1,79 @@
+# backend/migrar.py
+# Uso:
+#   python migrar.py estado               -> lista migraciones aplicadas y pendientes
+#   python migrar.py aplicar              -> aplica las migraciones pendientes
+#   python migrar.py aplicar 0005         -> aplica una migración concreta (también las opcionales)
+#   python migrar.py verificar            -> EXPLAIN de las consultas; falla si alguna recorre una tabla completa
+import sys
+
+import database
+import migraciones
+from migraciones import planes
+
+
+USO = "Uso: python migrar.py [estado | aplicar [version] | verificar]"
+
+
+def estado(cursor):
+    hechas = migraciones.aplicadas(cursor)
+    for version, nombre, modulo in migraciones.disponibles():
+        marca = "aplicada " if version in hechas else ("opcional " if getattr(modulo, "OPCIONAL", False) else "pendiente")
+        print(f"  {version:04d}  {marca}  {nombre}: {modulo.DESCRIPCION}")
+    return 0
+
+
+def aplicar(cursor, version=None):
+    if version is None:
+        lista = migraciones.pendientes(cursor)
+    else:
+        lista = [m for m in migraciones.disponibles() if m[0] == int(version)]
+        if not lista:
+            print(f"No existe la migración {version}")
+            return 1
+        if lista[0][0] in migraciones.aplicadas(cursor):
+            print(f"La migración {version} ya está aplicada")
+            return 0
+
+    if not lista:
+        print("No hay migraciones pendientes.")
+        return 0
+    for version, nombre, modulo in lista:
+        print(f"Aplicando {version:04d} {nombre}...")
+        migraciones.aplicar(cursor, version, nombre, modulo)
+    print("Migraciones aplicadas.")
+    return 0
+
+
+def verificar(cursor):
+    resultados = planes.revisar(cursor)
+    errores = 0
+    for r in resultados:
+        if r["estado"] == "ok":
+            continue
+        print(f"[{r['estado'].upper()}] {r['archivo']}:{r['linea']} {r['detalle']}")
+        print(f"    {r['sql'][:160]}")
+        errores += r["estado"] != "exenta"
+    total = len(resultados)
+    print(f"{total} consultas revisadas, {errores} con recorrido completo de tabla o sin analizar.")
+    return 1 if errores else 0
+
+
+def main(argv):
+    if len(argv) < 2 or argv[1] not in ("estado", "aplicar", "verificar"):
+        print(USO)
+        return 2
+
+    with database.conexion() as conn:
+        cursor = conn.cursor(buffered=True)
+        try:
+            if argv[1] == "estado":
+                return estado(cursor)
+            if argv[1] == "aplicar":
+                return aplicar(cursor, argv[2] if len(argv) > 2 else None)
+            return verificar(cursor)
+        finally:
+            cursor.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
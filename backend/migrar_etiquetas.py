@@ -0,0 +1,81 @@
+# backend/migrar_etiquetas.py
+# Pasa las etiquetas de un almacén a otro (por defecto, del directorio plano
+# codigos/ al almacén configurado en ETIQUETAS_ALMACEN):
+#   python migrar_etiquetas.py                      -> copia plano -> configurado
+#   python migrar_etiquetas.py --borrar             -> además borra los archivos de origen ya copiados
+#   python migrar_etiquetas.py --destino sqlite --ruta-destino codigos.sqlite3
+# Se puede repetir sin riesgo: lo que ya está en el destino no se vuelve a copiar.
+import argparse
+import os
+import sys
+import time
+
+import almacen_etiquetas
+
+LOTE = 500
+
+
+def migrar(origen, destino, borrar=False):
+    copiadas = existentes = 0
+    inicio = time.perf_counter()
+    pendientes = []
+
+    def _volcar():
+        if hasattr(destino, "guardar_lote"):
+            destino.guardar_lote(pendientes)
+        else:
+            for codigo, formato, datos in pendientes:
+                destino.guardar(codigo, formato, datos)
+        if borrar:
+            for codigo, formato, _ in pendientes:
+                os.remove(origen.ruta(codigo, formato))
+        pendientes.clear()
+
+    # Se listan antes de copiar: con destino fragmentado en el mismo directorio,
+    # los archivos nuevos no deben volver a aparecer en el recorrido
+    for codigo, formato in list(origen.etiquetas()):
+        if destino.existe(codigo, formato):
+            existentes += 1
+        else:
+            datos = origen.leer(codigo, formato)
+            if datos is None:
+                continue
+            pendientes.append((codigo, formato, datos))
+            copiadas += 1
+            if len(pendientes) >= LOTE:
+                _volcar()
+                print(f"  {copiadas} etiquetas copiadas...")
+            continue
+        if borrar:
+            os.remove(origen.ruta(codigo, formato))
+    if pendientes:
+        _volcar()
+
+    print(f"{copiadas} etiquetas copiadas, {existentes} ya estaban en el destino "
+          f"({time.perf_counter() - inicio:.1f} s).")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migra las imágenes de etiquetas entre almacenes.")
+    parser.add_argument("--origen", default="plano", choices=almacen_etiquetas.TIPOS)
+    parser.add_argument("--ruta-origen")
+    parser.add_argument("--destino", choices=almacen_etiquetas.TIPOS,
+                        help="por defecto ETIQUETAS_ALMACEN (fragmentado)")
+    parser.add_argument("--ruta-destino")
+    parser.add_argument("--borrar", action="store_true", help="borra del origen lo que ya está en el destino")
+    args = parser.parse_args(argv)
+
+    origen = almacen_etiquetas.crear(args.origen, args.ruta_origen)
+    destino = almacen_etiquetas.crear(args.destino, args.ruta_destino)
+    if args.borrar and isinstance(origen, almacen_etiquetas.AlmacenSQLite):
+        print("--borrar solo se admite con un origen en directorio")
+        return 2
+    if type(origen) is type(destino) and os.path.abspath(origen.ubicacion) == os.path.abspath(destino.ubicacion):
+        print("El origen y el destino son el mismo almacén")
+        return 2
+    return migrar(origen, destino, args.borrar)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
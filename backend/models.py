@@ -1,114 +1,1039 @@
-
-from database import get_db_connection
+from database import cursor_de, UnidadDeTrabajo
+import metricas
+import referencias
 import uuid
+import base64
+import unicodedata
+from datetime import datetime, timedelta
+
+# Todas las funciones aceptan una unidad de trabajo opcional (uow). Si se pasa,
+# usan su conexión y su transacción; si no, usan una conexión propia del pool.
+
+def producto_existe(codigo_original, uow=None):
+    with cursor_de(uow, dictionary=True) as cursor:
+        cursor.execute("SELECT * FROM producto WHERE codigo_original = %s", (codigo_original,))
+        return cursor.fetchone()
 
-def producto_existe(codigo_original):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM producto WHERE codigo_original = %s", (codigo_original,))
-    producto = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    return producto
-
-def crear_producto(codigo_original, nombre, descripcion, id_dron):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO producto (codigo_original, nombre, descripcion, id_dron)
-        VALUES (%s, %s, %s, %s)
-    """, (codigo_original, nombre, descripcion, id_dron))
-    conn.commit()
-    id_producto = cursor.lastrowid
-    cursor.close()
-    conn.close()
-    return id_producto
-
-def pieza_existe_por_serie(numero_serie):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM pieza WHERE numero_serie = %s", (numero_serie,))
-    pieza = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    return pieza
+def crear_producto(codigo_original, nombre, descripcion, id_dron, uow=None):
+    with cursor_de(uow) as cursor:
+        cursor.execute("""
+            INSERT INTO producto (codigo_original, nombre, descripcion, id_dron)
+            VALUES (%s, %s, %s, %s)
+        """, (codigo_original, nombre, descripcion, id_dron))
+        return cursor.lastrowid
+
+def pieza_existe_por_serie(numero_serie, uow=None):
+    with cursor_de(uow, dictionary=True) as cursor:
+        cursor.execute("SELECT * FROM pieza WHERE numero_serie = %s", (numero_serie,))
+        return cursor.fetchone()
 
 
 # Nuevas funciones
-def pieza_existe_por_codigo_barras(codigo_barras):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT id_pieza FROM pieza WHERE codigo_barras = %s", (codigo_barras,))
-    pieza = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    return pieza is not None
-
-def obtener_pieza_por_codigo(codigo_barras):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT p.id_pieza, p.numero_serie, p.estado, p.caja, pr.nombre AS nombre_producto
-        FROM pieza p
-        JOIN producto pr ON p.id_producto = pr.id_producto
-        WHERE p.codigo_barras = %s
-    """, (codigo_barras,))
-    pieza = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    return pieza
-
-def obtener_pieza_por_serie(numero_serie):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT p.id_pieza, p.numero_serie, p.estado, p.caja, pr.nombre AS nombre_producto
-        FROM pieza p
-        JOIN producto pr ON p.id_producto = pr.id_producto
-        WHERE p.numero_serie = %s
-    """, (numero_serie,))
-    pieza = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    return pieza
-
-
-def crear_pieza(id_producto, numero_serie, id_usuario, caja):
-
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    codigo_otech = f"OTech-{uuid.uuid4().hex[:8].upper()}-{numero_serie[:8]}"
-    
-    cursor.execute("""
-        INSERT INTO pieza (id_producto, numero_serie, codigo_barras, estado, id_usuario, caja)
-        VALUES (%s, %s, %s, 'disponible', %s, %s)  -- ← 'disponible', no 'nuevo'
-    """, (id_producto, numero_serie, codigo_otech, id_usuario, caja))
-    
-    conn.commit()
-    id_pieza = cursor.lastrowid
-    cursor.close()
-    conn.close()
-    
+def pieza_existe_por_codigo_barras(codigo_barras, uow=None):
+    with cursor_de(uow, dictionary=True) as cursor:
+        cursor.execute("SELECT id_pieza FROM pieza WHERE codigo_barras = %s", (codigo_barras,))
+        return cursor.fetchone() is not None
+
+def obtener_pieza_por_codigo(codigo_barras, uow=None):
+    with cursor_de(uow, dictionary=True) as cursor:
+        cursor.execute("""
+            SELECT p.id_pieza, p.numero_serie, p.estado, p.caja, pr.nombre AS nombre_producto
+            FROM pieza p
+            JOIN producto pr ON p.id_producto = pr.id_producto
+            WHERE p.codigo_barras = %s
+        """, (codigo_barras,))
+        return cursor.fetchone()
+
+def obtener_pieza_por_serie(numero_serie, uow=None):
+    with cursor_de(uow, dictionary=True) as cursor:
+        cursor.execute("""
+            SELECT p.id_pieza, p.numero_serie, p.estado, p.caja, pr.nombre AS nombre_producto
+            FROM pieza p
+            JOIN producto pr ON p.id_producto = pr.id_producto
+            WHERE p.numero_serie = %s
+        """, (numero_serie,))
+        return cursor.fetchone()
+
+
+def generar_codigo_otech(numero_serie):
+    # Code128 solo imprime ASCII: los acentos del número de serie se quitan
+    sufijo = unicodedata.normalize("NFKD", numero_serie[:8]).encode("ascii", "ignore").decode()
+    sufijo = "".join(c for c in sufijo if " " <= c <= "~")
+    return f"OTech-{uuid.uuid4().hex[:8].upper()}-{sufijo}"
+
+
+def crear_pieza(id_producto, numero_serie, id_usuario, caja, uow=None):
+    codigo_otech = generar_codigo_otech(numero_serie)
+    with cursor_de(uow) as cursor:
+        cursor.execute("""
+            INSERT INTO pieza (id_producto, numero_serie, codigo_barras, estado, id_usuario, caja)
+            VALUES (%s, %s, %s, 'disponible', %s, %s)  -- ← 'disponible', no 'nuevo'
+        """, (id_producto, numero_serie, codigo_otech, id_usuario, caja))
+        id_pieza = cursor.lastrowid
+
+    ajustar_stock({(id_producto, 'disponible'): 1}, uow)
+
     return {"id_pieza": id_pieza, "codigo_otech": codigo_otech}
 
-def registrar_movimiento(id_pieza, tipo_movimiento, id_usuario, observaciones=""):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO movimiento (id_pieza, tipo_movimiento, estado_anterior, estado_nuevo, id_usuario, observaciones)
-        VALUES (%s, %s, NULL, NULL, %s, %s)
-    """, (id_pieza, tipo_movimiento, id_usuario, observaciones))
-    conn.commit()
-    cursor.close()
-    conn.close()
+def registrar_movimiento(id_pieza, tipo_movimiento, id_usuario, observaciones="",
+                         estado_anterior=None, estado_nuevo=None, uow=None):
+    with cursor_de(uow) as cursor:
+        cursor.execute("""
+            INSERT INTO movimiento (id_pieza, tipo_movimiento, estado_anterior, estado_nuevo, id_usuario, observaciones)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, (id_pieza, tipo_movimiento, estado_anterior, estado_nuevo, id_usuario, observaciones))
 
 
 
 # Nueva función para actualizar estado
-def actualizar_estado_pieza_db(id_pieza, nuevo_estado):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE pieza SET estado = %s WHERE id_pieza = %s", (nuevo_estado, id_pieza))
-    conn.commit()
-    cursor.close()
-    conn.close()
\ No newline at end of file
+def actualizar_estado_pieza_db(id_pieza, nuevo_estado, uow=None):
+    with cursor_de(uow) as cursor:
+        cursor.execute("UPDATE pieza SET estado = %s WHERE id_pieza = %s", (nuevo_estado, id_pieza))
+
+def obtener_estado_pieza(id_pieza, uow=None, bloquear=False):
+    """Devuelve el estado actual de la pieza o None si no existe.
+    Con bloquear=True la fila queda bloqueada hasta el final de la transacción."""
+    sql = "SELECT estado FROM pieza WHERE id_pieza = %s"
+    if bloquear:
+        sql += " FOR UPDATE"
+    with cursor_de(uow) as cursor:
+        cursor.execute(sql, (id_pieza,))
+        fila = cursor.fetchone()
+    return fila[0] if fila else None
+
+def obtener_pieza_para_cambio(id_pieza, uow=None):
+    """Estado e id_producto de la pieza, con la fila bloqueada hasta el final de la transacción."""
+    with cursor_de(uow, dictionary=True) as cursor:
+        cursor.execute("SELECT estado, id_producto FROM pieza WHERE id_pieza = %s FOR UPDATE", (id_pieza,))
+        return cursor.fetchone()
+
+def obtener_rol_usuario(id_usuario, uow=None):
+    with cursor_de(uow) as cursor:
+        cursor.execute("SELECT rol FROM usuario WHERE id_usuario = %s", (id_usuario,))
+        fila = cursor.fetchone()
+    return fila[0] if fila else None
+
+
+# --- Inventario: filtros y paginación por cursor ---
+
+COLUMNAS_INVENTARIO = """
+    p.id_pieza,
+    p.codigo_barras,
+    p.numero_serie,
+    p.estado,
+    p.caja,
+    p.fecha_registro,
+    pr.nombre AS nombre_producto,
+    d.nombre AS nombre_dron,
+    COALESCE(u.nombre_usuario, 'Usuario eliminado') AS nombre_usuario
+"""
+
+JOINS_INVENTARIO = """
+    FROM pieza p
+    LEFT JOIN producto pr ON p.id_producto = pr.id_producto
+    LEFT JOIN dron d ON pr.id_dron = d.id
+    LEFT JOIN usuario u ON p.id_usuario = u.id_usuario
+"""
+
+# Listado principal: los nombres se completan desde referencias (memoria), sin JOIN
+COLUMNAS_INVENTARIO_IDS = """
+    p.id_pieza,
+    p.codigo_barras,
+    p.numero_serie,
+    p.estado,
+    p.caja,
+    p.fecha_registro,
+    p.id_producto,
+    p.id_usuario
+"""
+
+
+def _escapar_like(texto):
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def filtros_inventario(estado=None, id_producto=None, id_dron=None, caja=None,
+                       desde=None, hasta=None, serie=None, sin_salida=False):
+    """Devuelve (condiciones, parámetros) para filtrar piezas del inventario."""
+    condiciones = []
+    params = []
+    if estado:
+        condiciones.append("p.estado = %s")
+        params.append(estado)
+    elif sin_salida:
+        condiciones.append("p.estado <> 'salida'")
+    if id_producto is not None:
+        condiciones.append("p.id_producto = %s")
+        params.append(id_producto)
+    if id_dron is not None:
+        condiciones.append("pr.id_dron = %s")
+        params.append(id_dron)
+    if caja:
+        condiciones.append("p.caja = %s")
+        params.append(caja)
+    if desde:
+        condiciones.append("p.fecha_registro >= %s")
+        params.append(desde)
+    if hasta:
+        # 'hasta' es inclusivo: se compara contra el inicio del día siguiente
+        condiciones.append("p.fecha_registro < %s")
+        params.append(hasta + timedelta(days=1))
+    if serie:
+        condiciones.append("p.numero_serie LIKE %s")
+        params.append(_escapar_like(serie) + "%")
+    return condiciones, params
+
+
+def codificar_cursor_inventario(fecha_registro, id_pieza):
+    valor = f"{fecha_registro.isoformat()}|{id_pieza}"
+    return base64.urlsafe_b64encode(valor.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor_inventario(cursor_texto):
+    """Devuelve (fecha_registro, id_pieza) o lanza ValueError si el cursor no es válido."""
+    relleno = "=" * (-len(cursor_texto) % 4)
+    try:
+        fecha, id_pieza = base64.urlsafe_b64decode(cursor_texto + relleno).decode().split("|")
+        return datetime.fromisoformat(fecha), int(id_pieza)
+    except Exception:
+        raise ValueError("Cursor de paginación no válido")
+
+
+def consulta_inventario(filtros=None, limite=None, cursor_pagina=None):
+    """Arma el SELECT del inventario; devuelve (sql, parámetros)."""
+    condiciones, params = filtros_inventario(**(filtros or {}))
+    if cursor_pagina:
+        fecha, id_pieza = cursor_pagina
+        condiciones.append(
+            "(p.fecha_registro < %s OR (p.fecha_registro = %s AND p.id_pieza < %s))"
+        )
+        params.extend([fecha, fecha, id_pieza])
+
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    # El JOIN con producto solo hace falta para filtrar por dron
+    join = "JOIN producto pr ON p.id_producto = pr.id_producto" if filtros and filtros.get("id_dron") is not None else ""
+    sql = f"SELECT {COLUMNAS_INVENTARIO_IDS} FROM pieza p {join} {where} ORDER BY p.fecha_registro DESC, p.id_pieza DESC"
+    if limite:
+        # Se pide una fila de más para saber si hay página siguiente
+        sql += " LIMIT %s"
+        params.append(limite + 1)
+    return sql, params
+
+
+def consulta_total_inventario(filtros=None):
+    """Arma el COUNT del inventario filtrado; devuelve (sql, parámetros)."""
+    condiciones, params = filtros_inventario(**(filtros or {}))
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    # El JOIN con producto solo hace falta para filtrar por dron
+    join = "JOIN producto pr ON p.id_producto = pr.id_producto" if filtros and filtros.get("id_dron") is not None else ""
+    return f"SELECT COUNT(*) AS total FROM pieza p {join} {where}", params
+
+
+def obtener_inventario_db(filtros=None, limite=None, cursor_pagina=None, contar=False):
+    """
+    Consulta el inventario con filtros opcionales.
+    Sin 'limite' devuelve todas las filas; con 'limite' devuelve una página
+    ordenada por (fecha_registro, id_pieza) descendente y el cursor siguiente.
+    """
+    total = None
+    with cursor_de(dictionary=True) as cursor:
+        if contar:
+            cursor.execute(*consulta_total_inventario(filtros))
+            total = cursor.fetchone()["total"]
+
+        cursor.execute(*consulta_inventario(filtros, limite, cursor_pagina))
+        piezas = cursor.fetchall()
+
+    siguiente = None
+    if limite and len(piezas) > limite:
+        piezas = piezas[:limite]
+        ultima = piezas[-1]
+        siguiente = codificar_cursor_inventario(ultima["fecha_registro"], ultima["id_pieza"])
+
+    referencias.completar_inventario(piezas)
+    return {"piezas": piezas, "siguiente_cursor": siguiente, "total": total}
+
+
+def filas_inventario_por_id(ids_pieza, uow=None):
+    """
+    Filas del inventario (mismas columnas que /inventario) para las piezas indicadas.
+    Usa los JOIN en vez de referencias: dentro de una transacción puede haber
+    productos recién creados que la copia en memoria todavía no ve.
+    """
+    filas = []
+    ids_pieza = list(ids_pieza)
+    with cursor_de(uow, dictionary=True) as cursor:
+        for i in range(0, len(ids_pieza), TAMANO_LOTE_INSERT):
+            trozo = ids_pieza[i:i + TAMANO_LOTE_INSERT]
+            cursor.execute(
+                f"SELECT {COLUMNAS_INVENTARIO} {JOINS_INVENTARIO} WHERE p.id_pieza IN ({', '.join(['%s'] * len(trozo))})",
+                trozo
+            )
+            filas.extend(cursor.fetchall())
+    return filas
+
+
+# --- Búsqueda por fragmentos (índice ngram de la migración 0006) ---
+
+# Con menos caracteres que un n-grama solo se buscan prefijos
+MINIMO_NGRAM = 3
+
+SQL_BUSCAR_PIEZAS = f"""
+    SELECT {COLUMNAS_INVENTARIO_IDS},
+           CASE WHEN p.numero_serie = %s OR p.codigo_barras = %s THEN 0
+                WHEN p.numero_serie LIKE %s OR p.codigo_barras LIKE %s THEN 1
+                ELSE 2 END AS rango,
+           MATCH (p.numero_serie, p.codigo_barras) AGAINST (%s IN BOOLEAN MODE) AS relevancia
+    FROM pieza p
+    WHERE MATCH (p.numero_serie, p.codigo_barras) AGAINST (%s IN BOOLEAN MODE)
+"""
+
+# Piezas de productos cuyo nombre coincide (van detrás de las de serie o código)
+SQL_BUSCAR_PIEZAS_PRODUCTO = f"""
+    SELECT {COLUMNAS_INVENTARIO_IDS}, 3 AS rango, 0 AS relevancia
+    FROM pieza p
+    WHERE p.id_producto IN ({{marcadores}})
+      AND NOT MATCH (p.numero_serie, p.codigo_barras) AGAINST (%s IN BOOLEAN MODE)
+"""
+
+SQL_BUSCAR_PIEZAS_PREFIJO = f"""
+    (SELECT {COLUMNAS_INVENTARIO_IDS}, 0 AS rango, 0 AS relevancia FROM pieza p WHERE p.numero_serie LIKE %s)
+    UNION
+    (SELECT {COLUMNAS_INVENTARIO_IDS}, 0 AS rango, 0 AS relevancia FROM pieza p WHERE p.codigo_barras LIKE %s)
+"""
+
+
+def consulta_buscar_piezas(texto, limite, desplazamiento=0):
+    """Arma la búsqueda ordenada por relevancia; devuelve (sql, parámetros)."""
+    prefijo = _escapar_like(texto) + "%"
+    if len(texto) < MINIMO_NGRAM:
+        sql, params = SQL_BUSCAR_PIEZAS_PREFIJO, [prefijo, prefijo]
+    else:
+        # Frase entre comillas: los n-gramas deben aparecer seguidos (= subcadena)
+        frase = '"' + texto.replace('"', " ") + '"'
+        sql = SQL_BUSCAR_PIEZAS
+        params = [texto, texto, prefijo, prefijo, frase, frase]
+        ids_producto = referencias.productos_por_nombre(texto)
+        if ids_producto:
+            sql = f"({sql}) UNION ALL ({SQL_BUSCAR_PIEZAS_PRODUCTO.format(marcadores=', '.join(['%s'] * len(ids_producto)))})"
+            params += ids_producto + [frase]
+    sql += " ORDER BY rango, relevancia DESC, id_pieza DESC LIMIT %s OFFSET %s"
+    # Una fila de más para saber si hay página siguiente
+    return sql, params + [limite + 1, desplazamiento]
+
+
+def buscar_piezas_db(texto, limite, desplazamiento=0):
+    texto = texto.strip()
+    # Antes de tomar la conexión: si hay que recargar los productos, referencias
+    # usa otra del pool y no conviene retener dos a la vez en el mismo hilo
+    consulta = consulta_buscar_piezas(texto, limite, desplazamiento)
+    with cursor_de(dictionary=True) as cursor:
+        cursor.execute(*consulta)
+        piezas = cursor.fetchall()
+
+    hay_mas = len(piezas) > limite
+    piezas = piezas[:limite]
+    for pieza in piezas:
+        del pieza["rango"], pieza["relevancia"]
+    referencias.completar_inventario(piezas)
+    return {"piezas": piezas, "hay_mas": hay_mas}
+
+
+# --- Historial de movimientos ---
+
+COLUMNAS_MOVIMIENTO = """
+    m.id_movimiento,
+    m.id_pieza,
+    p.numero_serie,
+    p.codigo_barras,
+    m.tipo_movimiento,
+    m.estado_anterior,
+    m.estado_nuevo,
+    m.caja_anterior,
+    m.caja_nueva,
+    m.id_usuario,
+    u.nombre_usuario,
+    m.observaciones,
+    m.fecha_movimiento
+"""
+
+TABLAS_MOVIMIENTO = {False: "movimiento", True: "movimiento_archivo"}
+
+
+def consulta_movimientos(id_pieza=None, id_usuario=None, desde=None, hasta=None,
+                         limite=100, cursor_pagina=None, archivo=False):
+    """
+    Arma el SELECT del historial; devuelve (sql, parámetros).
+    Orden (fecha_movimiento, id_movimiento) descendente: cada filtro tiene un
+    índice que empieza por su columna y sigue con esas dos, y el rango de
+    fechas permite descartar particiones si la tabla está particionada.
+    """
+    condiciones, params = [], []
+    if id_pieza is not None:
+        condiciones.append("m.id_pieza = %s")
+        params.append(id_pieza)
+    if id_usuario is not None:
+        condiciones.append("m.id_usuario = %s")
+        params.append(id_usuario)
+    if desde:
+        condiciones.append("m.fecha_movimiento >= %s")
+        params.append(desde)
+    if hasta:
+        condiciones.append("m.fecha_movimiento < %s")
+        params.append(hasta + timedelta(days=1))
+    if cursor_pagina:
+        fecha, id_movimiento = cursor_pagina
+        condiciones.append(
+            "(m.fecha_movimiento < %s OR (m.fecha_movimiento = %s AND m.id_movimiento < %s))"
+        )
+        params.extend([fecha, fecha, id_movimiento])
+
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    sql = f"""
+        SELECT {COLUMNAS_MOVIMIENTO}
+        FROM {TABLAS_MOVIMIENTO[bool(archivo)]} m
+        LEFT JOIN pieza p ON m.id_pieza = p.id_pieza
+        LEFT JOIN usuario u ON m.id_usuario = u.id_usuario
+        {where}
+        ORDER BY m.fecha_movimiento DESC, m.id_movimiento DESC
+        LIMIT %s
+    """
+    params.append(limite + 1)
+    return sql, params
+
+
+def obtener_movimientos_db(limite=100, cursor_pagina=None, **filtros):
+    """Página del historial y cursor de la siguiente (mismo formato que el del inventario)."""
+    with cursor_de(dictionary=True) as cursor:
+        cursor.execute(*consulta_movimientos(limite=limite, cursor_pagina=cursor_pagina, **filtros))
+        movimientos = cursor.fetchall()
+
+    siguiente = None
+    if len(movimientos) > limite:
+        movimientos = movimientos[:limite]
+        ultimo = movimientos[-1]
+        siguiente = codificar_cursor_inventario(ultimo["fecha_movimiento"], ultimo["id_movimiento"])
+    return {"movimientos": movimientos, "siguiente_cursor": siguiente}
+
+
+# --- Historia del stock (fotos diarias de instantaneas.py) ---
+
+AGRUPACIONES_STOCK = {"producto": "id_producto", "estado": "estado", "caja": "caja"}
+
+
+def consulta_serie_stock(desde, hasta, agrupar=(), id_producto=None, estado=None, caja=None):
+    """Arma la serie diaria de unidades; devuelve (sql, parámetros)."""
+    columnas = [AGRUPACIONES_STOCK[g] for g in agrupar]
+    condiciones = ["fecha >= %s", "fecha <= %s"]
+    params = [desde, hasta]
+    for columna, valor in (("id_producto", id_producto), ("estado", estado), ("caja", caja)):
+        if valor is not None:
+            condiciones.append(f"{columna} = %s")
+            params.append(valor)
+    grupo = ", ".join(["fecha"] + columnas)
+    return (
+        f"SELECT {grupo}, SUM(cantidad) AS cantidad FROM inventario_diario "
+        f"WHERE {' AND '.join(condiciones)} GROUP BY {grupo} ORDER BY {grupo}",
+        params
+    )
+
+
+def serie_stock_db(desde, hasta, agrupar=(), **filtros):
+    with cursor_de(dictionary=True) as cursor:
+        cursor.execute(*consulta_serie_stock(desde, hasta, agrupar, **filtros))
+        serie = cursor.fetchall()
+        # Días sin foto todavía (el último suele ser hoy, que aún no se ha cerrado)
+        cursor.execute("SELECT MIN(fecha) AS primero, MAX(fecha) AS ultimo FROM inventario_diario_dias")
+        dias = cursor.fetchone()
+    for fila in serie:
+        fila["cantidad"] = int(fila["cantidad"])
+    return {"serie": serie, "disponible_desde": dias["primero"], "disponible_hasta": dias["ultimo"]}
+
+
+# --- Resolución de códigos escaneados ---
+
+# Una sola consulta: prioridad 1 = codigo_barras, 2 = numero_serie, 3 = codigo_original
+SQL_BUSCAR_CODIGO = """
+    (SELECT 1 AS prioridad, 'codigo_barras' AS coincidencia,
+            p.id_pieza, p.numero_serie, p.estado, p.caja, pr.nombre AS nombre_producto,
+            NULL AS id_producto, NULL AS codigo_original, NULL AS nombre, NULL AS descripcion, NULL AS id_dron
+     FROM pieza p
+     JOIN producto pr ON p.id_producto = pr.id_producto
+     WHERE p.codigo_barras = %s
+     LIMIT 1)
+    UNION ALL
+    (SELECT 2, 'numero_serie',
+            p.id_pieza, p.numero_serie, p.estado, p.caja, pr.nombre,
+            NULL, NULL, NULL, NULL, NULL
+     FROM pieza p
+     JOIN producto pr ON p.id_producto = pr.id_producto
+     WHERE p.numero_serie = %s
+     LIMIT 1)
+    UNION ALL
+    (SELECT 3, 'codigo_original',
+            NULL, NULL, NULL, NULL, NULL,
+            id_producto, codigo_original, nombre, descripcion, id_dron
+     FROM producto
+     WHERE codigo_original = %s
+     LIMIT 1)
+    ORDER BY prioridad
+    LIMIT 1
+"""
+
+CAMPOS_PIEZA = ("id_pieza", "numero_serie", "estado", "caja", "nombre_producto")
+CAMPOS_PRODUCTO = ("id_producto", "codigo_original", "nombre", "descripcion", "id_dron")
+
+
+def formatear_resultado_codigo(codigo, fila):
+    """Convierte la fila de SQL_BUSCAR_CODIGO en la respuesta de /buscar_codigo."""
+    if fila is None:
+        return {"tipo": "nuevo_producto", "coincidencia": None, "codigo_original": codigo}
+    if fila["coincidencia"] == "codigo_original":
+        return {
+            "tipo": "producto",
+            "coincidencia": fila["coincidencia"],
+            "producto": {campo: fila[campo] for campo in CAMPOS_PRODUCTO},
+        }
+    return {
+        "tipo": "pieza",
+        "coincidencia": fila["coincidencia"],
+        "pieza": {campo: fila[campo] for campo in CAMPOS_PIEZA},
+    }
+
+
+def buscar_codigo_db(codigo, uow=None):
+    with cursor_de(uow, dictionary=True) as cursor:
+        cursor.execute(SQL_BUSCAR_CODIGO, (codigo, codigo, codigo))
+        fila = cursor.fetchone()
+    return formatear_resultado_codigo(codigo, fila)
+
+
+# Versión por lotes: una consulta por columna y trozo de códigos, con la misma prioridad
+SQL_CODIGOS_PIEZA = """
+    SELECT p.{columna} AS codigo, p.id_pieza, p.numero_serie, p.estado, p.caja, pr.nombre AS nombre_producto
+    FROM pieza p
+    JOIN producto pr ON p.id_producto = pr.id_producto
+    WHERE p.{columna} IN ({marcadores})
+"""
+SQL_CODIGOS_PRODUCTO = """
+    SELECT codigo_original AS codigo, id_producto, codigo_original, nombre, descripcion, id_dron
+    FROM producto
+    WHERE codigo_original IN ({marcadores})
+"""
+
+
+def buscar_codigos_db(codigos, uow=None):
+    """
+    Resuelve muchos códigos a la vez, con el mismo resultado que buscar_codigo_db
+    para cada uno. Devuelve {codigo: resultado}.
+    """
+    filas = {}
+    pendientes = list(dict.fromkeys(codigos))
+    with cursor_de(uow, dictionary=True) as cursor:
+        for coincidencia, sql in (
+            ("codigo_barras", SQL_CODIGOS_PIEZA.replace("{columna}", "codigo_barras")),
+            ("numero_serie", SQL_CODIGOS_PIEZA.replace("{columna}", "numero_serie")),
+            ("codigo_original", SQL_CODIGOS_PRODUCTO),
+        ):
+            for i in range(0, len(pendientes), TAMANO_LOTE_INSERT):
+                trozo = pendientes[i:i + TAMANO_LOTE_INSERT]
+                cursor.execute(sql.format(marcadores=", ".join(["%s"] * len(trozo))), trozo)
+                for fila in cursor.fetchall():
+                    filas.setdefault(clave_codigo(fila["codigo"]), {**fila, "coincidencia": coincidencia})
+            # Solo se busca en la siguiente columna lo que todavía no apareció
+            pendientes = [codigo for codigo in pendientes if clave_codigo(codigo) not in filas]
+            if not pendientes:
+                break
+    return {
+        codigo: formatear_resultado_codigo(codigo, filas.get(clave_codigo(codigo)))
+        for codigo in dict.fromkeys(codigos)
+    }
+
+
+def clave_codigo(codigo):
+    """
+    Clave con la que la base de datos compara códigos y números de serie
+    (utf8mb4_unicode_ci, migración 0009): sin mayúsculas, sin acentos y sin
+    espacios finales. La fila devuelta puede no ser idéntica al código escaneado.
+    """
+    sin_acentos = "".join(c for c in unicodedata.normalize("NFKD", codigo) if not unicodedata.combining(c))
+    return sin_acentos.casefold().rstrip(" ")
+
+
+# --- Registro de piezas por lote ---
+
+TAMANO_LOTE_INSERT = 500
+
+
+def _marcadores(filas, columnas):
+    fila = "(" + ", ".join(["%s"] * columnas) + ")"
+    return ", ".join([fila] * filas)
+
+
+@metricas.auxiliar
+def _insertar_varias(cursor, sql_insert, filas):
+    """INSERT de varias filas por sentencia (en trozos para no exceder max_allowed_packet)."""
+    for i in range(0, len(filas), TAMANO_LOTE_INSERT):
+        trozo = filas[i:i + TAMANO_LOTE_INSERT]
+        valores = [valor for fila in trozo for valor in fila]
+        cursor.execute(f"{sql_insert} VALUES {_marcadores(len(trozo), len(trozo[0]))}", valores)
+
+
+@metricas.auxiliar
+def series_existentes(cursor, numeros_serie):
+    """Devuelve el conjunto de números de serie que ya están registrados."""
+    existentes = set()
+    numeros_serie = list(numeros_serie)
+    for i in range(0, len(numeros_serie), TAMANO_LOTE_INSERT):
+        trozo = numeros_serie[i:i + TAMANO_LOTE_INSERT]
+        cursor.execute(
+            f"SELECT numero_serie FROM pieza WHERE numero_serie IN ({', '.join(['%s'] * len(trozo))})",
+            trozo
+        )
+        existentes.update(fila[0] for fila in cursor.fetchall())
+    return existentes
+
+
+@metricas.auxiliar
+def codigos_barras_existentes(cursor, codigos_barras):
+    """Devuelve el conjunto de códigos de barras que pertenecen a alguna pieza."""
+    existentes = set()
+    codigos_barras = list(codigos_barras)
+    for i in range(0, len(codigos_barras), TAMANO_LOTE_INSERT):
+        trozo = codigos_barras[i:i + TAMANO_LOTE_INSERT]
+        cursor.execute(
+            f"SELECT codigo_barras FROM pieza WHERE codigo_barras IN ({', '.join(['%s'] * len(trozo))})",
+            trozo
+        )
+        existentes.update(fila[0] for fila in cursor.fetchall())
+    return existentes
+
+
+def codigos_barras_inventario(filtros, limite, uow=None):
+    """Códigos de barras de las piezas filtradas, en orden de registro (hasta 'limite' + 1)."""
+    condiciones, params = filtros_inventario(**filtros)
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    with cursor_de(uow) as cursor:
+        cursor.execute(
+            f"SELECT p.codigo_barras FROM pieza p {where} ORDER BY p.fecha_registro, p.id_pieza LIMIT %s",
+            params + [limite + 1]
+        )
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+def resolver_productos(codigos_originales, nuevos, uow):
+    """
+    Devuelve ({codigo_original: id_producto}, creados) para los códigos indicados,
+    creando los que no existan y aparezcan en 'nuevos' ({codigo: (nombre, descripcion, id_dron)}).
+    Los códigos que no existen y no están en 'nuevos' quedan fuera del resultado.
+    """
+    @metricas.auxiliar
+    def _buscar(cursor, codigos):
+        encontrados = {}
+        for i in range(0, len(codigos), TAMANO_LOTE_INSERT):
+            trozo = codigos[i:i + TAMANO_LOTE_INSERT]
+            cursor.execute(
+                f"SELECT codigo_original, id_producto FROM producto WHERE codigo_original IN ({', '.join(['%s'] * len(trozo))})",
+                trozo
+            )
+            encontrados.update(dict(cursor.fetchall()))
+        return encontrados
+
+    codigos = list(dict.fromkeys(codigos_originales))
+    with cursor_de(uow) as cursor:
+        ids = _buscar(cursor, codigos)
+        crear = [codigo for codigo in codigos if codigo not in ids and codigo in nuevos]
+        if crear:
+            # IGNORE: si otro proceso creó el mismo código a la vez, se usa el suyo
+            _insertar_varias(
+                cursor,
+                "INSERT IGNORE INTO producto (codigo_original, nombre, descripcion, id_dron)",
+                [(codigo, *nuevos[codigo]) for codigo in crear]
+            )
+            ids.update(_buscar(cursor, crear))
+    return ids, [codigo for codigo in crear if codigo in ids]
+
+
+def insertar_piezas(filas, id_usuario, uow):
+    """
+    Inserta piezas nuevas [(id_producto, numero_serie, caja)] con sus movimientos de
+    entrada y actualiza los contadores de stock. Los números de serie deben venir ya
+    validados contra duplicados. Devuelve [{numero_serie, id_pieza, codigo_otech, id_producto}].
+    """
+    if not filas:
+        return []
+    codigos = {numero_serie: generar_codigo_otech(numero_serie) for _, numero_serie, _ in filas}
+    with cursor_de(uow) as cursor:
+        _insertar_varias(
+            cursor,
+            "INSERT INTO pieza (id_producto, numero_serie, codigo_barras, estado, id_usuario, caja)",
+            [(id_producto, numero_serie, codigos[numero_serie], 'disponible', id_usuario, caja)
+             for id_producto, numero_serie, caja in filas]
+        )
+
+        # Los ids se leen por código de barras (único) en vez de suponer ids consecutivos
+        ids = {}
+        lista_codigos = list(codigos.values())
+        for i in range(0, len(lista_codigos), TAMANO_LOTE_INSERT):
+            trozo = lista_codigos[i:i + TAMANO_LOTE_INSERT]
+            cursor.execute(
+                f"SELECT codigo_barras, id_pieza FROM pieza WHERE codigo_barras IN ({', '.join(['%s'] * len(trozo))})",
+                trozo
+            )
+            ids.update(dict(cursor.fetchall()))
+
+        registradas = [
+            {"numero_serie": numero_serie, "id_pieza": ids[codigos[numero_serie]],
+             "codigo_otech": codigos[numero_serie], "id_producto": id_producto}
+            for id_producto, numero_serie, _ in filas
+        ]
+
+        _insertar_varias(
+            cursor,
+            "INSERT INTO movimiento (id_pieza, tipo_movimiento, estado_anterior, estado_nuevo, id_usuario, observaciones)",
+            [(pieza["id_pieza"], "registro_inicial", None, "disponible", id_usuario, "Pieza registrada e ingresada al sistema")
+             for pieza in registradas]
+        )
+
+    cambios = {}
+    for pieza in registradas:
+        clave = (pieza["id_producto"], 'disponible')
+        cambios[clave] = cambios.get(clave, 0) + 1
+    ajustar_stock(cambios, uow)
+    return registradas
+
+
+def registrar_piezas_lote(codigo_original, numeros_serie, caja, id_usuario,
+                          nombre_producto=None, descripcion_producto=None, id_dron=None, uow=None):
+    """
+    Registra varias piezas de un mismo producto en una sola transacción.
+    Devuelve las piezas creadas y los números de serie omitidos por duplicados.
+    Lanza ValueError si el producto no existe y no se indicó su nombre.
+    """
+    if uow is None:
+        with UnidadDeTrabajo() as uow:
+            return registrar_piezas_lote(codigo_original, numeros_serie, caja, id_usuario,
+                                         nombre_producto, descripcion_producto, id_dron, uow=uow)
+
+    # Normalizar y separar los repetidos dentro de la misma petición (con la
+    # misma equivalencia que el índice único: sin distinguir mayúsculas)
+    vistos = set()
+    unicos, repetidas = [], []
+    for numero_serie in numeros_serie:
+        numero_serie = numero_serie.strip()
+        if not numero_serie:
+            continue
+        if clave_codigo(numero_serie) in vistos:
+            repetidas.append(numero_serie)
+        else:
+            vistos.add(clave_codigo(numero_serie))
+            unicos.append(numero_serie)
+
+    with cursor_de(uow) as cursor:
+        # 1. Resolver o crear el producto una sola vez
+        cursor.execute("SELECT id_producto FROM producto WHERE codigo_original = %s", (codigo_original,))
+        fila = cursor.fetchone()
+        producto_creado = False
+        if fila:
+            id_producto = fila[0]
+        else:
+            if not nombre_producto:
+                raise ValueError("Nombre del producto requerido para nuevo producto")
+            cursor.execute("""
+                INSERT INTO producto (codigo_original, nombre, descripcion, id_dron)
+                VALUES (%s, %s, %s, %s)
+            """, (codigo_original, nombre_producto, descripcion_producto, id_dron))
+            id_producto = cursor.lastrowid
+            producto_creado = True
+
+        # 2. Duplicados contra la base de datos en una sola consulta
+        existentes = {clave_codigo(numero_serie) for numero_serie in series_existentes(cursor, unicos)}
+        nuevas = [numero_serie for numero_serie in unicos if clave_codigo(numero_serie) not in existentes]
+        duplicadas = [numero_serie for numero_serie in unicos if clave_codigo(numero_serie) in existentes]
+
+    # 3. Piezas, movimientos de entrada y contadores de stock
+    registradas = insertar_piezas([(id_producto, numero_serie, caja) for numero_serie in nuevas], id_usuario, uow)
+
+    return {
+        "id_producto": id_producto,
+        "producto_creado": producto_creado,
+        "registradas": registradas,
+        "duplicadas": sorted(duplicadas),
+        "repetidas": repetidas,
+    }
+
+
+# --- Cambio de estado de varias piezas ---
+
+def actualizar_estados_lote(ids_pieza, nuevo_estado, id_usuario, observaciones="", uow=None):
+    """
+    Cambia el estado de varias piezas con una lectura, un UPDATE y un INSERT
+    de movimientos por trozo, todo en la misma transacción.
+    Devuelve el resultado de cada pieza en el orden recibido.
+    """
+    if uow is None:
+        with UnidadDeTrabajo() as uow:
+            return actualizar_estados_lote(ids_pieza, nuevo_estado, id_usuario, observaciones, uow)
+
+    ids = list(dict.fromkeys(ids_pieza))
+    actuales = {}
+    with cursor_de(uow) as cursor:
+        # 1. Estados actuales, bloqueando las filas (en orden de id para evitar interbloqueos)
+        ordenados = sorted(ids)
+        for i in range(0, len(ordenados), TAMANO_LOTE_INSERT):
+            trozo = ordenados[i:i + TAMANO_LOTE_INSERT]
+            cursor.execute(
+                f"SELECT id_pieza, estado, id_producto FROM pieza "
+                f"WHERE id_pieza IN ({', '.join(['%s'] * len(trozo))}) ORDER BY id_pieza FOR UPDATE",
+                trozo
+            )
+            actuales.update({id_pieza: (estado, id_producto) for id_pieza, estado, id_producto in cursor.fetchall()})
+
+        a_cambiar = [id_pieza for id_pieza in ids if id_pieza in actuales and actuales[id_pieza][0] != nuevo_estado]
+
+        # 2. Un UPDATE por trozo de ids
+        for i in range(0, len(a_cambiar), TAMANO_LOTE_INSERT):
+            trozo = a_cambiar[i:i + TAMANO_LOTE_INSERT]
+            cursor.execute(
+                f"UPDATE pieza SET estado = %s WHERE id_pieza IN ({', '.join(['%s'] * len(trozo))})",
+                [nuevo_estado] + trozo
+            )
+
+        # 3. Movimientos en INSERT de varias filas
+        if a_cambiar:
+            _insertar_varias(
+                cursor,
+                "INSERT INTO movimiento (id_pieza, tipo_movimiento, estado_anterior, estado_nuevo, id_usuario, observaciones)",
+                [(id_pieza, "cambio_estado", actuales[id_pieza][0], nuevo_estado, id_usuario,
+                  f"Cambio de '{actuales[id_pieza][0]}' a '{nuevo_estado}'. {observaciones}".strip())
+                 for id_pieza in a_cambiar]
+            )
+
+    # 4. Contadores de stock
+    cambios = {}
+    for id_pieza in a_cambiar:
+        estado_anterior, id_producto = actuales[id_pieza]
+        for clave, delta in cambio_de_estado(id_producto, estado_anterior, nuevo_estado).items():
+            cambios[clave] = cambios.get(clave, 0) + delta
+    ajustar_stock(cambios, uow)
+
+    resultados = []
+    for id_pieza in ids:
+        if id_pieza not in actuales:
+            resultados.append({"id_pieza": id_pieza, "resultado": "no_encontrada"})
+        elif actuales[id_pieza][0] == nuevo_estado:
+            resultados.append({"id_pieza": id_pieza, "resultado": "sin_cambios", "estado_anterior": nuevo_estado})
+        else:
+            resultados.append({"id_pieza": id_pieza, "resultado": "actualizada", "estado_anterior": actuales[id_pieza][0]})
+    return resultados
+
+# --- Operaciones por caja (índice idx_pieza_caja_fecha de la migración 0008) ---
+
+# Las piezas que ya salieron conservan su caja como dato histórico: no se
+# cuentan como contenido ni se trasladan con la caja
+SQL_RESUMEN_CAJA = """
+    SELECT estado, COUNT(*) AS piezas
+    FROM pieza
+    WHERE caja = %s AND estado <> 'salida'
+    GROUP BY estado
+"""
+
+
+def consulta_cajas(limite, despues=""):
+    """
+    Cajas en orden alfabético a partir de 'despues' con sus piezas por estado;
+    devuelve (sql, parámetros). Se pide una caja de más para saber si hay página siguiente.
+    """
+    return """
+        SELECT p.caja, p.estado, COUNT(*) AS piezas
+        FROM (
+            SELECT DISTINCT caja FROM pieza
+            WHERE caja > %s AND estado <> 'salida'
+            ORDER BY caja
+            LIMIT %s
+        ) c
+        JOIN pieza p ON p.caja = c.caja
+        WHERE p.estado <> 'salida'
+        GROUP BY p.caja, p.estado
+        ORDER BY p.caja, p.estado
+    """, [despues or "", limite + 1]
+
+
+def _resumen(caja, filas):
+    por_estado = {estado: piezas for estado, piezas in filas}
+    return {"caja": caja, "total": sum(por_estado.values()), "por_estado": por_estado}
+
+
+def listar_cajas_db(limite=100, despues=""):
+    with cursor_de() as cursor:
+        cursor.execute(*consulta_cajas(limite, despues))
+        filas = cursor.fetchall()
+
+    agrupadas = {}
+    for caja, estado, piezas in filas:
+        agrupadas.setdefault(caja, []).append((estado, piezas))
+    cajas = [_resumen(caja, conteos) for caja, conteos in agrupadas.items()]
+
+    siguiente = None
+    if len(cajas) > limite:
+        cajas = cajas[:limite]
+        siguiente = cajas[-1]["caja"]
+    return {"cajas": cajas, "siguiente": siguiente}
+
+
+def resumen_caja_db(caja, uow=None):
+    """Piezas de una caja por estado (sin las que ya salieron)."""
+    with cursor_de(uow) as cursor:
+        cursor.execute(SQL_RESUMEN_CAJA, (caja,))
+        return _resumen(caja, cursor.fetchall())
+
+
+def mover_caja(caja, caja_nueva=None, nuevo_estado=None, id_usuario=None, observaciones="",
+               maximo=None, uow=None):
+    """
+    Traslada a 'caja_nueva' y/o pasa a 'nuevo_estado' todas las piezas de una
+    caja con una lectura, un UPDATE y un INSERT de movimientos de varias filas,
+    todo en la misma transacción. Devuelve (piezas en la caja, piezas cambiadas
+    con su estado anterior). Lanza ValueError si la caja supera 'maximo' piezas.
+    """
+    if uow is None:
+        with UnidadDeTrabajo() as uow:
+            return mover_caja(caja, caja_nueva, nuevo_estado, id_usuario, observaciones, maximo, uow)
+
+    destino = caja_nueva if caja_nueva and caja_nueva != caja else None
+    with cursor_de(uow) as cursor:
+        # 1. Piezas de la caja, bloqueando las filas (y el hueco del índice: nadie
+        #    puede registrar piezas nuevas en la caja mientras se traslada)
+        cursor.execute(
+            "SELECT id_pieza, estado, id_producto FROM pieza "
+            "WHERE caja = %s AND estado <> 'salida' ORDER BY id_pieza FOR UPDATE",
+            (caja,)
+        )
+        piezas = cursor.fetchall()
+        if maximo is not None and len(piezas) > maximo:
+            raise ValueError(f"La caja '{caja}' tiene {len(piezas)} piezas; máximo {maximo} por operación")
+
+        cambiadas = [(id_pieza, estado, id_producto) for id_pieza, estado, id_producto in piezas
+                     if destino or (nuevo_estado and estado != nuevo_estado)]
+        if not cambiadas:
+            return len(piezas), []
+
+        # 2. Un solo UPDATE para toda la caja
+        cursor.execute(
+            "UPDATE pieza SET caja = COALESCE(%s, caja), estado = COALESCE(%s, estado) "
+            "WHERE caja = %s AND estado <> 'salida'",
+            (destino, nuevo_estado, caja)
+        )
+
+        # 3. Movimientos en INSERT de varias filas (uno por trozo de 500)
+        filas = []
+        for id_pieza, estado, _ in cambiadas:
+            estado_nuevo = nuevo_estado or estado
+            detalle = []
+            if destino:
+                detalle.append(f"Traslado de la caja '{caja}' a '{destino}'.")
+            if estado_nuevo != estado:
+                detalle.append(f"Cambio de '{estado}' a '{estado_nuevo}'.")
+            filas.append((
+                id_pieza, "traslado_caja" if destino else "cambio_estado", estado, estado_nuevo,
+                caja if destino else None, destino, id_usuario, " ".join(detalle + [observaciones]).strip()
+            ))
+        _insertar_varias(
+            cursor,
+            "INSERT INTO movimiento (id_pieza, tipo_movimiento, estado_anterior, estado_nuevo, "
+            "caja_anterior, caja_nueva, id_usuario, observaciones)",
+            filas
+        )
+
+    # 4. Contadores de stock
+    if nuevo_estado:
+        cambios = {}
+        for _, estado, id_producto in cambiadas:
+            for clave, delta in cambio_de_estado(id_producto, estado, nuevo_estado).items():
+                cambios[clave] = cambios.get(clave, 0) + delta
+        ajustar_stock(cambios, uow)
+
+    return len(piezas), [{"id_pieza": id_pieza, "estado_anterior": estado} for id_pieza, estado, _ in cambiadas]
+
+# --- Contadores de stock por producto y estado ---
+
+def ajustar_stock(cambios, uow=None):
+    """
+    Aplica variaciones a stock_producto. 'cambios' es {(id_producto, estado): delta}.
+    Debe llamarse dentro de la misma unidad de trabajo que modifica las piezas.
+    """
+    filas = [(id_producto, estado, delta) for (id_producto, estado), delta in sorted(cambios.items()) if delta and estado]
+    if not filas:
+        return
+    with cursor_de(uow) as cursor:
+        # Filas ordenadas por clave para que transacciones concurrentes bloqueen en el mismo orden
+        valores = [valor for fila in filas for valor in fila]
+        cursor.execute(f"""
+            INSERT INTO stock_producto (id_producto, estado, cantidad)
+            VALUES {_marcadores(len(filas), 3)}
+            ON DUPLICATE KEY UPDATE cantidad = cantidad + VALUES(cantidad)
+        """, valores)
+
+
+def cambio_de_estado(id_producto, estado_anterior, estado_nuevo, cantidad=1):
+    """Variaciones de stock para piezas de un producto que pasan de un estado a otro."""
+    cambios = {}
+    if estado_anterior != estado_nuevo:
+        cambios[(id_producto, estado_anterior)] = -cantidad
+        cambios[(id_producto, estado_nuevo)] = cantidad
+    return cambios
+
+
+SQL_ALERTAS_STOCK_BAJO = """
+    SELECT
+        p.id_producto,
+        p.nombre,
+        p.stock_minimo,
+        COALESCE(s.cantidad, 0) AS stock_actual
+    FROM producto p
+    LEFT JOIN stock_producto s ON s.id_producto = p.id_producto AND s.estado = 'disponible'
+    WHERE p.stock_minimo > 0
+      AND COALESCE(s.cantidad, 0) < p.stock_minimo
+"""
+
+
+def alertas_stock_bajo(uow=None):
+    with cursor_de(uow, dictionary=True) as cursor:
+        cursor.execute(SQL_ALERTAS_STOCK_BAJO)
+        return cursor.fetchall()
+
+
+def reconciliar_stock(corregir=False):
+    """
+    Recalcula los contadores desde pieza y devuelve las diferencias encontradas
+    [{id_producto, estado, contador, real}]. Con corregir=True las arregla.
+    Bloquea stock_producto durante el recuento, así que las escrituras de piezas
+    esperan a que termine: conviene ejecutarlo con poco tráfico.
+    """
+    with UnidadDeTrabajo() as uow:
+        with cursor_de(uow) as cursor:
+            # Primero el bloqueo y después el recuento: la foto de REPEATABLE READ se
+            # toma en la primera lectura sin bloqueo, así que el COUNT ve todo lo
+            # confirmado hasta tener los contadores. Toda escritura de pieza ajusta
+            # stock_producto en su misma transacción, de modo que las que lleguen
+            # después quedan esperando y no se cuentan a medias.
+            cursor.execute("SELECT id_producto, estado, cantidad FROM stock_producto FOR UPDATE")
+            contadores = {(id_producto, estado): cantidad for id_producto, estado, cantidad in cursor.fetchall()}
+            cursor.execute("SELECT id_producto, estado, COUNT(*) FROM pieza GROUP BY id_producto, estado")
+            reales = {(id_producto, estado): cantidad for id_producto, estado, cantidad in cursor.fetchall()}
+
+            diferencias = []
+            for clave in sorted(set(reales) | set(contadores)):
+                real = reales.get(clave, 0)
+                contador = contadores.get(clave, 0)
+                if real != contador:
+                    diferencias.append({"id_producto": clave[0], "estado": clave[1], "contador": contador, "real": real})
+
+            if corregir and diferencias:
+                valores = [(d["id_producto"], d["estado"], d["real"]) for d in diferencias]
+                cursor.execute(f"""
+                    INSERT INTO stock_producto (id_producto, estado, cantidad)
+                    VALUES {_marcadores(len(valores), 3)}
+                    ON DUPLICATE KEY UPDATE cantidad = VALUES(cantidad)
+                """, [valor for fila in valores for valor in fila])
+    return diferencias
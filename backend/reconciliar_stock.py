@@ -0,0 +1,32 @@
+# backend/reconciliar_stock.py
+# Uso:
+#   python reconciliar_stock.py              -> informa las diferencias entre stock_producto y pieza
+#   python reconciliar_stock.py --corregir   -> además reescribe los contadores desviados
+import sys
+
+import database
+from models import reconciliar_stock
+
+
+def main(argv):
+    corregir = "--corregir" in argv[1:]
+    database.iniciar_pool()
+    try:
+        diferencias = reconciliar_stock(corregir=corregir)
+    finally:
+        database.cerrar_pool()
+
+    for d in diferencias:
+        print(f"  producto {d['id_producto']:>6}  {d['estado']:<12} contador={d['contador']:<8} real={d['real']}")
+    if not diferencias:
+        print("Los contadores de stock coinciden con las piezas.")
+        return 0
+    if corregir:
+        print(f"{len(diferencias)} contadores corregidos.")
+        return 0
+    print(f"{len(diferencias)} contadores desviados. Ejecute con --corregir para arreglarlos.")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
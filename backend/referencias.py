@@ -0,0 +1,145 @@
+# backend/referencias.py
+# Copia en memoria de las tablas de referencia (drones, productos y usuarios):
+# cambian muy poco y se consultan en casi todas las peticiones. Cada tabla se
+# recarga entera al vencer el TTL o al invalidarla desde los endpoints que la
+# modifican; la versión evita guardar una carga que empezó antes de invalidar.
+import os
+import threading
+import time
+
+from database import cursor_de
+
+TTL = float(os.getenv("REFERENCIAS_TTL", 300))
+# Tiempo mínimo entre recargas forzadas por un id desconocido (p. ej. creado en otro proceso)
+RECARGA_MINIMA = 1.0
+
+
+class TablaReferencia:
+    """Contenido completo de una tabla pequeña, con TTL e invalidación explícita."""
+
+    def __init__(self, nombre, cargar, ttl=TTL):
+        self.nombre = nombre
+        self._cargar = cargar
+        self.ttl = ttl
+        self.version = 0
+        self._datos = None
+        self._cargada_en = 0.0
+        self._carga = threading.Lock()
+        self._lock = threading.Lock()
+
+    def _vigente(self):
+        return self._datos is not None and time.monotonic() - self._cargada_en < self.ttl
+
+    def obtener(self, refrescar=False):
+        """Devuelve los datos; con refrescar=True recarga si la copia tiene más de RECARGA_MINIMA segundos."""
+        if refrescar and time.monotonic() - self._cargada_en < RECARGA_MINIMA:
+            refrescar = False
+        datos = self._datos
+        if datos is not None and self._vigente() and not refrescar:
+            return datos
+
+        # Una sola recarga a la vez; los demás hilos esperan y usan su resultado
+        with self._carga:
+            if self._vigente() and (not refrescar or time.monotonic() - self._cargada_en < RECARGA_MINIMA):
+                return self._datos
+            with self._lock:
+                version = self.version
+            datos = self._cargar()
+            with self._lock:
+                if self.version == version:
+                    self._datos = datos
+                    self._cargada_en = time.monotonic()
+            return datos
+
+    def invalidar(self):
+        with self._lock:
+            self.version += 1
+            self._datos = None
+
+    def estadisticas(self):
+        return {
+            "version": self.version,
+            "cargada": self._datos is not None,
+            "edad_segundos": round(time.monotonic() - self._cargada_en, 1) if self._datos is not None else None,
+        }
+
+
+# --- Cargas ---
+
+def _cargar_drones():
+    with cursor_de(dictionary=True) as cursor:
+        cursor.execute("SELECT id, nombre FROM dron ORDER BY nombre")
+        return {fila["id"]: fila for fila in cursor.fetchall()}
+
+
+def _cargar_productos():
+    with cursor_de(dictionary=True) as cursor:
+        cursor.execute("SELECT id_producto, codigo_original, nombre, descripcion, id_dron, stock_minimo FROM producto")
+        por_id = {fila["id_producto"]: fila for fila in cursor.fetchall()}
+    por_codigo = {fila["codigo_original"]: fila for fila in por_id.values()}
+    return por_id, por_codigo
+
+
+def _cargar_usuarios():
+    with cursor_de(dictionary=True) as cursor:
+        cursor.execute("SELECT id_usuario, nombre_usuario, rol, activo FROM usuario")
+        return {fila["id_usuario"]: fila for fila in cursor.fetchall()}
+
+
+drones = TablaReferencia("drones", _cargar_drones)
+productos = TablaReferencia("productos", _cargar_productos)
+usuarios = TablaReferencia("usuarios", _cargar_usuarios)
+
+
+# --- Consultas ---
+
+def listar_drones():
+    return list(drones.obtener().values())
+
+
+def producto_por_codigo(codigo_original):
+    """Producto con ese código, o None si no está en la copia (puede existir y ser más nuevo)."""
+    return productos.obtener()[1].get(codigo_original)
+
+
+def productos_por_nombre(texto):
+    """Ids de los productos cuyo nombre contiene el texto (sin distinguir mayúsculas)."""
+    texto = texto.casefold()
+    return [id_producto for id_producto, producto in productos.obtener()[0].items()
+            if texto in (producto["nombre"] or "").casefold()]
+
+
+def rol_usuario(id_usuario):
+    """Rol del usuario, o None si no está en la copia."""
+    usuario = usuarios.obtener().get(id_usuario)
+    if usuario is None:
+        usuario = usuarios.obtener(refrescar=True).get(id_usuario)
+    return usuario["rol"] if usuario else None
+
+
+def completar_inventario(filas):
+    """Añade nombre_producto, nombre_dron y nombre_usuario a filas que traen id_producto e id_usuario."""
+    por_id = productos.obtener()[0]
+    if any(fila["id_producto"] is not None and fila["id_producto"] not in por_id for fila in filas):
+        por_id = productos.obtener(refrescar=True)[0]
+    por_dron = drones.obtener()
+    por_usuario = usuarios.obtener()
+
+    for fila in filas:
+        producto = por_id.get(fila["id_producto"])
+        dron = por_dron.get(producto["id_dron"]) if producto else None
+        usuario = por_usuario.get(fila["id_usuario"])
+        fila["nombre_producto"] = producto["nombre"] if producto else None
+        fila["nombre_dron"] = dron["nombre"] if dron else None
+        fila["nombre_usuario"] = usuario["nombre_usuario"] if usuario else "Usuario eliminado"
+    return filas
+
+
+def calentar():
+    """Carga las tres tablas (lo llama el calentamiento al arrancar)."""
+    for tabla in (drones, productos, usuarios):
+        tabla.obtener()
+
+
+def estadisticas():
+    return {tabla.nombre: tabla.estadisticas() for tabla in (drones, productos, usuarios)}
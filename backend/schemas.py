@@ -1,4 +1,5 @@
-from typing import Optional
+from datetime import date
+from typing import List, Optional
 from pydantic import BaseModel
 
 class RegistroPiezaRequest(BaseModel):
@@ -16,9 +17,51 @@ class BuscarCodigoRequest(BaseModel):
     codigo: str
 
 
+class BuscarCodigosRequest(BaseModel):
+    codigos: List[str]
+
+
 
 class ActualizarEstadoRequest(BaseModel):
     id_pieza: int
     nuevo_estado: str
     id_usuario: int
-    observaciones: str = ""
\ No newline at end of file
+    observaciones: str = ""
+
+
+class ActualizarEstadoLoteRequest(BaseModel):
+    ids_pieza: List[int]
+    nuevo_estado: str
+    id_usuario: int
+    observaciones: str = ""
+
+
+class RegistroPiezasLoteRequest(BaseModel):
+    codigo_original: str
+    numeros_serie: List[str]
+    nombre_producto: str = None
+    descripcion_producto: str = None
+    id_dron: Optional[int] = None
+    caja: str
+    id_usuario: int = 1  # temporal, luego se autentica
+
+
+class HojaEtiquetasRequest(BaseModel):
+    # Una sola forma de elegir las piezas: lista de códigos, caja o rango de fechas de registro
+    codigos: Optional[List[str]] = None
+    caja: Optional[str] = None
+    desde: Optional[date] = None
+    hasta: Optional[date] = None
+    plantilla: str = "rollo_50x25"
+    formato: str = "pdf"
+    dpi: Optional[int] = None
+    inicio: int = 1
+
+
+class MoverCajaRequest(BaseModel):
+    # Todas las piezas de 'caja' (salvo las que ya salieron) pasan a 'caja_nueva', a 'nuevo_estado' o a ambos
+    caja: str
+    caja_nueva: Optional[str] = None
+    nuevo_estado: Optional[str] = None
+    id_usuario: int
+    observaciones: str = ""
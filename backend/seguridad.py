@@ -0,0 +1,159 @@
+# backend/seguridad.py
+# Contraseñas (bcrypt en hilos aparte) y tokens de sesión firmados.
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import Header
+
+from cache import CacheLRU
+
+# passlib (y su backend bcrypt) se carga al primer uso o en el calentamiento,
+# no al importar el módulo: retrasa el arranque y solo lo usan login y altas
+_pwd_context = None
+
+DURACION_SESION = int(os.getenv("SESION_DURACION", 12 * 3600))  # segundos
+
+# Se leen en iniciar() (lifespan): sin secreto el backend no arranca
+_SECRETO = None
+# bcrypt es lento a propósito: se ejecuta fuera del bucle de eventos y con
+# un número acotado de hilos para que un pico de logins no acapare la CPU.
+_ejecutor = None
+
+_sesiones = CacheLRU(maximo=int(os.getenv("SESIONES_CACHE_MAX", 1024)), ttl=300)
+# id_usuario -> instante desde el que se rechazan los tokens emitidos antes
+_revocadas = {}
+_lock = threading.Lock()
+
+
+def iniciar():
+    """Lee SESION_SECRETO y crea los hilos de bcrypt. Falla si el secreto no está definido."""
+    global _SECRETO
+    secreto = os.getenv("SESION_SECRETO", "")
+    if not secreto:
+        # Un secreto vacío permitiría firmar tokens a cualquiera, y uno aleatorio
+        # por proceso invalidaría las sesiones en cada reinicio o entre procesos
+        raise RuntimeError("SESION_SECRETO no está definido en .env (use un valor largo y aleatorio)")
+    _SECRETO = secreto.encode()
+    _hilos()
+
+
+def detener():
+    global _ejecutor
+    with _lock:
+        ejecutor, _ejecutor = _ejecutor, None
+    if ejecutor is not None:
+        ejecutor.shutdown(wait=False)
+
+
+def _hilos():
+    global _ejecutor
+    with _lock:
+        if _ejecutor is None:
+            _ejecutor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("HASH_HILOS", 4)),
+                thread_name_prefix="hash"
+            )
+        return _ejecutor
+
+
+# --- Contraseñas ---
+
+def contexto_passwords():
+    global _pwd_context
+    if _pwd_context is None:
+        with _lock:
+            if _pwd_context is None:
+                from passlib.context import CryptContext
+                _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
+
+
+def calentar():
+    """Carga passlib y el backend de bcrypt (lo llama el calentamiento en segundo plano)."""
+    contexto_passwords().handler("bcrypt").get_backend()
+
+
+async def verificar_password(password, password_hash):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hilos(), contexto_passwords().verify, password, password_hash)
+
+
+async def hashear_password(password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hilos(), contexto_passwords().hash, password)
+
+
+# --- Tokens de sesión ---
+
+def _b64(datos):
+    return base64.urlsafe_b64encode(datos).decode().rstrip("=")
+
+
+def _desde_b64(texto):
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+
+def _firmar(carga):
+    if _SECRETO is None:
+        raise RuntimeError("seguridad.iniciar() no se ha llamado")
+    return _b64(hmac.new(_SECRETO, carga.encode(), hashlib.sha256).digest())
+
+
+def crear_token(usuario):
+    ahora = int(time.time())
+    carga = _b64(json.dumps({
+        "id_usuario": usuario["id_usuario"],
+        "nombre_usuario": usuario["nombre_usuario"],
+        "rol": usuario["rol"],
+        "iat": ahora,
+        "exp": ahora + DURACION_SESION,
+    }, separators=(",", ":")).encode())
+    return f"{carga}.{_firmar(carga)}"
+
+
+def verificar_token(token):
+    """Devuelve los datos de la sesión si el token es válido, o None."""
+    if not token:
+        return None
+
+    sesion = _sesiones.obtener(token)
+    if sesion is None:
+        carga, _, firma = token.partition(".")
+        # Comparación en bytes: compare_digest no acepta str con caracteres no ASCII
+        # (un encabezado Authorization cualquiera puede traerlos)
+        if not firma or not hmac.compare_digest(firma.encode(), _firmar(carga).encode()):
+            return None
+        try:
+            sesion = json.loads(_desde_b64(carga))
+        except ValueError:
+            return None
+        _sesiones.guardar(token, sesion)
+
+    if sesion["exp"] < time.time():
+        return None
+    with _lock:
+        revocada_desde = _revocadas.get(sesion["id_usuario"])
+    if revocada_desde is not None and sesion["iat"] <= revocada_desde:
+        return None
+    return sesion
+
+
+def revocar_sesiones(id_usuario):
+    """Invalida los tokens ya emitidos para el usuario (p. ej. al cambiar su rol)."""
+    with _lock:
+        _revocadas[id_usuario] = int(time.time())
+    _sesiones.invalidar_si(lambda _token, sesion: sesion["id_usuario"] == id_usuario)
+
+
+def sesion_actual(authorization: str = Header(None)):
+    """Dependencia de FastAPI: sesión del encabezado 'Authorization: Bearer <token>' o None."""
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    return verificar_token(authorization[7:].strip())
@@ -0,0 +1,31 @@
+# backend/test_cache.py
+# python -m pytest test_cache.py
+from cache import CacheLRU
+
+
+def test_expulsa_el_menos_usado():
+    cache = CacheLRU(maximo=2)
+    cache.guardar("a", 1)
+    cache.guardar("b", 2)
+    cache.obtener("a")
+    cache.guardar("c", 3)
+    assert cache.obtener("b") is None
+    assert cache.obtener("a") == 1
+    assert cache.obtener("c") == 3
+
+
+def test_claves_normalizadas():
+    cache = CacheLRU(normalizar=str.casefold)
+    cache.guardar("OT-ab12", {"id": 1})
+    assert cache.obtener("ot-AB12") == {"id": 1}
+    cache.invalidar("OT-AB12")
+    assert cache.obtener("OT-ab12") is None
+
+
+def test_no_guarda_resultados_de_una_generacion_anterior():
+    cache = CacheLRU()
+    generacion = cache.generacion
+    cache.invalidar("x")
+    assert not cache.guardar("x", "viejo", generacion)
+    assert cache.obtener("x") is None
+    assert cache.guardar("x", "nuevo", cache.generacion)
@@ -0,0 +1,43 @@
+# backend/test_cambios.py
+# python -m pytest test_cambios.py
+from collections import deque
+
+import pytest
+
+import cambios
+
+
+@pytest.fixture(autouse=True)
+def historial(monkeypatch):
+    monkeypatch.setattr(cambios, "_eventos", deque(maxlen=3))
+    monkeypatch.setattr(cambios, "_secuencia", 0)
+
+
+def test_sin_eventos():
+    assert cambios.eventos_desde(0) == ([], True)
+
+
+def test_eventos_posteriores():
+    for i in range(3):
+        cambios.publicar("pieza", {"id_pieza": i})
+    eventos, completo = cambios.eventos_desde(1)
+    assert completo
+    assert [secuencia for secuencia, _, _ in eventos] == [2, 3]
+
+
+def test_al_dia():
+    cambios.publicar("pieza", {})
+    assert cambios.eventos_desde(1) == ([], True)
+
+
+def test_hueco_en_el_historial_pide_reiniciar():
+    for i in range(5):
+        cambios.publicar("pieza", {"id_pieza": i})
+    # Quedan 3, 4 y 5: desde 2 todavía alcanza, desde 1 falta el 2
+    assert cambios.eventos_desde(2)[1]
+    assert cambios.eventos_desde(1) == ([], False)
+
+
+def test_secuencia_de_otra_ejecucion_pide_reiniciar():
+    cambios.publicar("pieza", {})
+    assert cambios.eventos_desde(40) == ([], False)
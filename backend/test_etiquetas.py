@@ -0,0 +1,44 @@
+# backend/test_etiquetas.py
+# python -m pytest test_etiquetas.py
+import almacen_etiquetas
+import etiquetas
+import models
+
+
+def test_hoja_reutiliza_los_simbolos(monkeypatch):
+    dibujados = []
+    dibujar = etiquetas._dibujar_simbolo
+
+    def _contar(codigo, ancho, alto):
+        dibujados.append(codigo)
+        return dibujar(codigo, ancho, alto)
+
+    monkeypatch.setattr(etiquetas, "_dibujar_simbolo", _contar)
+    plantilla = etiquetas.PLANTILLAS["a4_3x7"]
+    etiquetas._componer_pagina(["OT-TEST-A", "OT-TEST-B"] * 10, plantilla, 203)
+    etiquetas._componer_pagina(["OT-TEST-A", None, "OT-TEST-B"], plantilla, 203)
+    assert sorted(dibujados) == ["OT-TEST-A", "OT-TEST-B"]
+
+
+def test_codigos_de_series_con_simbolos():
+    for codigo in ["OTech-1A2B3C4D-SN/1#+", "OTech-1A2B3C4D-A B%", "OTech-1A2B3C4D-.."]:
+        assert etiquetas.codigo_valido(codigo)
+    assert not etiquetas.codigo_valido("OTech-1A2B3C4D-café")
+    assert not etiquetas.codigo_valido("")
+
+
+def test_almacen_escapa_el_nombre(tmp_path):
+    almacen = almacen_etiquetas.AlmacenFragmentado(str(tmp_path))
+    plano = almacen_etiquetas.AlmacenPlano(str(tmp_path / "plano"))
+    for destino in (almacen, plano):
+        destino.guardar("OTech-1-SN/../x#1", "png", b"png")
+        assert destino.leer("OTech-1-SN/../x#1", "png") == b"png"
+        assert list(destino.etiquetas()) == [("OTech-1-SN/../x#1", "png")]
+    # Los nombres antiguos (sin caracteres especiales) no cambian
+    assert plano.ruta("OTech-1A2B-SN 01", "png").endswith("OTech-1A2B-SN 01.png")
+
+
+def test_generar_codigo_otech_es_imprimible():
+    codigo = models.generar_codigo_otech("Séñal/7ü")
+    assert codigo.endswith("-Senal/7u")
+    assert etiquetas.codigo_valido(codigo)
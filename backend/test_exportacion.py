@@ -0,0 +1,42 @@
+# backend/test_exportacion.py
+# python -m pytest test_exportacion.py
+import io
+from datetime import datetime
+
+import exportacion
+import importacion
+
+FILAS = [
+    [1, "Motor", "Mavic", "OT-AB12", "SN-001", "disponible", datetime(2025, 1, 2, 3, 4), "ana", "A1"],
+    [2, "Hélice <3 & \"más\"", None, "OT-CD34", "SN/002", "disponible", None, None, None],
+]
+
+
+def _xlsx(monkeypatch, filas):
+    def _filas_inventario():
+        yield [exportacion._formatear_fila(fila) for fila in filas]
+
+    monkeypatch.setattr(exportacion, "_filas_inventario", _filas_inventario)
+    return b"".join(exportacion.generar_xlsx())
+
+
+def test_xlsx_se_lee_con_el_importador(monkeypatch):
+    datos = _xlsx(monkeypatch, FILAS)
+    leidas = list(importacion._filas_xlsx(io.BytesIO(datos)))
+
+    assert leidas[0] == [nombre for nombre, _ in exportacion.COLUMNAS]
+    assert leidas[1] == ["1", "Motor", "Mavic", "OT-AB12", "SN-001", "disponible", "02/01/2025 03:04", "ana", "A1"]
+    assert leidas[2] == ["2", "Hélice <3 & \"más\"", "", "OT-CD34", "SN/002", "disponible", "", "", ""]
+    assert len(leidas) == 3
+
+
+def test_xlsx_sin_filas(monkeypatch):
+    datos = _xlsx(monkeypatch, [])
+    assert list(importacion._filas_xlsx(io.BytesIO(datos))) == [[nombre for nombre, _ in exportacion.COLUMNAS]]
+
+
+def test_xlsx_quita_caracteres_de_control(monkeypatch):
+    fila = [3, "Placa\x01\x1f", "", "OT-X", "SN\x0b3", "disponible", "", "", ""]
+    leidas = list(importacion._filas_xlsx(io.BytesIO(_xlsx(monkeypatch, [fila]))))
+    assert leidas[1][1] == "Placa"
+    assert leidas[1][4] == "SN3"
@@ -0,0 +1,49 @@
+# backend/test_importacion.py
+# python -m pytest test_importacion.py
+import io
+import zipfile
+
+import pytest
+
+import importacion
+
+_HOJA = """<?xml version="1.0" encoding="UTF-8"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>{}</sheetData></worksheet>"""
+
+
+def _xlsx(filas_xml):
+    datos = io.BytesIO()
+    with zipfile.ZipFile(datos, "w") as libro:
+        libro.writestr("xl/worksheets/sheet1.xml", _HOJA.format(filas_xml))
+    datos.seek(0)
+    return datos
+
+
+def test_csv_con_separador_punto_y_coma():
+    archivo = io.BytesIO("\ufeffcodigo_original;numero_serie;caja\nP-1;SN-1;A1\n".encode("utf-8"))
+    assert list(importacion.leer_filas(archivo, "csv")) == [["codigo_original", "numero_serie", "caja"], ["P-1", "SN-1", "A1"]]
+
+
+def test_csv_que_no_es_utf8():
+    archivo = io.BytesIO("codigo_original,numero_serie,caja\nP-1,Señal,A1\n".encode("latin-1"))
+    with pytest.raises(importacion.ManifiestoInvalido):
+        importacion.importar(archivo, "csv", 1)
+
+
+def test_xlsx_con_cadena_compartida_inexistente():
+    # t="s" apunta a sharedStrings.xml, que el archivo no trae
+    archivo = _xlsx('<row r="1"><c r="A1" t="s"><v>3</v></c></row>')
+    with pytest.raises(importacion.ManifiestoInvalido):
+        importacion.importar(archivo, "xlsx", 1)
+
+
+def test_xlsx_con_xml_roto():
+    archivo = _xlsx('<row r="1"><c r="A1" t="inlineStr"><is><t>codigo</t></is></c>')
+    with pytest.raises(importacion.ManifiestoInvalido):
+        importacion.importar(archivo, "xlsx", 1)
+
+
+def test_faltan_columnas():
+    archivo = io.BytesIO(b"codigo_original,caja\nP-1,A1\n")
+    with pytest.raises(importacion.ManifiestoInvalido, match="numero_serie"):
+        importacion.importar(archivo, "csv", 1)
@@ -0,0 +1,73 @@
+# backend/test_instantaneas.py
+# python -m pytest test_instantaneas.py
+from datetime import date
+
+import pytest
+
+import instantaneas
+
+FOTO = {
+    (1, "disponible", "A1"): 5,
+    (1, "salida", "A1"): 2,
+    (2, "disponible", ""): 1,
+}
+
+VARIACION = {
+    (1, "disponible", "A1"): -2,
+    (1, "salida", "A1"): 1,
+    (1, "disponible", "B2"): 1,
+    (2, "disponible", ""): -1,
+}
+
+
+def test_aplicar_hacia_adelante():
+    assert instantaneas._aplicar(FOTO, VARIACION) == {
+        (1, "disponible", "A1"): 3,
+        (1, "salida", "A1"): 3,
+        (1, "disponible", "B2"): 1,
+    }
+
+
+def test_aplicar_hacia_atras_deshace():
+    siguiente = instantaneas._aplicar(FOTO, VARIACION)
+    assert instantaneas._aplicar(siguiente, VARIACION, -1) == FOTO
+
+
+def test_aplicar_no_modifica_la_foto():
+    copia = dict(FOTO)
+    instantaneas._aplicar(FOTO, VARIACION)
+    assert FOTO == copia
+
+
+def test_aplicar_avisa_de_cantidades_negativas(caplog):
+    with caplog.at_level("WARNING", logger="instantaneas"):
+        resultado = instantaneas._aplicar({(1, "disponible", "A1"): 1}, {(1, "disponible", "A1"): -3})
+    assert resultado == {}
+    assert "negativas" in caplog.text
+
+
+class _Cursor:
+    def __init__(self, sin_estado):
+        self.sin_estado = sin_estado
+        self.ejecutadas = []
+
+    def execute(self, sql, params=None):
+        self.ejecutadas.append(sql)
+
+    def fetchone(self):
+        return (self.sin_estado,)
+
+    def fetchall(self):
+        return [(1, "A1", "A1", "disponible", "salida", 2)]
+
+
+def test_cambios_rechaza_movimientos_sin_estado():
+    cursor = _Cursor(sin_estado=4)
+    with pytest.raises(instantaneas.HistoriaIncompleta):
+        instantaneas.cambios(cursor, date(2024, 5, 1), date(2024, 5, 2))
+    assert len(cursor.ejecutadas) == 1
+
+
+def test_cambios_con_estados_completos():
+    variacion = instantaneas.cambios(_Cursor(sin_estado=0), date(2024, 5, 1), date(2024, 5, 2))
+    assert variacion == {(1, "disponible", "A1"): -2, (1, "salida", "A1"): 2}
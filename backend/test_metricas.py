@@ -0,0 +1,32 @@
+# backend/test_metricas.py
+# python -m pytest test_metricas.py
+import metricas
+import models
+
+
+class _Cursor:
+    def execute(self, operacion, params=None):
+        pass
+
+    def fetchall(self):
+        return []
+
+
+def _registrar_lote(cursor):
+    models._insertar_varias(cursor, "INSERT INTO pieza (id_producto)", [(1,)])
+    pieza = cursor._consulta
+    models._insertar_varias(cursor, "INSERT INTO movimiento (id_pieza)", [(1,)])
+    return pieza, cursor._consulta
+
+
+def test_consulta_de_auxiliar_se_atribuye_al_llamador():
+    cursor = metricas.CursorMedido(_Cursor())
+    pieza, movimiento = _registrar_lote(cursor)
+    assert pieza == "test_metricas._registrar_lote:insert_pieza"
+    assert movimiento == "test_metricas._registrar_lote:insert_movimiento"
+
+
+def test_consulta_directa():
+    cursor = metricas.CursorMedido(_Cursor())
+    cursor.execute("\n    SELECT id_producto FROM stock_producto FOR UPDATE")
+    assert cursor._consulta == "test_metricas.test_consulta_directa:select_stock_producto"
@@ -0,0 +1,105 @@
+# backend/test_models.py
+# python -m pytest test_models.py
+from datetime import datetime
+
+import pytest
+
+import models
+
+
+class _Cursor:
+    def __init__(self):
+        self.ejecutadas = []
+
+    def execute(self, sql, params=None):
+        self.ejecutadas.append((sql, params))
+
+    def close(self):
+        pass
+
+
+class _Unidad:
+    """Unidad de trabajo falsa: registra lo que se ejecuta en lugar de ir a MySQL."""
+
+    def __init__(self):
+        self.cur = _Cursor()
+
+    def cursor(self, dictionary=False):
+        return self.cur
+
+
+# --- Contadores de stock ---
+
+def test_cambio_de_estado():
+    assert models.cambio_de_estado(7, "disponible", "salida", 3) == {
+        (7, "disponible"): -3,
+        (7, "salida"): 3,
+    }
+
+
+def test_cambio_al_mismo_estado_no_varia():
+    assert models.cambio_de_estado(7, "disponible", "disponible") == {}
+
+
+def test_ajustar_stock_ordena_y_omite_vacios():
+    uow = _Unidad()
+    models.ajustar_stock({
+        (9, "salida"): 2,
+        (3, "disponible"): -1,
+        (5, "reservado"): 0,
+        (4, None): 1,
+    }, uow)
+    [(sql, params)] = uow.cur.ejecutadas
+    assert sql.count("(%s, %s, %s)") == 2
+    assert "cantidad = cantidad + VALUES(cantidad)" in sql
+    # Ordenadas por clave para bloquear siempre en el mismo orden
+    assert params == [3, "disponible", -1, 9, "salida", 2]
+
+
+def test_ajustar_stock_sin_cambios_no_consulta():
+    uow = _Unidad()
+    models.ajustar_stock({(1, "disponible"): 0}, uow)
+    assert uow.cur.ejecutadas == []
+
+
+# --- Inventario: paginación por cursor ---
+
+def test_cursor_inventario_ida_y_vuelta():
+    fecha = datetime(2025, 3, 14, 9, 26, 53, 589793)
+    texto = models.codificar_cursor_inventario(fecha, 1234)
+    assert "=" not in texto
+    assert models.decodificar_cursor_inventario(texto) == (fecha, 1234)
+
+
+@pytest.mark.parametrize("texto", ["", "no-es-base64!", "MjAyNS0wMS0wMQ"])
+def test_cursor_inventario_no_valido(texto):
+    with pytest.raises(ValueError):
+        models.decodificar_cursor_inventario(texto)
+
+
+def test_consulta_inventario_con_cursor():
+    fecha = datetime(2025, 3, 14, 9, 26)
+    cursor = models.decodificar_cursor_inventario(models.codificar_cursor_inventario(fecha, 50))
+    sql, params = models.consulta_inventario({"estado": "disponible"}, limite=20, cursor_pagina=cursor)
+    assert "p.estado = %s" in sql
+    assert "(p.fecha_registro < %s OR (p.fecha_registro = %s AND p.id_pieza < %s))" in sql
+    assert sql.rstrip().endswith("ORDER BY p.fecha_registro DESC, p.id_pieza DESC LIMIT %s")
+    # Una fila de más para saber si hay página siguiente
+    assert params == ["disponible", fecha, fecha, 50, 21]
+    assert sql.count("%s") == len(params)
+
+
+# --- Clave de comparación de códigos (utf8mb4_unicode_ci) ---
+
+@pytest.mark.parametrize("a, b", [
+    ("OT-AB12", "ot-ab12"),
+    ("SN-001", "SN-001  "),
+    ("CAFÉ-1", "cafe-1"),
+    ("straße", "STRASSE"),
+])
+def test_clave_codigo_equivalentes(a, b):
+    assert models.clave_codigo(a) == models.clave_codigo(b)
+
+
+def test_clave_codigo_respeta_espacios_iniciales():
+    assert models.clave_codigo(" SN-001") != models.clave_codigo("SN-001")
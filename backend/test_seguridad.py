@@ -0,0 +1,66 @@
+# backend/test_seguridad.py
+# python -m pytest test_seguridad.py
+import asyncio
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+import seguridad
+
+USUARIO = {"id_usuario": 1, "nombre_usuario": "operario", "rol": "Operario"}
+
+
+@pytest.fixture(autouse=True)
+def secreto(monkeypatch):
+    monkeypatch.setenv("SESION_SECRETO", "secreto-de-prueba")
+    seguridad.iniciar()
+    yield
+    seguridad.detener()
+
+
+def test_sin_secreto_no_arranca(monkeypatch):
+    monkeypatch.setenv("SESION_SECRETO", "")
+    with pytest.raises(RuntimeError):
+        seguridad.iniciar()
+
+
+def test_hilos_tras_reiniciar():
+    # Como al reiniciar el lifespan (recarga, pruebas): detener() no deja el módulo inservible
+    seguridad.detener()
+    seguridad.iniciar()
+
+    async def _hashear_y_verificar():
+        return await seguridad.verificar_password("x", await seguridad.hashear_password("x"))
+
+    assert asyncio.run(_hashear_y_verificar())
+
+
+def test_token_valido():
+    token = seguridad.crear_token(USUARIO)
+    assert seguridad.verificar_token(token)["id_usuario"] == 1
+
+
+def test_token_con_firma_alterada():
+    carga, _, firma = seguridad.crear_token(USUARIO).partition(".")
+    otra = "A" if firma[0] != "A" else "B"
+    assert seguridad.verificar_token(f"{carga}.{otra}{firma[1:]}") is None
+
+
+def test_token_no_ascii():
+    # Starlette decodifica los encabezados como latin-1: pueden llegar caracteres no ASCII
+    assert seguridad.verificar_token("añ.ñé") is None
+    assert seguridad.verificar_token("e30.fïrma") is None
+
+
+def test_encabezado_no_ascii_es_sesion_invalida():
+    app = FastAPI()
+
+    @app.get("/sesion")
+    def sesion(datos: dict = Depends(seguridad.sesion_actual)):
+        return {"valida": datos is not None}
+
+    cliente = TestClient(app)
+    respuesta = cliente.get("/sesion", headers={"Authorization": "Bearer e30.f\xefrma".encode("latin-1")})
+    assert respuesta.status_code == 200
+    assert respuesta.json() == {"valida": False}
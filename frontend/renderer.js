@@ -2,8 +2,17 @@ const API_URL = 'http://localhost:8000';
 
 // Variables globales
 let inventarioCompleto = [];
+// Resultados de /buscar para el texto de 'filtro-serie' (null = filtrar en local)
+let resultadosBusqueda = null;
+let temporizadorBusqueda = null;
 let timeoutInactividad;
 
+// Enviar el token de sesión en todas las peticiones al backend
+const sesionGuardada = JSON.parse(localStorage.getItem('usuario'));
+if (sesionGuardada && sesionGuardada.token) {
+    axios.defaults.headers.common['Authorization'] = `Bearer ${sesionGuardada.token}`;
+}
+
 
 // Función para cerrar sesión
 function cerrarSesion() {
@@ -781,9 +790,15 @@ async function cargarInventario() {
     contenidoDiv.style.display = 'none';
     tbody.innerHTML = '';
 
+    // Los cambios que lleguen mientras se descarga se aplican al terminar
+    conectarCambios();
+    inventarioCargando = true;
+
     try {
         const response = await axios.get(`${API_URL}/inventario`);
         inventarioCompleto = response.data;
+        inventarioCargando = false;
+        cambiosPendientes.splice(0).forEach(([tipo, datos]) => aplicarCambio(tipo, datos));
         console.log("Datos del inventario:", inventarioCompleto);
 
         if (filtroProducto) {
@@ -803,6 +818,8 @@ async function cargarInventario() {
         contenidoDiv.style.display = 'block';
 
     } catch (error) {
+        inventarioCargando = false;
+        cambiosPendientes.length = 0;
         console.error("Error al cargar inventario:", error);
         loadingDiv.innerHTML = `
             <p style="color: #ef4444;">Error al cargar el inventario. Verifica que el servidor esté activo.</p>
@@ -815,6 +832,76 @@ async function cargarInventario() {
     }
 }
 
+// --- Cambios en vivo ---
+// El inventario se descarga una vez; después se aplican los eventos de /cambios.
+let fuenteCambios = null;
+let inventarioCargando = false;
+const cambiosPendientes = [];
+
+function conectarCambios() {
+    if (fuenteCambios || typeof EventSource === 'undefined') return;
+
+    // EventSource reconecta solo y reenvía Last-Event-ID para reanudar
+    fuenteCambios = new EventSource(`${API_URL}/cambios`);
+    ['pieza_alta', 'pieza_estado', 'producto_alta'].forEach(tipo => {
+        fuenteCambios.addEventListener(tipo, evento => {
+            const datos = JSON.parse(evento.data);
+            if (inventarioCargando) {
+                cambiosPendientes.push([tipo, datos]);
+            } else {
+                aplicarCambio(tipo, datos);
+            }
+        });
+    });
+    // El servidor ya no tiene los cambios perdidos, o se importó un manifiesto: recargar todo
+    fuenteCambios.addEventListener('reiniciar', () => cargarInventario());
+    fuenteCambios.addEventListener('importacion', () => cargarInventario());
+}
+
+function aplicarCambio(tipo, datos) {
+    if (tipo === 'pieza_alta') {
+        datos.piezas.forEach(fila => {
+            const indice = inventarioCompleto.findIndex(p => p.id_pieza === fila.id_pieza);
+            if (indice >= 0) {
+                inventarioCompleto[indice] = fila;
+            } else {
+                inventarioCompleto.unshift(fila);
+            }
+        });
+    } else if (tipo === 'pieza_estado') {
+        datos.piezas.forEach(cambio => {
+            const pieza = inventarioCompleto.find(p => p.id_pieza === cambio.id_pieza);
+            if (pieza) Object.assign(pieza, cambio);
+        });
+    } else {
+        return;
+    }
+
+    const seccion = document.getElementById('inventario-section');
+    if (seccion && seccion.style.display !== 'none') {
+        aplicarFiltros();
+    }
+}
+
+// Búsqueda por fragmento en el backend, con espera para no lanzar una petición por tecla
+function buscarEnServidor(texto) {
+    clearTimeout(temporizadorBusqueda);
+    resultadosBusqueda = null;
+    if (texto.length < 3) return;
+
+    temporizadorBusqueda = setTimeout(async () => {
+        try {
+            const response = await axios.get(`${API_URL}/buscar`, { params: { q: texto, limite: 200 } });
+            // Descarta respuestas de un texto que ya cambió
+            if (document.getElementById('filtro-serie')?.value.trim() !== texto) return;
+            resultadosBusqueda = response.data.piezas;
+            aplicarFiltros();
+        } catch (error) {
+            console.error("Error al buscar piezas:", error);
+        }
+    }, 250);
+}
+
 // Función para aplicar filtros
 function aplicarFiltros() {
     const filtroSerie = document.getElementById('filtro-serie')?.value.toLowerCase() || '';
@@ -826,8 +913,10 @@ function aplicarFiltros() {
 
     tbody.innerHTML = '';
 
-    const piezasFiltradas = inventarioCompleto.filter(pieza => {
-        const coincideSerie = pieza.numero_serie.toLowerCase().includes(filtroSerie);
+    // Con 3 o más caracteres busca el backend (serie, código de barras y nombre, por índice)
+    const usarBusqueda = filtroSerie.length >= 3 && resultadosBusqueda !== null;
+    const piezasFiltradas = (usarBusqueda ? resultadosBusqueda : inventarioCompleto).filter(pieza => {
+        const coincideSerie = usarBusqueda || pieza.numero_serie.toLowerCase().includes(filtroSerie);
         const coincideEstado = filtroEstado === '' || pieza.estado === filtroEstado;
         const coincideProducto = filtroProducto === '' || pieza.nombre_producto === filtroProducto;
         return coincideSerie && coincideEstado && coincideProducto;
@@ -942,7 +1031,8 @@ async function registrarSalida(idPieza) {
         });
 
         alert("Salida registrada correctamente.");
-        cargarInventario();
+        // La tabla se actualiza con el evento del canal de cambios
+        if (!fuenteCambios) cargarInventario();
     } catch (error) {
         alert("Error al registrar salida: " + error.message);
     }
@@ -1048,6 +1138,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
     document.addEventListener('input', function(e) {
         if (e.target.id === 'filtro-serie') {
+            buscarEnServidor(e.target.value.trim());
             aplicarFiltros();
         }
     });